@@ -10,6 +10,7 @@ from app.constants import RoutingMode, TravelMode, cost_prefix_dict
 from typing import List, Dict, Tuple
 from math import floor
 import numpy as np
+from utils.arrays import round_exact
 import env
 
 
@@ -86,6 +87,36 @@ def get_aqi_costs(
     return aq_costs
 
 
+def get_aqi_coeffs(aqis: np.ndarray) -> np.ndarray:
+    """Returns cost coefficients for calculating AQI based costs for an array of AQI values (see get_aqi_coeff()).
+    Missing or invalid AQI values (aqi < 0.95) get the high cost coefficient 10 (as in get_aqi_costs()).
+    """
+    return np.where(aqis < 0.95, 10.0, np.where(aqis < 1.0, 0.0, (aqis - 1) / 4))
+
+
+def get_aqi_cost_arrays(
+    aqis: np.ndarray, 
+    lengths: np.ndarray, 
+    sens: List[float], 
+    lengths_b: np.ndarray = None, 
+    travel_mode: TravelMode = TravelMode.WALK
+) -> Dict[str, np.ndarray]:
+    """Returns a set of AQI based costs of all edges as dictionary of cost arrays (see get_aqi_costs()).
+    Missing biking lengths (NaN or 0) are replaced with lengths.
+    """
+    aqi_coeffs = get_aqi_coeffs(aqis)
+    if lengths_b is None:
+        base_costs = lengths
+    else:
+        base_costs = np.where(np.isnan(lengths_b) | (lengths_b == 0), lengths, lengths_b)
+
+    cost_prefix = cost_prefix_dict[travel_mode][RoutingMode.CLEAN]
+    return { 
+        cost_prefix + str(sen) : round_exact(base_costs + lengths * aqi_coeffs * sen, 2) 
+        for sen in sens 
+    }
+
+
 def get_aqi_cost_from_exp(
     aqi_exp: Tuple[float, float], 
     sen: float = 1.0
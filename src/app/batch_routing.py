@@ -0,0 +1,316 @@
+"""
+This module provides batch routing of many ODs (e.g. for bulk analysis) in a pool of processes that are forked
+from a process that has loaded the graph, so that the processes share the graph (copy-on-write) instead of
+loading it again. The paths of an OD are found and processed in the same way as in the routing API (PathFinder),
+but the results are returned in the order in which they complete.
+
+The processes hold the AQI generation of the graph that was published when they were forked, hence the pool
+is replaced with a new one (after the previous tasks) when a new AQI generation has been published. Where fork
+is not available (e.g. Windows) or the number of processes is zero, the ODs are routed in the calling process.
+
+The results of an OD are either the paths as GeoJSON (find_od_paths(), for the routing API) or the attributes
+of the paths as flat rows (find_od_path_attrs(), e.g. for writing them to tables, see app/batch_runner.py).
+
+The batches of the routing API are routed in a dedicated batch routing process (BatchRoutingProcess) that is
+forked from the worker right after the graph is loaded, before the worker starts any threads (the AQI updaters
+and the routing threads), and that forks the pool. The worker only queues the batches to the process, which
+writes the results of each batch to a file of the results directory, from which any worker can return them.
+
+"""
+
+import os
+import re
+import atexit
+import time
+import uuid
+import queue
+import multiprocessing
+import multiprocessing.pool
+import threading
+import json
+import traceback
+from itertools import chain
+from typing import Callable, Iterator, List, NamedTuple, Tuple, Union
+import app.path_finder as path_finder
+from app.path_finder import PathFinder
+from app.path import Path
+from app.graph_handler import GraphHandler
+from app.graph_aqi_updater import GraphAqiUpdater
+from app.types import AqiGeneration
+from app.constants import TravelMode, RoutingMode, RoutingException, ErrorKeys
+from app.logger import Logger
+
+
+class BatchOd(NamedTuple):
+    idx: int
+    travel_mode: TravelMode
+    routing_mode: RoutingMode
+    orig: Tuple[float, float]
+    dest: Tuple[float, float]
+    max_detour_ratio: Union[float, None] = None
+    with_edge_ids: bool = False
+
+
+# the graph and the logger of the processes of the pool (set before the processes are forked)
+worker_graph: Union[GraphHandler, None] = None
+worker_log: Union[Logger, None] = None
+
+
+def init_worker() -> None:
+    # the threads of the routing pool of the parent process do not exist in the forked process
+    path_finder.routing_pool = None
+
+
+def find_od_path_finder(od: BatchOd) -> PathFinder:
+    """Finds and processes the paths of an OD in the same way as the routing API. The paths are in the path set
+    of the returned path finder.
+    """
+    finder = PathFinder(
+        worker_log, od.travel_mode, od.routing_mode, worker_graph, *od.orig, *od.dest,
+        max_detour_ratio=od.max_detour_ratio)
+    finder.find_origin_dest_nodes()
+    finder.find_least_cost_paths()
+    finder.process_paths()
+    return finder
+
+
+def find_od_results(od: BatchOd, get_results: Callable[[PathFinder], dict]) -> dict:
+    """Returns the results of an OD (by get_results()) with the index of the OD, or the error key of the OD.
+    """
+    try:
+        return { 'idx': od.idx, **get_results(find_od_path_finder(od)) }
+
+    except RoutingException as e:
+        return { 'idx': od.idx, 'error_key': str(e) }
+
+    except Exception:
+        worker_log.error(traceback.format_exc())
+        return { 'idx': od.idx, 'error_key': ErrorKeys.UNKNOWN_ERROR.value }
+
+
+def find_od_paths(od: BatchOd) -> dict:
+    """Finds the paths of an OD and returns them as a GeoJSON feature collection (path_FC) with the index of the
+    OD, or the error key of the OD.
+    """
+    def get_path_FC(finder: PathFinder) -> dict:
+        try:
+            return { 'path_FC': finder.path_set.get_paths_as_feature_collection() }
+        except Exception:
+            raise RoutingException(ErrorKeys.PATH_PROCESSING_ERROR.value)
+
+    return find_od_results(od, get_path_FC)
+
+
+def get_path_row(path: Path, with_edge_ids: bool) -> dict:
+    """Returns the attributes of a path as a flat row: nested attributes (e.g. noises) as JSON strings and the 
+    geometry as a projected LineString (EPSG:3879).
+    """
+    row = {
+        name: json.dumps(value) if isinstance(value, (dict, list)) else value
+        for name, value in path.get_props().items()
+    }
+    row['geometry'] = path.geometry
+    if with_edge_ids:
+        row['edge_ids'] = json.dumps(path.edge_ids)
+    return row
+
+
+def find_od_path_attrs(od: BatchOd) -> dict:
+    """Finds the paths of an OD and returns the attributes of them as rows (paths) with the index of the OD, or
+    the error key of the OD.
+    """
+    return find_od_results(od, lambda finder: {
+        'paths': [get_path_row(path, od.with_edge_ids) for path in finder.path_set.get_all_paths()]
+    })
+
+
+class BatchRouter:
+    """Routes batches of ODs in a pool of forked processes (see the module docstring).
+
+    Attributes:
+        __processes: The number of processes of the pool (0 = the ODs are routed in the calling process).
+        __pool: The process pool and the AQI generation of the graph at the time of forking the processes.
+    """
+
+    def __init__(self, logger: Logger, G: GraphHandler, processes: int):
+        global worker_graph, worker_log
+        worker_graph, worker_log = G, logger
+        self.log = logger
+        self.__G = G
+        self.__processes = processes if 'fork' in multiprocessing.get_all_start_methods() else 0
+        self.__pool: Union[Tuple[multiprocessing.pool.Pool, AqiGeneration], None] = None
+        self.__lock = threading.Lock()
+
+    def __get_pool(self) -> multiprocessing.pool.Pool:
+        """Returns the process pool of the latest AQI generation (the pool is created on first use).
+        """
+        with self.__lock:
+            aqi_generation = self.__G.get_aqi_generation()
+            if self.__pool and self.__pool[1] is not aqi_generation:
+                self.__close_pool()
+            if not self.__pool:
+                self.log.info(f'Starting {self.__processes} batch routing processes')
+                pool = multiprocessing.get_context('fork').Pool(self.__processes, initializer=init_worker)
+                self.__pool = (pool, aqi_generation)
+            return self.__pool[0]
+
+    def __close_pool(self) -> None:
+        """Closes the process pool and waits for the processes to exit (after their current tasks).
+        """
+        if self.__pool:
+            self.__pool[0].close()
+            self.__pool[0].join()
+            self.__pool = None
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__close_pool()
+
+    def find_paths(self, ods: List[BatchOd], find_od_results: Callable[[BatchOd], dict] = find_od_paths) -> Iterator[dict]:
+        """Finds the paths of the ODs and yields the results (by find_od_results(), e.g. find_od_paths() or
+        find_od_path_attrs()) in the order of completion.
+        """
+        if not self.__processes:
+            for od in ods:
+                yield find_od_results(od)
+            return
+        yield from self.__get_pool().imap_unordered(find_od_results, ods)
+
+
+def get_results_file(results_dir: str, batch_id: str) -> str:
+    return os.path.join(results_dir, batch_id + '.ndjson')
+
+
+def get_done_file(results_dir: str, batch_id: str) -> str:
+    return os.path.join(results_dir, batch_id + '.done')
+
+
+def remove_expired_results(results_dir: str, ttl: int) -> None:
+    """Removes the results of the batches that were queued more than ttl seconds ago.
+    """
+    for file_name in os.listdir(results_dir):
+        file_path = os.path.join(results_dir, file_name)
+        try:
+            if os.path.getmtime(file_path) < time.time() - ttl:
+                os.remove(file_path)
+        except FileNotFoundError:
+            pass # removed by the batch routing process of another worker
+
+
+def read_batch_results(results_dir: str, batch_id: str, offset: int = 0) -> Union[Tuple[List[str], bool], None]:
+    """Returns the results of a batch that are completed so far (as NDJSON lines in the order of completion,
+    from the offset) and whether the batch is done. Returns None if the batch is not found.
+    """
+    if not re.fullmatch('[0-9a-f]{32}', batch_id):
+        return None
+    # (done is checked first, hence the results of a done batch are complete)
+    done = os.path.exists(get_done_file(results_dir, batch_id))
+    try:
+        with open(get_results_file(results_dir, batch_id)) as f:
+            # (without the last line if it is being written)
+            lines = f.read().split('\n')[:-1]
+    except FileNotFoundError:
+        return None
+    return lines[offset:], done
+
+
+def route_batches(
+    log: Logger,
+    G: GraphHandler,
+    processes: int,
+    batch_queue: Union[multiprocessing.Queue, queue.Queue],
+    results_dir: str,
+    results_ttl: int,
+    parent_pid: Union[int, None]
+) -> None:
+    """Routes the batches of the queue one at a time and writes the results of each batch to the results file
+    of the batch (as NDJSON in the order of completion) and an empty done file after the last result. The graph
+    gets the AQI generation of a batch before the batch is routed (the AQI data of the worker that queued it).
+    Runs until None is queued or the parent process (if given) has exited.
+    """
+    if parent_pid is not None:
+        init_worker()
+    router = BatchRouter(log, G, processes)
+    aqi_updater: Union[GraphAqiUpdater, None] = None
+    while True:
+        try:
+            batch = batch_queue.get(timeout=5)
+        except queue.Empty:
+            if parent_pid is not None and os.getppid() != parent_pid:
+                router.close()
+                return
+            continue
+        if batch is None:
+            router.close()
+            return
+        batch_id, ods, aqi_data = batch
+
+        remove_expired_results(results_dir, results_ttl)
+        if aqi_data != G.get_aqi_generation().aqi_data:
+            try:
+                aqi_updater = aqi_updater or GraphAqiUpdater(log, G, scheduled=False)
+                aqi_updater.update_aqi_to_graph(aqi_data)
+            except Exception:
+                log.error(traceback.format_exc())
+        # clean paths are not routed by other AQI data than the one of the worker that queued the batch
+        aqi_errors = [
+            { 'idx': od.idx, 'error_key': ErrorKeys.NO_REAL_TIME_AQI_AVAILABLE.value }
+            for od in ods if od.routing_mode == RoutingMode.CLEAN and aqi_data != G.get_aqi_generation().aqi_data
+        ]
+        aqi_error_idxs = set(error['idx'] for error in aqi_errors)
+        try:
+            with open(get_results_file(results_dir, batch_id), 'a') as f:
+                for result in chain(aqi_errors, router.find_paths([od for od in ods if od.idx not in aqi_error_idxs])):
+                    f.write(json.dumps(result) + '\n')
+                    f.flush()
+        except Exception:
+            log.error(traceback.format_exc())
+        open(get_done_file(results_dir, batch_id), 'w').close()
+
+
+class BatchRoutingProcess:
+    """Routes the batches of the routing API in a dedicated process (see the module docstring). The process must
+    be started before the calling process starts any threads. The process is not daemonic (as it forks the pool)
+    and is stopped when the calling process exits. Where fork is not available, the batches are routed in a
+    thread of the calling process.
+
+    Attributes:
+        __results_dir: The directory of the results of the batches (shared by the workers of the app).
+        __queue: The queue of the batches (batch id, ODs and the AQI data of the graph) to the process.
+        __process: The batch routing process (or thread).
+    """
+
+    def __init__(self, logger: Logger, G: GraphHandler, processes: int, results_dir: str, results_ttl: int):
+        self.log = logger
+        self.__results_dir = results_dir
+        os.makedirs(results_dir, exist_ok=True)
+        args = (logger, G, processes)
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            self.__queue = context.Queue()
+            args += (self.__queue, results_dir, results_ttl, os.getpid())
+            self.__process = context.Process(target=route_batches, args=args, name='batch-routing')
+        else:
+            self.__queue = queue.Queue()
+            args += (self.__queue, results_dir, results_ttl, None)
+            self.__process = threading.Thread(target=route_batches, args=args, name='batch-routing', daemon=True)
+        self.__process.start()
+        # (before the exit function of multiprocessing that waits for the process)
+        atexit.register(self.close)
+
+    def close(self) -> None:
+        """Stops the batch routing process after the queued batches and waits for it to exit.
+        """
+        if self.__process.is_alive():
+            self.__queue.put(None)
+            self.__process.join()
+
+    def submit(self, ods: List[BatchOd], errors: List[dict], aqi_data: str) -> str:
+        """Queues a batch of ODs to the batch routing process and returns the id of the batch. The errors of
+        the ODs that are not routed (e.g. invalid ODs) are the first results of the batch.
+        """
+        batch_id = uuid.uuid4().hex
+        with open(get_results_file(self.__results_dir, batch_id), 'w') as f:
+            f.writelines(json.dumps(error) + '\n' for error in errors)
+        self.__queue.put((batch_id, ods, aqi_data))
+        return batch_id
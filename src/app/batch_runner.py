@@ -0,0 +1,290 @@
+"""
+This module runs offline batch routing: it loads the graph once, reads ODs from a CSV or Parquet file, finds
+and processes the paths of the ODs in a pool of processes (see app/batch_routing.py) in the same way as the
+routing API and writes the attributes of the paths (lengths, length diffs and noise, AQI & GVI exposures) with
+the path geometries (EPSG:3879) to a GeoPackage or to Parquet files. No routing app needs to be running.
+
+The ODs are routed in chunks and the paths of each chunk are written to the output before the next chunk. The
+number of written chunks is saved to a checkpoint file next to the output (<output>.checkpoint.json), hence an
+interrupted run continues from the first unwritten chunk if it is started again with the same arguments.
+
+The OD file must have columns orig_lat, orig_lon, dest_lat & dest_lon and may have columns id, travel_mode &
+exposure_mode (by default, the row number and the modes given as arguments). Each path is a row with the OD id
+(od_id) and the chunk number. An OD whose paths could not be found is a row with only the error key. Clean
+paths are not available in offline batch routing (as there is no real-time AQI data). Nested path attributes
+(e.g. noises) and the edge ids of the paths (--edge-ids) are written as JSON strings. Writing Parquet requires
+pyarrow, and the Parquet output is a directory of one file per chunk (e.g. paths.parquet/part-00000.parquet).
+
+This script is intended to be run from the root of the project (src/) with the command:
+python -m app.batch_runner graphs/hma.graphml ods.csv paths.gpkg [--processes 4] [--chunk-size 10000] [--edge-ids]
+
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, List, Tuple, Union
+import pandas as pd
+import geopandas as gpd
+import env
+from app.batch_routing import BatchOd, BatchRouter, find_od_path_attrs
+from app.graph_handler import GraphHandler
+from app.constants import TravelMode, RoutingMode, RoutingException, ErrorKeys
+from app.logger import Logger
+
+
+# the columns (and dtypes) of the output: all path attributes of all routing modes (see Path.get_props())
+path_columns: Dict[str, str] = {
+    'od_id': 'object',
+    'chunk': 'int64',
+    'error_key': 'object',
+    'type': 'object',
+    'id': 'object',
+    'length': 'float64',
+    'length_b': 'float64',
+    'len_diff': 'float64',
+    'len_diff_rat': 'float64',
+    'cost_coeff': 'float64',
+    'missing_aqi': 'boolean',
+    'missing_noises': 'boolean',
+    'missing_gvi': 'boolean',
+    'noises': 'object',
+    'mdB': 'float64',
+    'nei': 'float64',
+    'nei_norm': 'float64',
+    'noise_range_exps': 'object',
+    'noise_pcts': 'object',
+    'mdB_diff': 'float64',
+    'nei_diff': 'float64',
+    'nei_diff_rat': 'float64',
+    'path_score': 'float64',
+    'aqi_m': 'float64',
+    'aqc': 'float64',
+    'aqc_norm': 'float64',
+    'aqi_cl_exps': 'object',
+    'aqi_cl_pcts': 'object',
+    'aqi_m_diff': 'float64',
+    'aqc_diff': 'float64',
+    'aqc_diff_rat': 'float64',
+    'aqc_diff_score': 'float64',
+    'gvi_m': 'float64',
+    'gvi_cl_exps': 'object',
+    'gvi_cl_pcts': 'object',
+    'gvi_m_diff': 'float64',
+    'edge_ids': 'object'
+}
+
+
+def read_ods(ods_file: str, travel_mode: str, exposure_mode: str) -> pd.DataFrame:
+    """Reads the ODs from a CSV or Parquet file (with the default ids and modes for missing columns).
+    """
+    ods = pd.read_parquet(ods_file) if ods_file.endswith('.parquet') else pd.read_csv(ods_file)
+    missing_columns = [col for col in ('orig_lat', 'orig_lon', 'dest_lat', 'dest_lon') if col not in ods.columns]
+    if missing_columns:
+        raise ValueError(f'Missing columns in {ods_file}: {missing_columns}')
+    if 'id' not in ods.columns:
+        ods['id'] = ods.index
+    if 'travel_mode' not in ods.columns:
+        ods['travel_mode'] = travel_mode
+    if 'exposure_mode' not in ods.columns:
+        ods['exposure_mode'] = exposure_mode
+    return ods.reset_index(drop=True)
+
+
+def get_routing_modes(G: GraphHandler, travel_mode: str, exposure_mode: str) -> Tuple[TravelMode, RoutingMode]:
+    """Returns the travel mode and the routing mode of an OD.
+
+    Raises:
+        RoutingException with the error key of an invalid (or unavailable) mode.
+    """
+    try:
+        travel_mode = TravelMode(travel_mode)
+    except Exception:
+        raise RoutingException(ErrorKeys.INVALID_TRAVEL_MODE_PARAM.value)
+
+    try:
+        routing_mode = RoutingMode(exposure_mode)
+    except Exception:
+        raise RoutingException(ErrorKeys.INVALID_EXPOSURE_MODE_PARAM.value)
+
+    if routing_mode == RoutingMode.CLEAN:
+        if not env.clean_paths_enabled or G.get_aqi_generation().aqi_data == '':
+            raise RoutingException(ErrorKeys.NO_REAL_TIME_AQI_AVAILABLE.value)
+
+    return travel_mode, routing_mode
+
+
+def get_chunk_rows(
+    G: GraphHandler,
+    router: BatchRouter,
+    ods: pd.DataFrame,
+    max_detour_ratio: Union[float, None],
+    with_edge_ids: bool
+) -> List[dict]:
+    """Finds the paths of the ODs (of a chunk) and returns the rows of the paths (and errors) in the order of
+    the ODs.
+    """
+    results: List[dict] = []
+    batch_ods: List[BatchOd] = []
+    for idx, od in zip(ods.index, ods.itertuples(index=False)):
+        try:
+            travel_mode, routing_mode = get_routing_modes(G, od.travel_mode, od.exposure_mode)
+            batch_ods.append(BatchOd(
+                idx, travel_mode, routing_mode, (od.orig_lat, od.orig_lon), (od.dest_lat, od.dest_lon),
+                max_detour_ratio, with_edge_ids))
+        except RoutingException as e:
+            results.append({ 'idx': idx, 'error_key': str(e) })
+
+    results.extend(router.find_paths(batch_ods, find_od_path_attrs))
+    results.sort(key=lambda result: result['idx'])
+
+    rows = []
+    for result in results:
+        od_id = ods.at[result['idx'], 'id']
+        if 'error_key' in result:
+            rows.append({ 'od_id': od_id, 'error_key': result['error_key'], 'geometry': None })
+        else:
+            rows.extend({ 'od_id': od_id, **row } for row in result['paths'])
+    return rows
+
+
+def get_chunk_gdf(rows: List[dict], chunk: int) -> gpd.GeoDataFrame:
+    """Returns the rows of a chunk as a GeoDataFrame with the columns and dtypes of the output.
+    """
+    df = pd.DataFrame(rows, columns=[*path_columns, 'geometry'])
+    df['od_id'] = df['od_id'].astype(str)
+    df['chunk'] = chunk
+    df = df.astype(path_columns)
+    return gpd.GeoDataFrame(df, geometry='geometry', crs='EPSG:3879')
+
+
+class BatchOutput:
+    """Writes the chunks of paths to a GeoPackage (one layer) or to Parquet files (one per chunk) and keeps the
+    checkpoint of the written chunks.
+
+    Attributes:
+        __output: The GeoPackage file or the Parquet directory.
+        __checkpoint_file: The checkpoint file of the output (<output>.checkpoint.json).
+        __run_args: The arguments of the run that must match when the run is continued.
+    """
+
+    def __init__(self, output: str, run_args: dict):
+        if not output.endswith(('.gpkg', '.parquet')):
+            raise ValueError(f'Output must be a GeoPackage (.gpkg) or Parquet (.parquet): {output}')
+        self.__output = output
+        self.__is_gpkg = output.endswith('.gpkg')
+        self.__checkpoint_file = output + '.checkpoint.json'
+        self.__run_args = run_args
+
+    def get_done_chunks(self) -> int:
+        """Returns the number of chunks written by a previous run (with the same arguments) and removes the
+        paths of unfinished chunks from the output.
+
+        Raises:
+            ValueError if the output exists but was not written by a previous run with the same arguments.
+        """
+        if not os.path.exists(self.__checkpoint_file):
+            if os.path.exists(self.__output):
+                raise ValueError(f'Output {self.__output} exists without a checkpoint file')
+            return 0
+
+        with open(self.__checkpoint_file) as f:
+            checkpoint = json.load(f)
+        if checkpoint['run_args'] != self.__run_args:
+            raise ValueError(f'Arguments differ from the checkpoint {self.__checkpoint_file}: {checkpoint["run_args"]}')
+        done_chunks = checkpoint['done_chunks']
+
+        if self.__is_gpkg and os.path.exists(self.__output):
+            with sqlite3.connect(self.__output) as con:
+                con.execute('DELETE FROM paths WHERE chunk >= ?', (done_chunks,))
+        elif not self.__is_gpkg and os.path.exists(self.__output):
+            for part_file in os.listdir(self.__output):
+                if int(part_file.split('-')[1].split('.')[0]) >= done_chunks:
+                    os.remove(os.path.join(self.__output, part_file))
+        return done_chunks
+
+    def write_chunk(self, gdf: gpd.GeoDataFrame, chunk: int) -> None:
+        """Writes the paths of a chunk and saves the chunk to the checkpoint as written.
+        """
+        if self.__is_gpkg:
+            gdf.to_file(
+                self.__output, layer='paths', driver='GPKG', mode='a' if os.path.exists(self.__output) else 'w')
+        else:
+            os.makedirs(self.__output, exist_ok=True)
+            gdf.to_parquet(os.path.join(self.__output, f'part-{chunk:05d}.parquet'))
+
+        checkpoint_tmp = self.__checkpoint_file + '.tmp'
+        with open(checkpoint_tmp, 'w') as f:
+            json.dump({ 'run_args': self.__run_args, 'done_chunks': chunk + 1 }, f)
+        os.replace(checkpoint_tmp, self.__checkpoint_file)
+
+
+def run_batch(
+    log: Logger,
+    graph_file: str,
+    ods_file: str,
+    output: str,
+    processes: int,
+    chunk_size: int,
+    travel_mode: str = TravelMode.WALK.value,
+    exposure_mode: str = RoutingMode.QUIET.value,
+    max_detour_ratio: Union[float, None] = None,
+    with_edge_ids: bool = False
+) -> None:
+    ods = read_ods(ods_file, travel_mode, exposure_mode)
+    batch_output = BatchOutput(output, {
+        'ods_file': os.path.abspath(ods_file),
+        'od_count': len(ods),
+        'chunk_size': chunk_size,
+        'travel_mode': travel_mode,
+        'exposure_mode': exposure_mode,
+        'max_detour_ratio': max_detour_ratio,
+        'edge_ids': with_edge_ids
+    })
+    done_chunks = batch_output.get_done_chunks()
+    chunk_count = -(-len(ods) // chunk_size)
+    if done_chunks >= chunk_count:
+        log.info(f'All {len(ods)} ODs already routed to {output}')
+        return
+    if done_chunks:
+        log.info(f'Continuing from chunk {done_chunks + 1}/{chunk_count} (checkpoint)')
+
+    G = GraphHandler(log, graph_file)
+    router = BatchRouter(log, G, processes)
+
+    start_time = time.time()
+    for chunk in range(done_chunks, chunk_count):
+        chunk_time = time.time()
+        chunk_ods = ods.iloc[chunk * chunk_size:(chunk + 1) * chunk_size]
+        rows = get_chunk_rows(G, router, chunk_ods, max_detour_ratio, with_edge_ids)
+        batch_output.write_chunk(get_chunk_gdf(rows, chunk), chunk)
+        log.info(
+            f'Routed chunk {chunk + 1}/{chunk_count} ({len(chunk_ods)} ODs, {len(rows)} rows) '
+            f'in {round(time.time() - chunk_time, 1)} s')
+
+    routed_count = len(ods) - done_chunks * chunk_size
+    log.info(f'Routed {routed_count} ODs to {output} in {round(time.time() - start_time, 1)} s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m app.batch_runner', description='Offline batch routing')
+    parser.add_argument('graph_file', help='graph.graphml or graph bundle dir')
+    parser.add_argument('ods_file', help='ODs as CSV or Parquet')
+    parser.add_argument('output', help='output GeoPackage (.gpkg) or Parquet directory (.parquet)')
+    parser.add_argument('--processes', type=int, default=env.batch_routing_processes)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--travel-mode', default=TravelMode.WALK.value, help='default travel mode of the ODs')
+    parser.add_argument('--exposure-mode', default=RoutingMode.QUIET.value, help='default exposure mode of the ODs')
+    parser.add_argument('--max-detour-ratio', type=float, default=None)
+    parser.add_argument('--edge-ids', action='store_true', help='write the edge ids of the paths')
+    args = parser.parse_args()
+    try:
+        run_batch(
+            Logger(b_printing=True), args.graph_file, args.ods_file, args.output, args.processes, args.chunk_size,
+            args.travel_mode, args.exposure_mode, args.max_detour_ratio, args.edge_ids)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
@@ -0,0 +1,31 @@
+"""
+This module builds the contraction hierarchy (CH) index of a graph for the shortest path (length) queries
+and saves it next to the graph file (see app/contraction_hierarchy.py). The index is loaded by GraphHandler
+at startup if it matches the graph (the same nodes, edges and edge lengths). Hence the same index is used for
+a GraphML file and the graph bundle compiled from it, and the index must be rebuilt if the graph changes.
+
+This script is intended to be run from the root of the project (src/) with the command:
+python -m app.ch_builder graphs/hma.graphml
+
+"""
+
+import sys
+import time
+from app.logger import Logger
+from app.graph_handler import GraphHandler
+from app.contraction_hierarchy import get_ch_file
+
+
+def build_ch(log: Logger, graph_file: str) -> None:
+    start_time = time.time()
+    G = GraphHandler(log, graph_file)
+    ch_file = get_ch_file(graph_file)
+    G.export_length_ch(ch_file)
+    log.info(f'Built contraction hierarchy of {graph_file} to {ch_file} in {round(time.time() - start_time, 1)} s')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('Usage: python -m app.ch_builder <graph.graphml or graph bundle dir>')
+        sys.exit(1)
+    build_ch(Logger(b_printing=True), sys.argv[1])
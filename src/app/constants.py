@@ -44,5 +44,11 @@ class ErrorKeys(Enum):
     NO_REAL_TIME_AQI_AVAILABLE = 'no_real_time_aqi_available'
     INVALID_TRAVEL_MODE_PARAM = 'invalid_travel_mode_in_request_params'
     INVALID_EXPOSURE_MODE_PARAM = 'invalid_exposure_mode_in_request_params'
+    INVALID_DETOUR_RATIO_PARAM = 'invalid_max_detour_ratio_in_request_params'
+    INVALID_DESTINATIONS_PARAM = 'invalid_destinations_in_request_params'
+    INVALID_OD_PARAM = 'invalid_od_in_request_params'
+    INVALID_BUDGET_PARAM = 'invalid_budget_in_request_params'
+    INVALID_SENSITIVITY_PARAM = 'invalid_sensitivity_in_request_params'
+    BATCH_NOT_FOUND = 'batch_not_found'
     AQI_ROUTING_NOT_AVAILABLE = 'air_quality_routing_not_available'
     UNKNOWN_ERROR = 'unknown_error'
\ No newline at end of file
@@ -0,0 +1,327 @@
+"""
+This module provides a contraction hierarchy (CH) index for fast shortest path queries by a static edge
+weight (length). The index is built offline (see app/ch_builder.py) and saved next to the graph file.
+
+Building the index contracts the nodes one by one (in the order of their importance) and adds shortcut edges
+between the neighbours of each contracted node, where needed to preserve the shortest paths. A query is a
+bidirectional Dijkstra search that only follows edges to more important nodes, hence it settles only a small
+part of the graph. Shortcuts of the found path are unpacked to the edges of the graph.
+
+"""
+
+import os
+import json
+import heapq
+import time
+from math import inf
+from typing import Dict, List, Set, Tuple, Union
+import numpy as np
+from app.logger import Logger
+from utils.arrays import get_array_hash
+
+
+def get_ch_file(graph_file: str) -> str:
+    """Returns the path of the CH index file of a graph (GraphML file or graph bundle), e.g.
+    graphs/hma.graphml -> graphs/hma.length.ch.npz
+    """
+    return os.path.splitext(graph_file.rstrip('/'))[0] + '.length.ch.npz'
+
+
+class ContractionHierarchy:
+    """Contraction hierarchy of a directed graph. The edges of the hierarchy are either edges of the graph
+    (with edge id) or shortcuts that consist of two edges of the hierarchy (children).
+    """
+
+    def __init__(
+        self,
+        ranks: np.ndarray,
+        ch_sources: np.ndarray,
+        ch_targets: np.ndarray,
+        ch_weights: np.ndarray,
+        ch_edge_ids: np.ndarray,
+        ch_children: np.ndarray,
+        metadata: dict
+    ):
+        self.metadata = metadata
+        self.__arrays = {
+            'ranks': ranks, 'ch_sources': ch_sources, 'ch_targets': ch_targets, 'ch_weights': ch_weights,
+            'ch_edge_ids': ch_edge_ids, 'ch_children': ch_children
+        }
+        self.__sources: List[int] = ch_sources.tolist()
+        self.__targets: List[int] = ch_targets.tolist()
+        self.__edge_ids: List[int] = ch_edge_ids.tolist()
+        self.__children: List[Tuple[int, int]] = [tuple(children) for children in ch_children.tolist()]
+        # edges to more important nodes (upward) by source node and edges from more important nodes by target
+        # node (the search graphs of the forward and the backward search)
+        upward = ranks[ch_targets] > ranks[ch_sources]
+        self.__up_forward = self.__get_search_graph(len(ranks), np.flatnonzero(upward), ch_sources, ch_targets, ch_weights)
+        self.__up_backward = self.__get_search_graph(len(ranks), np.flatnonzero(~upward), ch_targets, ch_sources, ch_weights)
+
+    def __get_search_graph(
+        self,
+        vcount: int,
+        ch_edges: np.ndarray,
+        rows: np.ndarray,
+        cols: np.ndarray,
+        weights: np.ndarray
+    ) -> Tuple[List[int], List[int], List[float], List[int]]:
+        """Returns the CH edges as CSR adjacency (row offsets, adjacent nodes, weights and CH edge indexes).
+        """
+        ch_edges = ch_edges[np.argsort(rows[ch_edges], kind='stable')]
+        indptr = np.searchsorted(rows[ch_edges], np.arange(vcount + 1))
+        return indptr.tolist(), cols[ch_edges].tolist(), weights[ch_edges].tolist(), ch_edges.tolist()
+
+    @classmethod
+    def build(
+        cls,
+        log: Logger,
+        vcount: int,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        weights: np.ndarray,
+        witness_settled_limit: int = 100,
+        priority_settled_limit: int = 20
+    ) -> 'ContractionHierarchy':
+        """Builds a contraction hierarchy of a directed graph by the edge weights (edges with missing weights
+        are excluded). Witness searches (that check whether a shortcut is needed) are limited by the number of
+        settled nodes, which may add some unnecessary shortcuts but never breaks the shortest paths. Shortcuts
+        are only estimated with more limited witness searches when updating the priorities of the nodes. The
+        estimates of the neighbours of a contracted node are updated lazily (when they are popped from the queue),
+        since updating them right away took most of the build time.
+        """
+        start_time = time.time()
+        ch_sources: List[int] = []
+        ch_targets: List[int] = []
+        ch_weights: List[float] = []
+        ch_edge_ids: List[int] = []
+        ch_children: List[Tuple[int, int]] = []
+        # CH edges between the nodes that are not contracted yet: node -> adjacent node -> CH edge index
+        out_edges: List[Dict[int, int]] = [{} for _ in range(vcount)]
+        in_edges: List[Dict[int, int]] = [{} for _ in range(vcount)]
+
+        def add_edge(source: int, target: int, weight: float, edge_id: int, children: Tuple[int, int]) -> None:
+            existing = out_edges[source].get(target)
+            if existing is not None and ch_weights[existing] <= weight:
+                return
+            out_edges[source][target] = in_edges[target][source] = len(ch_weights)
+            ch_sources.append(source)
+            ch_targets.append(target)
+            ch_weights.append(weight)
+            ch_edge_ids.append(edge_id)
+            ch_children.append(children)
+
+        for edge_id, (source, target, weight) in enumerate(zip(sources.tolist(), targets.tolist(), weights.tolist())):
+            if source != target and weight == weight:
+                add_edge(source, target, weight, edge_id, (-1, -1))
+
+        def get_witnessed_targets(source: int, via: int, target_costs: Dict[int, float], settled_limit: int) -> Set[int]:
+            """Returns the targets that can be reached from the source (without the node) with at most the
+            given costs.
+            """
+            max_cost = max(target_costs.values())
+            costs = { source: 0.0 }
+            heap = [(0.0, source)]
+            settled = 0
+            unsettled_targets = len(target_costs)
+            while heap and settled < settled_limit and unsettled_targets:
+                cost, node = heapq.heappop(heap)
+                if cost > costs[node]:
+                    continue
+                if cost > max_cost:
+                    break
+                settled += 1
+                if node in target_costs:
+                    unsettled_targets -= 1
+                for adj_node, ch_edge in out_edges[node].items():
+                    adj_cost = cost + ch_weights[ch_edge]
+                    if adj_node != via and adj_cost < costs.get(adj_node, inf):
+                        costs[adj_node] = adj_cost
+                        heapq.heappush(heap, (adj_cost, adj_node))
+            return { target for target, cost in target_costs.items() if costs.get(target, inf) <= cost }
+
+        def get_shortcuts(node: int, settled_limit: int = witness_settled_limit) -> List[Tuple[int, int, float, int, int]]:
+            shortcuts = []
+            for source, in_edge in in_edges[node].items():
+                target_costs = {
+                    target: ch_weights[in_edge] + ch_weights[out_edge]
+                    for target, out_edge in out_edges[node].items() if target != source
+                }
+                if not target_costs:
+                    continue
+                witnessed = get_witnessed_targets(source, node, target_costs, settled_limit)
+                shortcuts.extend(
+                    (source, target, cost, in_edge, out_edges[node][target])
+                    for target, cost in target_costs.items() if target not in witnessed
+                )
+            return shortcuts
+
+        contracted_neighbours = [0] * vcount
+        levels = [0] * vcount
+        edge_differences = [0] * vcount
+
+        def get_priority(node: int) -> int:
+            # edge difference + number of contracted neighbours + level of the node in the hierarchy
+            return 2 * edge_differences[node] + contracted_neighbours[node] + levels[node]
+
+        def update_edge_difference(node: int) -> None:
+            shortcut_count = len(get_shortcuts(node, priority_settled_limit))
+            edge_differences[node] = shortcut_count - len(in_edges[node]) - len(out_edges[node])
+
+        for node in range(vcount):
+            update_edge_difference(node)
+        priorities = [get_priority(node) for node in range(vcount)]
+        heap = [(priority, node) for node, priority in enumerate(priorities)]
+        heapq.heapify(heap)
+        contracted = [False] * vcount
+        # the edge differences of the neighbours of the contracted nodes are updated lazily (when popped)
+        stale = [False] * vcount
+        ranks = np.zeros(vcount, dtype=np.int64)
+        rank = 0
+        while heap:
+            priority, node = heapq.heappop(heap)
+            if contracted[node] or priority != priorities[node]:
+                continue
+            if stale[node]:
+                update_edge_difference(node)
+                stale[node] = False
+                priorities[node] = get_priority(node)
+                if heap and priorities[node] > heap[0][0]:
+                    heapq.heappush(heap, (priorities[node], node))
+                    continue
+            for source, target, cost, in_edge, out_edge in get_shortcuts(node):
+                add_edge(source, target, cost, -1, (in_edge, out_edge))
+            neighbours = set(in_edges[node]) | set(out_edges[node])
+            for adj_node in neighbours:
+                out_edges[adj_node].pop(node, None)
+                in_edges[adj_node].pop(node, None)
+            out_edges[node] = {}
+            in_edges[node] = {}
+            contracted[node] = True
+            ranks[node] = rank
+            rank += 1
+            for adj_node in neighbours:
+                contracted_neighbours[adj_node] += 1
+                levels[adj_node] = max(levels[adj_node], levels[node] + 1)
+                stale[adj_node] = True
+                priorities[adj_node] = get_priority(adj_node)
+                heapq.heappush(heap, (priorities[adj_node], adj_node))
+            if rank % 50000 == 0:
+                log.info(f'Contracted {rank} / {vcount} nodes')
+
+        log.duration(start_time, f'Built contraction hierarchy with {len(ch_weights) - len(sources)} shortcuts', log_level='info')
+        return cls(
+            ranks,
+            np.array(ch_sources, dtype=np.int64),
+            np.array(ch_targets, dtype=np.int64),
+            np.array(ch_weights, dtype=np.float64),
+            np.array(ch_edge_ids, dtype=np.int64),
+            np.array(ch_children, dtype=np.int64).reshape(-1, 2),
+            { 'vcount': vcount, 'ecount': len(sources), 'weights_hash': get_array_hash(weights) }
+        )
+
+    def save(self, ch_file: str) -> None:
+        np.savez(ch_file, metadata=np.array(json.dumps(self.metadata)), **self.__arrays)
+
+    @classmethod
+    def load(cls, ch_file: str) -> 'ContractionHierarchy':
+        with np.load(ch_file) as ch_data:
+            return cls(
+                ch_data['ranks'],
+                ch_data['ch_sources'],
+                ch_data['ch_targets'],
+                ch_data['ch_weights'],
+                ch_data['ch_edge_ids'],
+                ch_data['ch_children'],
+                json.loads(str(ch_data['metadata']))
+            )
+
+    def is_valid_for(self, vcount: int, weights: np.ndarray) -> bool:
+        """Returns True if the hierarchy was built for a graph with the given number of nodes and edge weights.
+        """
+        return (
+            self.metadata['vcount'] == vcount and self.metadata['ecount'] == len(weights)
+            and self.metadata['weights_hash'] == get_array_hash(weights)
+        )
+
+    def find_least_cost_paths(
+        self,
+        source: int,
+        targets: List[int],
+        reverse: bool = False
+    ) -> List[Union[Tuple[float, List[int]], None]]:
+        """Finds the least cost paths from the source to the targets (or from the targets to the source if
+        reverse is True). Returns the cost and the edge ids of each path, or None for unreachable targets.
+        """
+        return [
+            self.__find_least_cost_path(target, source) if reverse else self.__find_least_cost_path(source, target)
+            for target in targets
+        ]
+
+    def __find_least_cost_path(self, orig: int, dest: int) -> Union[Tuple[float, List[int]], None]:
+        if orig == dest:
+            return (0.0, [])
+        # the search graph of the other search is used for stalling (stall-on-demand): a node is not expanded
+        # if it can be reached with a lower cost via a more important node
+        forward = (self.__up_forward, self.__up_backward, { orig: 0.0 }, { orig: -1 }, [(0.0, orig)])
+        backward = (self.__up_backward, self.__up_forward, { dest: 0.0 }, { dest: -1 }, [(0.0, dest)])
+        best_cost, meeting_node = inf, None
+        search, other = forward, backward
+        while True:
+            # alternate the searches, a search stops when its minimum cost reaches the best cost
+            if not (search[4] and search[4][0][0] < best_cost):
+                search, other = other, search
+                if not (search[4] and search[4][0][0] < best_cost):
+                    break
+            (indptr, adj_nodes, weights, ch_edges), stall_graph, costs, preds, heap = search
+            cost, node = heapq.heappop(heap)
+            if cost > costs[node]:
+                continue
+            other_costs = other[2]
+            if node in other_costs and cost + other_costs[node] < best_cost:
+                best_cost, meeting_node = cost + other_costs[node], node
+            stall_indptr, stall_nodes, stall_weights, _ = stall_graph
+            if not any(
+                costs.get(stall_nodes[entry], inf) + stall_weights[entry] < cost 
+                for entry in range(stall_indptr[node], stall_indptr[node + 1])
+            ):
+                for entry in range(indptr[node], indptr[node + 1]):
+                    adj_node = adj_nodes[entry]
+                    adj_cost = cost + weights[entry]
+                    if adj_cost < costs.get(adj_node, inf):
+                        costs[adj_node] = adj_cost
+                        preds[adj_node] = ch_edges[entry]
+                        heapq.heappush(heap, (adj_cost, adj_node))
+            search, other = other, search
+
+        if meeting_node is None:
+            return None
+        forward_preds, backward_preds = forward[3], backward[3]
+        forward_ch_edges = self.__get_ch_edge_path(forward_preds, meeting_node, self.__sources)[::-1]
+        backward_ch_edges = self.__get_ch_edge_path(backward_preds, meeting_node, self.__targets)
+        return (best_cost, [edge_id for ch_edge in forward_ch_edges + backward_ch_edges for edge_id in self.__unpack(ch_edge)])
+
+    def __get_ch_edge_path(self, preds: Dict[int, int], node: int, pred_nodes: List[int]) -> List[int]:
+        """Returns the CH edges from the node to the root of the search (in search order). The preceding nodes
+        of the CH edges are their sources in the forward search and their targets in the backward search.
+        """
+        ch_edges = []
+        while preds[node] >= 0:
+            ch_edges.append(preds[node])
+            node = pred_nodes[preds[node]]
+        return ch_edges
+
+    def __unpack(self, ch_edge: int) -> List[int]:
+        """Returns the edge ids of the graph that a CH edge (edge or shortcut) consists of.
+        """
+        edge_ids = []
+        stack = [ch_edge]
+        while stack:
+            ch_edge = stack.pop()
+            edge_id = self.__edge_ids[ch_edge]
+            if edge_id >= 0:
+                edge_ids.append(edge_id)
+            else:
+                first, second = self.__children[ch_edge]
+                stack.append(second)
+                stack.append(first)
+        return edge_ids
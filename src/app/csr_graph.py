@@ -0,0 +1,56 @@
+"""
+This module provides a CSR (compressed sparse row) representation of the (directed) graph for least cost
+path searches of the routing engines (see app.routing_engines).
+
+Edge weights are kept as contiguous weight vectors in the CSR order of the edges. The vectors are created
+only once for each cost attribute (and AQI generation) and the searches consume them as is, whereas passing
+the weights to igraph requires converting all weights of the graph to a C vector on every search.
+
+"""
+
+from typing import Tuple
+import numpy as np
+
+
+class CsrGraph:
+    """Adjacency of the graph in CSR format, both in the direction of the edges (forward) and in the reverse
+    direction (for searching paths to a node from many nodes).
+    """
+
+    def __init__(self, vcount: int, sources: np.ndarray, targets: np.ndarray):
+        self.vcount = vcount
+        self.ecount = len(sources)
+        self.__forward = self.__get_csr_structure(sources, targets)
+        self.__reverse = self.__get_csr_structure(targets, sources)
+
+    def __get_csr_structure(self, rows: np.ndarray, cols: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the row offsets, column indices and edge ids of the CSR entries (edges sorted by rows).
+        """
+        edge_ids = np.lexsort((cols, rows))
+        indptr = np.searchsorted(rows[edge_ids], np.arange(self.vcount + 1)).astype(np.int32)
+        return indptr, cols[edge_ids].astype(np.int32), edge_ids
+
+    def get_adjacency(self, reverse: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the row offsets, column indices (adjacent nodes) and edge ids of the CSR entries. In the
+        reverse adjacency the rows are the targets of the edges and the columns the sources.
+        """
+        return self.__reverse if reverse else self.__forward
+
+    def get_edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the source and target nodes of the edges (by edge id).
+        """
+        indptr, indices, edge_ids = self.__forward
+        sources, targets = np.empty(self.ecount, dtype=np.int64), np.empty(self.ecount, dtype=np.int64)
+        sources[edge_ids] = np.repeat(np.arange(self.vcount), np.diff(indptr))
+        targets[edge_ids] = indices
+        return sources, targets
+
+    def get_csr_weights(self, weights: np.ndarray, reverse: bool = False) -> np.ndarray:
+        """Returns the edge weights (by edge id) as a read-only weight vector in CSR order. Missing weights (NaN)
+        are replaced with infinity (i.e. the edges are not traversable).
+        """
+        _, _, edge_ids = self.get_adjacency(reverse)
+        csr_weights = np.asarray(weights, dtype=np.float64)[edge_ids]
+        csr_weights[np.isnan(csr_weights)] = np.inf
+        csr_weights.flags.writeable = False
+        return csr_weights
@@ -2,18 +2,20 @@ import time
 import gc
 import random
 import traceback
+import numpy as np
 import pandas as pd
 from os import listdir
 from datetime import datetime, timezone
 from apscheduler.schedulers.background import BackgroundScheduler
 import env
 from app.graph_handler import GraphHandler
+from app.types import AqiGeneration
 import app.aq_exposures as aq_exps
+from utils.arrays import round_exact
 from app.logger import Logger
-import utils.igraph as ig_utils
 from utils.igraph import Edge as E
-from typing import Union
-from app.constants import cost_prefix_dict, RoutingMode, TravelMode
+from typing import Dict, Union
+from app.constants import TravelMode
 
 
 class GraphAqiUpdater:
@@ -24,22 +26,27 @@ class GraphAqiUpdater:
         __aqi_data_wip (str): The name of an aqi data csv file that is currently being updated to a graph.
         __aqi_data_latest (str): The name of the aqi data csv file that was last updated to a graph.
         __G: A GraphHandler object via which aqi values are updated to a graph.
-        __edge_df: A pandas DataFrame object containing edges to be updated (as by __create_updater_edge_df()).
+        __lengths: Lengths of the edges of the graph (by edge id).
+        __lengths_b: Biking lengths of the edges of the graph (by edge id).
         __sens (List[float]): A list of air quality sensitivity coefficients.
         __aqi_dir (str): A path to an aqi_cache -directory (e.g. 'aqi_cache/').
         __scheduler: A BackgroundScheduler instance that will periodically check for new aqi data and
             update it to a graph if available.
         __check_interval (int): The number of seconds between AQI update attempts.
+
+    If the updater is not scheduled, AQI is updated to the graph only by update_aqi_to_graph() (e.g. in the batch
+    routing process, see app/batch_routing.py).
     """
 
-    def __init__(self, logger: Logger, G: GraphHandler, aqi_dir: str = 'aqi_updates/'):
+    def __init__(self, logger: Logger, G: GraphHandler, aqi_dir: str = 'aqi_updates/', scheduled: bool = True):
         self.log = logger
         self.__aqi_update_status = ''
         self.__aqi_update_error = ''
         self.__aqi_data_wip = ''
         self.__aqi_data_latest = ''
         self.__G = G
-        self.__edge_df = self.__create_updater_edge_df(G)
+        self.__lengths = np.asarray(G.get_edge_array(E.length.value))
+        self.__lengths_b = np.asarray(G.get_edge_array(E.length_b.value))
         self.__sens = aq_exps.get_aq_sensitivities()
         self.__aqi_dir = aqi_dir if not env.test_mode else 'aqi_updates/test_data/'
         self.__scheduler = BackgroundScheduler()
@@ -51,36 +58,40 @@ class GraphAqiUpdater:
             max_instances=2,
             next_run_time=datetime.now()
         )
-        self.__start()
-
-    def __create_updater_edge_df(self, G: GraphHandler):
-        edge_df = ig_utils.get_edge_gdf(G.graph, attrs=[E.length, E.length_b])
-        edge_df[E.id_ig.name] = edge_df.index
-        edge_df = edge_df[[E.id_ig.name, E.length.name, E.length_b.name]]
-        return edge_df
+        if scheduled:
+            self.__start()
 
     def __start(self):
         self.log.info('Starting graph aqi updater with check interval (s): '+ str(self.__check_interval))
         self.__scheduler.start()
 
-    def __get_latest_aqi_data_utc_time_secs(self) -> Union[int, None]:
-        if self.__aqi_data_latest:
+    def __get_aqi_data_utc_time_secs(self, aqi_data: str) -> Union[int, None]:
+        if aqi_data:
             try:
-                aqi_data_time = self.__aqi_data_latest.split('aqi_', 1)[1].split('.')[0]
+                aqi_data_time = aqi_data.split('aqi_', 1)[1].split('.')[0]
                 dt = datetime.strptime(aqi_data_time, '%Y-%m-%dT%H')
                 return int(dt.replace(tzinfo=timezone.utc).timestamp())
             except Exception:
-                self.log.error(f'Could not parse UTC time from {self.__aqi_data_latest}')
+                self.log.error(f'Could not parse UTC time from {aqi_data}')
                 return None
         else:
             return None
 
     def get_aqi_update_status_response(self):
+        """Returns the status of the AQI generation that is currently published to the graph (i.e. used by new 
+        routing requests).
+        """
+        aqi_generation = self.__G.get_aqi_generation()
         return { 
-            'aqi_data_updated': self.__aqi_data_latest != '',
-            'aqi_data_utc_time_secs': self.__get_latest_aqi_data_utc_time_secs()
+            'aqi_data_updated': aqi_generation.aqi_data != '',
+            'aqi_data_utc_time_secs': aqi_generation.aqi_data_utc_time_secs
             }
 
+    def update_aqi_to_graph(self, aqi_updates_csv: str):
+        """Updates AQI of the given AQI data csv file (in aqi_dir) to the graph.
+        """
+        self.__read_update_aqi_to_graph(aqi_updates_csv)
+
     def __maybe_read_update_aqi_to_graph(self):
         """Triggers an AQI to graph update if new AQI data is available and not yet updated or being updated.
         """
@@ -90,7 +101,6 @@ class GraphAqiUpdater:
                 try:
                     self.__aqi_update_error = ''
                     self.__read_update_aqi_to_graph(new_aqi_data_csv)
-                    self.__validate_graph_aqi()
                     self.__aqi_data_wip = ''
                     gc.collect()
                     break
@@ -138,99 +148,88 @@ class GraphAqiUpdater:
             self.__aqi_update_status = aqi_update_status
         return new_aqi_csv
 
-    def __get_aq_update_attrs(self, aqi: float, length: float, length_b: float):        
-        aq_costs = aq_exps.get_aqi_costs(
-            aqi, length, self.__sens
+    def __get_aq_update_arrays(self, aqis: np.ndarray) -> Dict[str, np.ndarray]:
+        """Returns AQI and AQ costs of all edges as arrays (by edge id). Edges that did not receive AQI update
+        (AQI is NaN) get AQI None and high AQ costs if they have geometry and 0 if not.
+        """
+        has_aqi = ~np.isnan(aqis)
+        missing_aq_costs = np.where(self.__lengths == 0.0, 0.0, round_exact(self.__lengths + self.__lengths * 40, 2))
+
+        aq_costs = aq_exps.get_aqi_cost_arrays(
+            aqis, self.__lengths, self.__sens
         ) if env.walking_enabled else {}
         
-        aq_costs_b = aq_exps.get_aqi_costs(
-            aqi, length, self.__sens, length_b=length_b, travel_mode=TravelMode.BIKE
+        aq_costs_b = aq_exps.get_aqi_cost_arrays(
+            aqis, self.__lengths, self.__sens, lengths_b=self.__lengths_b, travel_mode=TravelMode.BIKE
         ) if env.cycling_enabled else {}
 
         return {
-            'aqi': aqi,
-            **aq_costs,
-            **aq_costs_b
+            E.aqi.value: aqis,
+            **{ 
+                cost_attr: np.where(has_aqi, costs, missing_aq_costs) 
+                for cost_attr, costs in { **aq_costs, **aq_costs_b }.items()
+            }
         }
-
-    def __get_missing_aq_update_attrs(self, length: float):
-        """Set AQI to None to all edges that did not receive AQI update. Set high AQ costs to edges with geometry and 0 to 
-        edges without.
-        """
-        aq_costs = {}
-        cost_prefix = cost_prefix_dict[TravelMode.WALK][RoutingMode.CLEAN]
-        cost_prefix_bike = cost_prefix_dict[TravelMode.BIKE][RoutingMode.CLEAN]
-
-        if (length == 0.0):
-            # set zero costs to edges with null geometry
-            aq_costs = { cost_prefix + str(sen) : 0.0 for sen in self.__sens }
-            aq_costs_b = { cost_prefix_bike + str(sen) : 0.0 for sen in self.__sens }
-        else:
-            # set high AQ costs to edges outside the AQI data extent (aqi_coeff=40)
-            aq_costs = { cost_prefix + str(sen) : round(length + length * 40, 2) for sen in self.__sens }
-            aq_costs_b = { cost_prefix_bike + str(sen) : round(length + length * 40, 2) for sen in self.__sens }
-        
-        aq_costs = aq_costs if env.walking_enabled else {}
-        aq_costs_b = aq_costs_b if env.cycling_enabled else {}
-        
-        return { E.aqi.value: None, **aq_costs, **aq_costs_b }
     
     def __read_update_aqi_to_graph(self, aqi_updates_csv: str):
-        """Updates new AQI values and AQ costs to edges and AQI=None to edges that do not get AQI update. 
+        """Creates a new AQI generation with new AQI values and AQ costs to edges (and AQI=None to edges that 
+        do not get AQI update) and publishes it to the graph after validating it. Routing requests that are being
+        processed during the update keep using the previous AQI generation. 
         """
         self.log.info('Starting AQI update from: '+ aqi_updates_csv)
         self.__aqi_data_wip = aqi_updates_csv
+        edge_count = len(self.__lengths)
 
         # read aqi update csv
-        edge_aqi_updates = pd.read_csv(self.__aqi_dir + aqi_updates_csv)
+        edge_aqi_updates = pd.read_csv(self.__aqi_dir + aqi_updates_csv, usecols=[E.id_ig.name, E.aqi.name])
+        edge_ids = edge_aqi_updates[E.id_ig.name].to_numpy()
+        aqi_values = edge_aqi_updates[E.aqi.name].to_numpy(dtype=np.float64)
 
         # inspect how many edges will get AQI
         aqi_update_count = len(edge_aqi_updates)
-        if (len(self.__edge_df) != aqi_update_count):
-            missing_ratio = round(100 * (len(self.__edge_df)-len(edge_aqi_updates)) / len(self.__edge_df), 1)
+        if (edge_count != aqi_update_count):
+            missing_ratio = round(100 * (edge_count - aqi_update_count) / edge_count, 1)
             self.log.info(f'AQI updates missing for {missing_ratio} % edges')
 
-        # update AQI and AQ costs to graph
-        aqi_update_df = pd.merge(self.__edge_df, edge_aqi_updates, on=E.id_ig.name, how='inner')
-        if (len(aqi_update_df) != aqi_update_count):
-            self.log.info(f'Failed to merge AQI updates to edge gdf, missing {aqi_update_count - len(aqi_update_df)} edges')  
-        
-        aqi_update_df['aq_updates'] = aqi_update_df.apply(lambda x: self.__get_aq_update_attrs(x['aqi'], x[E.length.name], x[E.length_b.name]), axis=1)
-        self.__G.update_edge_attr_to_graph(aqi_update_df, df_attr='aq_updates')
-
-        # update missing AQI and AQ costs to edges outside AQI data extent (AQI -> None)
-        missing_aqi_update_df = pd.merge(self.__edge_df, edge_aqi_updates, on=E.id_ig.name, how='outer', suffixes=['', '_'], indicator=True)
-        missing_aqi_update_df = missing_aqi_update_df[missing_aqi_update_df['_merge'] == 'left_only']
-        missing_aqi_update_df['aq_updates'] = [self.__get_missing_aq_update_attrs(length) for length in missing_aqi_update_df[E.length.name]]
-        self.__G.update_edge_attr_to_graph(missing_aqi_update_df, df_attr='aq_updates')
-
-        # check that all edges got either AQI value or AQI=None
-        if (len(self.__edge_df) != (len(missing_aqi_update_df) + len(aqi_update_df))):
-            self.log.error(f'Edge count: {len(self.__edge_df)} != all AQI updates: {len(missing_aqi_update_df) + len(aqi_update_df)}')
-        else:
-            self.log.info('AQI update done')
+        is_graph_edge = (edge_ids >= 0) & (edge_ids < edge_count)
+        if not is_graph_edge.all():
+            self.log.info(f'Failed to merge AQI updates to edge gdf, missing {np.count_nonzero(~is_graph_edge)} edges')
+
+        # create AQI and AQ costs for all edges (AQI -> None & high AQ costs to edges outside AQI data extent)
+        aqis = np.full(edge_count, np.nan)
+        aqis[edge_ids[is_graph_edge]] = aqi_values[is_graph_edge]
+        aqi_generation = AqiGeneration(
+            aqi_data=aqi_updates_csv,
+            aqi_data_utc_time_secs=self.__get_aqi_data_utc_time_secs(aqi_updates_csv),
+            edge_arrays=self.__get_aq_update_arrays(aqis)
+        )
+        self.__validate_aqi_generation(aqi_generation)
+
+        # replace the AQI generation of the graph
+        self.__G.publish_aqi_generation(aqi_generation)
+        self.log.info('AQI update done')
 
-        # TODO see if these help to release some memory (remove if not)
         del edge_aqi_updates
-        del aqi_update_df
-        del missing_aqi_update_df
         
         self.__aqi_data_latest = aqi_updates_csv
 
-    def __validate_graph_aqi(self):
-        edge_count = self.__G.graph.ecount()
-        has_aqi_count = 0
-        missing_aqi_count = 0
-        for edge in self.__G.graph.es:
-            if not edge[E.aqi.value]:
-                missing_aqi_count += 1
-            else:
-                has_aqi_count += 1
+        # AQ costs use landmark bounds of length only until the AQ landmark tables are built
+        try:
+            self.__G.update_aqi_landmark_tables(aqi_generation)
+        except Exception:
+            self.log.error(f'Could not build AQ landmark tables from: {aqi_updates_csv}')
+            self.log.error(traceback.format_exc())
+
+    def __validate_aqi_generation(self, aqi_generation: AqiGeneration):
+        aqis = aqi_generation.edge_arrays[E.aqi.value]
+        edge_count = len(aqis)
+        missing_aqi_count = int(np.count_nonzero(np.isnan(aqis) | (aqis == 0)))
+        has_aqi_count = edge_count - missing_aqi_count
 
         aqi_ok_ratio = has_aqi_count/edge_count
         missing_ratio = missing_aqi_count/edge_count
 
         if aqi_ok_ratio < 0.7 or missing_ratio > 0.3:
-            raise Exception(f'Graph got incomplete AQI update (aqi_ok_ratio: {round(aqi_ok_ratio, 4)}, missing_ratio: {round(missing_ratio, 4)})')
+            raise Exception(f'Got incomplete AQI update (aqi_ok_ratio: {round(aqi_ok_ratio, 4)}, missing_ratio: {round(missing_ratio, 4)})')
         else:
-            self.log.info(f'Graph AQI update resulted aqi_ok_ratio: {round(aqi_ok_ratio, 4)} & missing_ratio: {round(missing_ratio, 4)}')
+            self.log.info(f'AQI update resulted aqi_ok_ratio: {round(aqi_ok_ratio, 4)} & missing_ratio: {round(missing_ratio, 4)}')
@@ -0,0 +1,32 @@
+"""
+This module compiles a street network graph (GraphML) to a graph bundle that contains all graph attributes
+derived by GraphHandler at startup (e.g. noise & GVI costs and the edge index of the spatial index). Loading
+a compiled graph bundle makes the startup of the routing app a pure load. 
+
+The derived attributes depend on the configuration in env.py (enabled features & sensitivities), hence the 
+configuration hash is saved to the bundle. If the configuration has changed after the compilation, the graph 
+must be recompiled (otherwise the derived attributes are calculated at startup). 
+
+This script is intended to be run from the root of the project (src/) with the command:
+python -m app.graph_compiler graphs/hma.graphml graphs/hma.bundle
+
+"""
+
+import sys
+import time
+from app.logger import Logger
+from app.graph_handler import GraphHandler, get_graph_config_hash
+
+
+def compile_graph(log: Logger, graph_file: str, bundle_dir: str) -> None:
+    start_time = time.time()
+    G = GraphHandler(log, graph_file)
+    G.export_compiled_graph(bundle_dir, graph_file)
+    log.info(f'Compiled graph {graph_file} to {bundle_dir} in {round(time.time() - start_time, 1)} s (config hash: {get_graph_config_hash()})')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('Usage: python -m app.graph_compiler <graph.graphml> <graph bundle dir>')
+        sys.exit(1)
+    compile_graph(Logger(b_printing=True), sys.argv[1], sys.argv[2])
@@ -1,59 +1,274 @@
 import time
+import json
+import hashlib
+from math import inf
+from datetime import datetime
 from typing import List, Dict, Tuple, Union
-from shapely.ops import nearest_points
+import numpy as np
+import igraph as ig
+import geopandas as gpd
+from pyproj import CRS
 from shapely.geometry import Point, LineString
 import env
-from app.types import PathEdge 
+from app.types import PathEdge, AqiGeneration, is_aqi_edge_attr
+from app.graph_overlay import GraphOverlay
+from app.csr_graph import CsrGraph
+from app.shortest_path_tree import ShortestPathTree
+from app.graph_landmarks import GraphLandmarks
+from app.graph_search import GraphSearch
+from app.spatial_index import SpatialIndex, nearest_node_max_dist, nearest_edge_max_dist
+from app.snap_cache import SnapCache
+from app.sensitivity_sweep import ParametricCosts
+from app.pareto_search import ParetoPath
 from utils.igraph import Edge as E, Node as N
 import utils.igraph as ig_utils
+import utils.graph_bundle as graph_bundle
 import app.noise_exposures as noise_exps
 import app.aq_exposures as aq_exps
 import app.greenery_exposures as gvi_exps
 import utils.geometry as geom_utils
 from app.logger import Logger
-from app.constants import RoutingException, ErrorKeys, cost_prefix_dict, TravelMode, RoutingMode
+from app.constants import cost_prefix_dict, TravelMode, RoutingMode
+
+
+compiled_graph_version = 1
+
+
+def get_graph_config_hash() -> str:
+    """Returns a hash of the configuration (env.py) that affects the graph attributes derived at startup.
+    Compiled graph bundles with a different configuration hash are stale.
+    """
+    config = {
+        'compiled_graph_version': compiled_graph_version,
+        'walking_enabled': env.walking_enabled,
+        'cycling_enabled': env.cycling_enabled,
+        'quiet_paths_enabled': env.quiet_paths_enabled,
+        'gvi_paths_enabled': env.gvi_paths_enabled,
+        'noise_sensitivities': noise_exps.get_noise_sensitivities(),
+        'gvi_sensitivities': gvi_exps.get_gvi_sensitivities(),
+        'db_costs': noise_exps.get_db_costs(version=3)
+    }
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+__edge_array_attrs = [E.length.value, E.length_b.value, E.aqi.value, E.gvi.value]
+__edge_array_prefixes = tuple(
+    cost_prefix for prefixes in cost_prefix_dict.values() for cost_prefix in prefixes.values()
+)
+
+
+def is_edge_array_attr(attr: str) -> bool:
+    """Returns True if the edge attribute is a numeric attribute (length, exposure or cost) that is
+    stored in the edge arrays of GraphHandler instead of the graph object.
+    """
+    return attr in __edge_array_attrs or attr.startswith(__edge_array_prefixes)
+
+
+__derived_cost_prefixes = tuple(
+    cost_prefix_dict[travel_mode][routing_mode] 
+    for travel_mode in TravelMode for routing_mode in (RoutingMode.QUIET, RoutingMode.GREEN)
+)
+
+
+def is_derived_edge_attr(attr: str) -> bool:
+    """Returns True if the edge attribute is derived at startup (noise & GVI costs), i.e. depends on the 
+    configuration of compiled graph bundles.
+    """
+    return attr.startswith(__derived_cost_prefixes)
 
 
 class GraphHandler:
     """Graph handler provides functions for accessing and manipulating graph during least cost path optimization. 
     
     Attributes:
-        graph: An igraph graph object.
-        __edge_gdf: The edges of the graph as a GeoDataFrame.
-        __edges_sind: Spatial index of the edges GeoDataFrame.
-        __node_gdf: The nodes of the graph as a GeoDataFrame.
-        __nodes_sind: Spatial index of the nodes GeoDataFrame.
+        graph: An igraph graph object (without the numeric edge attributes, see __edge_arrays).
+        __edge_arrays: Numeric edge attributes (lengths, exposures & costs) as float arrays indexed by edge id
+            (missing values are NaN). The arrays are read-only memory-mapped if the graph is loaded from a graph
+            bundle, so that all worker processes on a host share them. AQI and AQ costs are not included.
+        __aqi_generation: The latest AQI generation (AQI & AQ costs) published to the graph.
+        __node_xs, __node_ys: Coordinates of the nodes (by node id).
+        __csr_graph: The CSR adjacency of the graph.
+        __search: Least cost path searches of the graph (routing engine, contraction hierarchy & landmark 
+            tables, see app/graph_search.py).
+        __edge_gdf: The edges of the graph as a GeoDataFrame (one edge per two-way edge pair).
+        __spatial_index: Nearest node and edge searches of the graph (KD-tree of the nodes, STRtree of the 
+            edges of the edge GeoDataFrame & snapping raster, see app/spatial_index.py).
+        snap_cache: LRU cache of the nearest edges and nodes of origins and destinations by coordinates.
         __db_costs: Cost coefficients for different noise levels.
-        __new_edges: New edges are first collected to dictionary and then added all at once.
-        __edge_cache: A cache of path edges for current routing request. 
+
+    The graph is not modified during routing: origin and destination nodes that are created on the nearest edges
+    and the linking edges that connect them to the graph exist only in a per-request GraphOverlay.
     """
 
     def __init__(self, logger: Logger, graph_file: str):
         """Initializes a graph (and related features) used by green_paths_app and aqi_processor_app.
 
         Args:
-            subset: A boolean variable indicating whether a subset of the graph should be loaded (subset is for testing / developing).
+            graph_file: A path to either a GraphML file or a graph bundle directory (see utils.graph_bundle).
         """
         self.log = logger
         self.log.info(f'Loading graph from file: {graph_file}')
         start_time = time.time()
-        self.graph = ig_utils.read_graphml(graph_file)
+        compiled = self.__is_compiled_graph(graph_file)
+        self.graph, self.__edge_arrays = self.__read_graph(graph_file, compiled)
         self.ecount = self.graph.ecount()
         self.vcount = self.graph.vcount()
         self.log.info('Graph of '+ str(self.graph.ecount()) + ' edges read')
-        self.__edge_gdf = self.__get_edge_gdf()
-        self.__edge_sindex = self.__edge_gdf.sindex
-        self.__node_gdf = ig_utils.get_node_gdf(self.graph)
-        self.__nodes_sind = self.__node_gdf.sindex
+        edge_sources, edge_targets = np.array(self.graph.get_edgelist(), dtype=np.int64).reshape(-1, 2).T
+        node_geoms = self.graph.vs[N.geometry.value]
+        self.__node_xs = np.array([geom.x for geom in node_geoms], dtype=np.float64)
+        self.__node_ys = np.array([geom.y for geom in node_geoms], dtype=np.float64)
+        self.__csr_graph = CsrGraph(self.vcount, edge_sources, edge_targets)
+        self.__edge_gdf = (
+            self.__get_edge_gdf_by_ids(graph_bundle.read_bundle_array(graph_file, 'edge_gdf_ids'))
+            if compiled else self.__get_edge_gdf()
+        )
+        self.__spatial_index = SpatialIndex(
+            self.log, self.__node_xs, self.__node_ys, self.__edge_gdf.geometry.values, 
+            self.__edge_gdf.index.values.astype(np.int64))
+        self.__spatial_index.load_snapping_raster(graph_file, self.__edge_arrays[E.length.value])
+        self.snap_cache = SnapCache(env.snap_cache_size)
         self.db_costs = noise_exps.get_db_costs(version=3)
-        if env.quiet_paths_enabled: self.__set_noise_costs_to_edges()
-        self.log.info('Noise costs set')
-        if env.gvi_paths_enabled: self.__set_gvi_costs_to_graph()
-        self.log.info('GVI costs set')
-        self.graph.es[E.aqi.value] = None # set default AQI value to None
+        if compiled:
+            self.log.info('Noise & GVI costs loaded from compiled graph')
+        else:
+            if env.quiet_paths_enabled: self.__set_noise_costs_to_edges()
+            self.log.info('Noise costs set')
+            if env.gvi_paths_enabled: self.__set_gvi_costs_to_graph()
+            self.log.info('GVI costs set')
+        # set default AQI value to None
+        aqis = np.full(self.ecount, np.nan)
+        aqis.flags.writeable = False
+        self.__aqi_generation = AqiGeneration(aqi_data='', aqi_data_utc_time_secs=None, edge_arrays={ E.aqi.value: aqis })
+        self.__search = GraphSearch(
+            self.log, graph_file, self.__csr_graph, self.__node_xs, self.__node_ys, self.__edge_arrays,
+            self.get_edge_array, self.get_aqi_generation)
         self.log.duration(start_time, 'Graph initialized', log_level='info')
-        self.__new_edges: Dict[Tuple[int, int], Dict] = {}
-        self.__edge_cache: Dict[int, PathEdge] = {}
+    def __read_graph(self, graph_file: str, compiled: bool) -> Tuple[ig.Graph, Dict[str, np.ndarray]]:
+        """Reads the graph and separates the numeric edge attributes from it to edge arrays. The derived
+        attributes of a stale compiled graph bundle are not loaded (they are derived again).
+        """
+        if graph_bundle.is_graph_bundle(graph_file):
+            bundle_array_attrs = [
+                attr for attr in graph_bundle.read_bundle_manifest(graph_file)['edge_attrs'] if is_edge_array_attr(attr)
+            ]
+            graph = graph_bundle.read_graph_bundle(graph_file, log=self.log, exclude_edge_attrs=bundle_array_attrs)
+            array_attrs = [
+                attr for attr in bundle_array_attrs 
+                if not is_aqi_edge_attr(attr) and (compiled or not is_derived_edge_attr(attr))
+            ]
+            return graph, graph_bundle.read_edge_arrays(graph_file, array_attrs)
+
+        graph = ig_utils.read_graphml(graph_file)
+        edge_arrays = {}
+        for attr in graph.es.attribute_names():
+            if is_edge_array_attr(attr):
+                if not is_aqi_edge_attr(attr):
+                    edge_arrays[attr] = self.__as_edge_array(graph.es[attr])
+                del(graph.es[attr])
+        return graph, edge_arrays
+
+    def __as_edge_array(self, values: list) -> np.ndarray:
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+    def get_edge_array(self, attr: str, aqi_generation: AqiGeneration = None) -> np.ndarray:
+        """Returns a numeric edge attribute as an array indexed by edge id (the array must not be modified).
+        AQI and AQ costs are returned from the given AQI generation (or the latest one if not given). 
+        Added linking edges are not included.
+        """
+        if is_aqi_edge_attr(attr):
+            return (aqi_generation or self.__aqi_generation).edge_arrays[attr]
+        return self.__edge_arrays[attr]
+
+    def get_aqi_generation(self) -> AqiGeneration:
+        """Returns the latest AQI generation. Routing requests should use the same generation for their whole
+        lifetime in order to get consistent AQI and AQ costs.
+        """
+        return self.__aqi_generation
+
+    def get_csr_graph(self) -> CsrGraph:
+        """Returns the CSR adjacency of the graph (offsets, adjacent nodes and edge ids by node, see
+        app.csr_graph) for custom search algorithms. Added linking edges are not included.
+        """
+        return self.__csr_graph
+
+    def get_csr_weights(
+        self,
+        weight: str,
+        aqi_generation: AqiGeneration = None,
+        reverse: bool = False
+    ) -> np.ndarray:
+        """Returns the (float64) weights of a numeric edge attribute in the CSR order of the forward or reverse
+        adjacency (missing weights as infinity). The weights are created once per edge attribute (and AQI
+        generation) and must not be modified.
+        """
+        return self.__search.get_csr_weights(weight, aqi_generation or self.__aqi_generation, reverse)
+
+    def publish_aqi_generation(self, aqi_generation: AqiGeneration) -> None:
+        """Replaces the AQI generation of the graph (AQI & AQ costs) with a new, complete generation. 
+        Routing requests that started before the swap keep using the previous generation.
+        """
+        for attr, arr in aqi_generation.edge_arrays.items():
+            if not is_aqi_edge_attr(attr):
+                raise ValueError(f'Edge attribute {attr} is not an AQI attribute')
+            if len(arr) != self.ecount:
+                raise ValueError(f'Edge array {attr} has {len(arr)} values but the graph has {self.ecount} edges')
+            arr.flags.writeable = False
+        # edge weights of the new AQ costs are prepared before the swap (not by the routing requests)
+        self.__search.prepare_aqi_edge_weights(aqi_generation)
+        self.__aqi_generation = aqi_generation
+
+    def update_aqi_landmark_tables(self, aqi_generation: AqiGeneration) -> None:
+        """Builds the landmark tables of the AQ costs of the AQI generation and replaces the edge weights of the
+        AQ costs with ones that use them, if the generation is still the latest one. Until then, the landmark 
+        bounds of the AQ costs are based on length only. This takes a while, hence it is run in the background
+        after publishing the AQI generation (by GraphAqiUpdater).
+        """
+        self.__search.update_aqi_landmark_tables(aqi_generation)
+
+    def export_landmark_tables(self, landmarks_dir: str, landmark_count: int) -> None:
+        """Selects landmarks and builds the landmark tables of the static cost families (length, noise & GVI)
+        and saves them to the directory.
+        """
+        GraphLandmarks(self.log, self.__csr_graph, self.__edge_arrays).export(landmarks_dir, landmark_count)
+
+    def export_length_ch(self, ch_file: str) -> None:
+        """Builds a contraction hierarchy of the graph by edge length and saves it to the file.
+        """
+        self.__search.export_length_ch(ch_file)
+
+    def export_snapping_raster(self, raster_dir: str, cell_size: float) -> None:
+        """Builds a snapping raster of the cells of the given size over the extent of the nodes of the graph
+        (with a margin) and saves it to the directory.
+        """
+        self.__spatial_index.export_snapping_raster(raster_dir, cell_size, self.__edge_arrays[E.length.value])
+
+    def __is_compiled_graph(self, graph_file: str) -> bool:
+        """Returns True if the graph is a compiled graph bundle that contains all derived graph attributes for the
+        current configuration. The derived attributes of stale compiled graphs are not loaded but derived again.
+        """
+        if not graph_bundle.is_graph_bundle(graph_file):
+            return False
+        config_hash = graph_bundle.read_bundle_manifest(graph_file).get('metadata', {}).get('config_hash')
+        if not config_hash:
+            return False
+        if config_hash != get_graph_config_hash():
+            self.log.warning(
+                f'Compiled graph {graph_file} is stale (config hash {config_hash} is not {get_graph_config_hash()}), '
+                'deriving graph attributes at startup - recompile the graph with: python -m app.graph_compiler')
+            return False
+        return True
+
+    def __get_edge_gdf_by_ids(self, edge_ids: np.ndarray):
+        geoms = self.graph.es[E.geometry.value]
+        edge_ids = edge_ids.tolist()
+        edge_gdf = gpd.GeoDataFrame(
+            { E.geometry.name: [geoms[edge_id] for edge_id in edge_ids] },
+            geometry=E.geometry.name,
+            index=edge_ids,
+            crs=CRS.from_epsg(3879))
+        self.log.info(f'Added {len(edge_gdf)} edges to edge_gdf')
+        return edge_gdf
 
     def __get_edge_gdf(self):
         edge_gdf = ig_utils.get_edge_gdf(self.graph, attrs=[E.id_way])
@@ -65,58 +280,60 @@ class GraphHandler:
         self.log.info(f'Added {len(edge_gdf)} edges to edge_gdf')
         return edge_gdf
 
+    def __get_edge_values(self, attr: str) -> list:
+        """Returns the values of a numeric edge attribute as list (with None for missing values).
+        """
+        return [None if value != value else value for value in self.__edge_arrays[attr].tolist()]
+
     def __set_noise_costs_to_edges(self):
         """Updates all noise cost attributes to a graph.
         """
         cost_prefix = cost_prefix_dict[TravelMode.WALK][RoutingMode.QUIET]
         cost_prefix_bike = cost_prefix_dict[TravelMode.BIKE][RoutingMode.QUIET]
 
-        noises_list = self.graph.es[E.noises.value]
-        length_list = self.graph.es[E.length.value]
-        biking_length_list = self.graph.es[E.length_b.value]
-        has_geom_list = [isinstance(geom, LineString) for geom in list(self.graph.es[E.geometry.value])]
+        length_list = self.__get_edge_values(E.length.value)
+        lengths = self.__edge_arrays[E.length.value]
+        biking_lengths = self.__edge_arrays[E.length_b.value]
+        has_geom = np.array([isinstance(geom, LineString) for geom in self.graph.es[E.geometry.value]], dtype=bool)
 
         # update dB 40 lengths to graph (the lowest level in noise data is 45)
-        noises_lengths = zip(noises_list, length_list)
-        self.graph.es[E.noises.value] = [
+        noises_lengths = zip(self.graph.es[E.noises.value], length_list)
+        noises_list = [
             noise_exps.add_db_40_exp_to_noises(noises, length)
             for noises, length
             in noises_lengths
         ]
+        self.graph.es[E.noises.value] = noises_list
+
+        # calculate noise costs of all edges at once from the matrix of base noise costs (edges x dB bins)
+        has_noises = np.array([noises is not None for noises in noises_list], dtype=bool)
+        noise_cost_matrix = noise_exps.get_noise_cost_matrix(noises_list, self.db_costs)
 
         for sen in noise_exps.get_noise_sensitivities():
 
             if env.walking_enabled:
-                lengths_noises_b_geoms = zip(length_list, noises_list, has_geom_list)
                 cost_attr = cost_prefix + str(sen)
-
-                self.graph.es[cost_attr] = [
-                    noise_exps.get_noise_adjusted_edge_cost(
-                        sen, self.db_costs, noises, length
-                    ) if has_geom else 0.0
-                    for length, noises, has_geom
-                    in lengths_noises_b_geoms
-                ]
+                self.__edge_arrays[cost_attr] = np.where(
+                    has_geom,
+                    noise_exps.get_noise_adjusted_edge_costs(sen, noise_cost_matrix, has_noises, lengths),
+                    0.0
+                )
 
             if env.cycling_enabled:
-                lengths_noises_b_geoms = zip(length_list, biking_length_list, noises_list, has_geom_list)
                 cost_attr = cost_prefix_bike + str(sen)
-
-                self.graph.es[cost_attr] = [
-                    noise_exps.get_noise_adjusted_edge_cost(
-                        sen, self.db_costs, noises, length, b_length
-                    ) if has_geom else 0.0
-                    for length, b_length, noises, has_geom
-                    in lengths_noises_b_geoms
-                ]
+                self.__edge_arrays[cost_attr] = np.where(
+                    has_geom,
+                    noise_exps.get_noise_adjusted_edge_costs(sen, noise_cost_matrix, has_noises, lengths, biking_lengths),
+                    0.0
+                )
 
     def __set_gvi_costs_to_graph(self):
         cost_prefix = cost_prefix_dict[TravelMode.WALK][RoutingMode.GREEN]
         cost_prefix_bike = cost_prefix_dict[TravelMode.BIKE][RoutingMode.GREEN]
 
-        lengths = self.graph.es[E.length.value]
-        biking_lengths = self.graph.es[E.length_b.value]
-        gvi_list = self.graph.es[E.gvi.value]
+        lengths = self.__get_edge_values(E.length.value)
+        biking_lengths = self.__get_edge_values(E.length_b.value)
+        gvi_list = self.__get_edge_values(E.gvi.value)
         has_geom_list = [isinstance(geom, LineString) for geom in list(self.graph.es[E.geometry.value])]
         select_biking_length = lambda length, b_length: b_length if b_length else length
 
@@ -125,58 +342,70 @@ class GraphHandler:
             if env.walking_enabled:
                 length_gvi_b_geom = zip(lengths, gvi_list, has_geom_list)
                 cost_attr = cost_prefix + str(sen)
-                self.graph.es[cost_attr] = [
+                self.__edge_arrays[cost_attr] = self.__as_edge_array([
                     gvi_exps.get_gvi_adjusted_cost(length, gvi, sen) 
                     if has_geom else 0.0
                     for length, gvi, has_geom 
                     in length_gvi_b_geom
-                ]
+                ])
 
             if env.cycling_enabled:
                 length_gvi_b_geom = zip(lengths, biking_lengths, gvi_list, has_geom_list)
                 cost_attr = cost_prefix_bike + str(sen)
-                self.graph.es[cost_attr] = [
+                self.__edge_arrays[cost_attr] = self.__as_edge_array([
                     gvi_exps.get_gvi_adjusted_cost(
                         select_biking_length(length, b_length), gvi, sen
                     ) 
                     if has_geom else 0.0
                     for length, b_length, gvi, has_geom 
                     in length_gvi_b_geom
-                ]
+                ])
 
-    def update_edge_attr_to_graph(self, edge_gdf, df_attr: str):
-        """Updates the given edge attribute(s) from a DataFrame to a graph. The attribute(s) to update
-        are given as series of dictionaries (df_attr): keys will be used ass attribute names and values
-        as values in the graph. 
+    def export_compiled_graph(self, bundle_dir: str, source_file: str) -> None:
+        """Writes the graph with all derived attributes (noise & GVI costs) and the edge index of the
+        edge GeoDataFrame to a graph bundle, tagged by the hash of the current configuration.
         """
-        for edge in edge_gdf.itertuples():
-            updates: dict = getattr(edge, df_attr)
-            self.graph.es[getattr(edge, E.id_ig.name)].update_attributes(updates)
-
-    def find_nearest_node(self, point: Point) -> Union[int, None]:
+        graph_bundle.export_graph_bundle(
+            self.graph,
+            bundle_dir,
+            edge_arrays=self.__edge_arrays,
+            arrays={ 'edge_gdf_ids': self.__edge_gdf.index.values.astype(np.int64) },
+            metadata={
+                'config_hash': get_graph_config_hash(),
+                'compiled_graph_version': compiled_graph_version,
+                'source_file': source_file,
+                'compiled_utc': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
+            },
+            log=self.log)
+
+    def find_nearest_node(self, point: Point, max_dist: float = nearest_node_max_dist) -> Union[int, None]:
         """Finds the nearest node to a given point from the graph.
 
         Args:
             point: A point location as Shapely Point object.
+            max_dist: The maximum distance to the nearest node (m).
         Note:
             Point should be in projected coordinate system (EPSG:3879).
         Returns:
-            The name (id) of the nearest node. None if no nearest node is found.
+            The name (id) of the nearest node. None if no node is found within max_dist.
         """
-        for radius in [50, 100, 500]:
-            possible_matches_index = list(self.__node_gdf.sindex.intersection(point.buffer(radius).bounds))
-            if possible_matches_index:
-                break
-        if not possible_matches_index:
+        nearest_node = self.__spatial_index.find_nearest_node(point, max_dist)
+        if nearest_node < 0:
             self.log.warning('No near node found')
             return None
-        possible_matches = self.__node_gdf.iloc[possible_matches_index]
-        points_union = possible_matches.geometry.unary_union
-        nearest_geom = nearest_points(point, points_union)[1]
-        nearest = possible_matches.geometry.geom_equals(nearest_geom)
-        nearest_point =  possible_matches.loc[nearest]
-        nearest_node_id = nearest_point.index.tolist()[0]
-        return nearest_node_id
+        return nearest_node
+
+    def find_nearest_nodes(
+        self, 
+        xs: np.ndarray, 
+        ys: np.ndarray, 
+        max_dist: float = nearest_node_max_dist, 
+        margin: float = 0.0
+    ) -> np.ndarray:
+        """Finds the nearest nodes to many points (projected coordinates, EPSG:3879), see 
+        SpatialIndex.find_nearest_nodes().
+        """
+        return self.__spatial_index.find_nearest_nodes(xs, ys, max_dist, margin)
 
     def __get_node_by_id(self, node_id: int) -> Union[dict, None]:
         try:
@@ -185,19 +414,39 @@ class GraphHandler:
             self.log.warning('Could not find node by id: '+ str(node_id))
             return None
 
-    def get_edge_attrs_by_id(self, edge_id: int) -> Union[dict, None]:
-        """Returns edge by given ID as dictionary of attribute names and values."""
+    def create_overlay(self) -> GraphOverlay:
+        """Returns a new (empty) overlay for a routing request, pinned to the latest AQI generation.
+        """
+        return GraphOverlay(self.vcount, self.ecount, self.__aqi_generation)
+
+    def get_edge_attrs_by_id(self, edge_id: int, overlay: GraphOverlay = None) -> Union[dict, None]:
+        """Returns edge by given ID as dictionary of attribute names and values. Virtual edges are read from 
+        the overlay (if given) and AQI and AQ costs from the AQI generation of the overlay (or the latest one).
+        """
+        aqi_generation = overlay.aqi_generation if overlay else self.__aqi_generation
+        if overlay and edge_id in overlay.edges:
+            return {
+                **dict.fromkeys(self.graph.es.attribute_names()),
+                **dict.fromkeys(self.__edge_arrays.keys()),
+                **dict.fromkeys(aqi_generation.edge_arrays.keys()),
+                **overlay.edges[edge_id]
+            }
         try:
-            return self.graph.es[edge_id].attributes()
+            edge = self.graph.es[edge_id].attributes()
+            for edge_arrays in (self.__edge_arrays, aqi_generation.edge_arrays):
+                for attr, arr in edge_arrays.items():
+                    value = arr[edge_id].item()
+                    edge[attr] = None if value != value else value
+            return edge
         except Exception:
             self.log.warning('Could not find edge by id: '+ str(edge_id))
             return None
 
-    def get_edge_object_by_id(self, edge_id: int) -> Union[PathEdge, None]:
+    def get_edge_object_by_id(self, edge_id: int, overlay: GraphOverlay = None) -> Union[PathEdge, None]:
         """Returns PathEdge object by the given edge ID. Returns None if the edge is
         not found or it lacks geometry.
         """
-        edge = self.get_edge_attrs_by_id(edge_id)
+        edge = self.get_edge_attrs_by_id(edge_id, overlay)
         
         if (not edge or edge[E.length.value] == 0.0 
                 or not isinstance(edge[E.geometry.value], LineString)):
@@ -222,26 +471,36 @@ class GraphHandler:
         node = self.__get_node_by_id(node_id)
         return node[N.geometry.value] if node else None
 
-    def find_nearest_edge(self, point: Point) -> Union[dict, None]:
-        """Finds the nearest edge to a given point and returns it as dictionary of edge attributes.
-        """
-        for radius in [35, 150, 400, 650]:
-            possible_matches_index = list(self.__edge_gdf.sindex.intersection(point.buffer(radius).bounds))
-            if possible_matches_index:
-                possible_matches = self.__edge_gdf.iloc[possible_matches_index].copy()
-                possible_matches['distance'] = [geom.distance(point) for geom in possible_matches[E.geometry.name]]
-                shortest_dist = possible_matches['distance'].min()
-                if (shortest_dist < radius):
-                    break
-        if not possible_matches_index:
+    def find_nearest_edge(
+        self, 
+        point: Point, 
+        overlay: GraphOverlay = None, 
+        max_dist: float = nearest_edge_max_dist
+    ) -> Union[dict, None]:
+        """Finds the nearest edge to a given point and returns it as dictionary of edge attributes (with the
+        distance to the point as 'dist'). Returns None if no edge is found within max_dist. The edge is looked up
+        from the snapping raster (if loaded) and searched only if the cell of the point has no edge.
+        """
+        edge_id, dist = self.__spatial_index.find_nearest_edge(point, max_dist)
+        if edge_id < 0:
             self.log.error('No near edges found')
             return None
-        nearest = possible_matches['distance'] == shortest_dist
-        edge_id = possible_matches.loc[nearest].index[0]
-        edge = self.get_edge_attrs_by_id(edge_id)
-        edge['dist'] = round(shortest_dist, 2)
+        edge = self.get_edge_attrs_by_id(edge_id, overlay)
+        edge['dist'] = round(dist, 2)
         return edge
 
+    def find_nearest_edges(
+        self, 
+        xs: np.ndarray, 
+        ys: np.ndarray, 
+        max_dist: float = nearest_edge_max_dist,
+        margin: float = 0.0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the nearest edges to many points (projected coordinates, EPSG:3879), see 
+        SpatialIndex.find_nearest_edges().
+        """
+        return self.__spatial_index.find_nearest_edges(xs, ys, max_dist, margin)
+
     def format_edge_dict_for_debugging(self, edge: dict) -> dict:
         # map edge dict attribute names to the descriptive ones defined in Edge enum
         edge_d = { E(k).name if k in [item.value for item in E] else k: v for k, v in edge.items() }
@@ -249,47 +508,26 @@ class GraphHandler:
         edge_d[E.geom_wgs.name] = str(edge_d[E.geom_wgs.name])
         return edge_d
 
-    def get_path_edges_by_ids(self, edge_ids: List[int]) -> List[PathEdge]:
-        """Loads edge attributes from graph by ordered list of edges representing a path.
+    def get_path_edges_by_ids(self, edge_ids: List[int], overlay: GraphOverlay = None) -> List[PathEdge]:
+        """Loads edge attributes from graph (or overlay) by ordered list of edges representing a path.
         """
+        edge_cache = overlay.edge_cache if overlay else {}
         path_edges: List[PathEdge] = []
         
         for edge_id in edge_ids:
-            edge_d = self.__edge_cache.get(edge_id)
+            edge_d = edge_cache.get(edge_id)
             if edge_d:
                 path_edges.append(edge_d)
                 continue
 
-            path_edge = self.get_edge_object_by_id(edge_id)
+            path_edge = self.get_edge_object_by_id(edge_id, overlay)
             
             if path_edge:
-                self.__edge_cache[edge_id] = path_edge
+                edge_cache[edge_id] = path_edge
                 path_edges.append(path_edge)
 
         return path_edges
 
-    def __get_new_node_id(self) -> int:
-        """Returns an unique node id that can be used in creating a new node to a graph.
-        """
-        return self.graph.vcount()
-
-    def add_new_node_to_graph(self, point: Point) -> int:
-        """Adds a new node to a graph at a specified location (Point) and returns the id of the new node.
-        """
-        new_node_id = self.__get_new_node_id()
-        attrs = { N.geometry.value: point }
-        self.graph.add_vertex(**attrs)
-        return new_node_id
-
-    def __get_new_edge_id(self) -> int:
-        return self.graph.ecount()
-
-    def __add_new_edges_to_graph(self, edge_uvs: List[Tuple[int, int]]) -> List[int]:
-        """Adds new edges to graph and returns their ids as list."""
-        new_edge_id = self.__get_new_edge_id()
-        self.graph.add_edges(edge_uvs)
-        return [new_edge_id + edge_number for edge_number in range(0, len(edge_uvs))]
-
     def __get_link_edge_aqi_cost_estimates(self, edge_dict: dict, link_geom: LineString, sens) -> dict:
         """Returns aqi exposures and costs for a split edge based on aqi exposures on the original edge
         (from which the edge was split). 
@@ -321,6 +559,7 @@ class GraphHandler:
 
     def create_linking_edges_for_new_node(
         self, 
+        overlay: GraphOverlay,
         new_node: int,
         split_point: Point,
         edge: dict,
@@ -329,11 +568,12 @@ class GraphHandler:
         db_costs: dict,
         origin: bool
     ) -> dict:
-        """Creates new edges to/from a new node to connect it to two existing nodes of the graph. 
+        """Creates new (virtual) edges to/from a new node to connect it to two existing nodes of the graph. 
         Also estimates and sets the edge cost attributes for the new edges based on attributes 
-        of the original edge on which the new node was added. 
+        of the original edge on which the new node was added. The edges are added to the overlay.
 
         Args:
+            overlay: the overlay of the routing request (that contains the new node).
             new_node: identifier of the new node.
             split_point: geometry of the new node (for splitting the underlying edge).
             edge: edge on which the new node was created.
@@ -354,12 +594,13 @@ class GraphHandler:
         node_from = edge[E.uv.value][0]
         node_to = edge[E.uv.value][1]
 
-        # create link geometries from/to new node in projected and WGS CRS
+        # create link geometries from/to new node in projected and WGS CRS (split at the same point)
         time_projections = time.time()
-        link1, link2 = geom_utils.split_line_at_point(self.log, edge[E.geometry.value], split_point)
-        link1_wgs, link2_wgs = tuple(geom_utils.project_geom(link, geom_epsg=3879, to_epsg=4326) for link in (link1, link2))
+        line = edge[E.geometry.value]
+        link1, link2, link1_wgs, link2_wgs = geom_utils.split_line_at_dist(
+            line, line.project(split_point), edge[E.geom_wgs.value])
         link1_rev, link2_rev, link1_rev_wgs, link2_rev_wgs = (LineString(link.coords[::-1]) for link in (link1, link2, link1_wgs, link2_wgs))
-        self.log.duration(time_projections, 'projected linking edge geoms', unit='ms')
+        self.log.duration(time_projections, 'split linking edge geoms', unit='ms')
 
         # set geometry attributes for links
         link1_geom_attrs = { E.geometry.value: link1, E.length.value: round(link1.length, 2), E.geom_wgs.value: link1_wgs }
@@ -379,87 +620,131 @@ class GraphHandler:
         link1_attrs = { **link1_noise_cost_attrs, **link1_aqi_cost_attrs, **link1_gvi_attrs }
         link2_attrs = { **link2_noise_cost_attrs, **link2_aqi_cost_attrs, **link2_gvi_attrs }
 
-        # add linking edges with noise cost attributes to graph (save for loading them to graph later)
+        # add linking edges with noise cost attributes to overlay
         if origin:
             # add linking edges from new node to existing nodes
-            self.__new_edges.update({
-                (new_node, node_from): { E.uv.value: (new_node, node_from), **link1_attrs, **link1_rev_geom_attrs },
-                (new_node, node_to): { E.uv.value: (new_node, node_to), **link2_attrs, **link2_geom_attrs },
-            })
             link1_d = { E.uv.value: (new_node, node_from), **link1_attrs, **link1_rev_geom_attrs }
             link2_d = { E.uv.value: (new_node, node_to), **link2_attrs, **link2_geom_attrs }
         else:
             # add linking edges from existing nodes to new node
-            self.__new_edges.update({
-                (node_from, new_node): { E.uv.value: (node_from, new_node), **link1_attrs, **link1_geom_attrs },
-                (node_to, new_node): { E.uv.value: (node_to, new_node), **link2_attrs, **link2_rev_geom_attrs }
-            })
             link1_d = { E.uv.value: (node_from, new_node), **link1_attrs, **link1_geom_attrs }
             link2_d = { E.uv.value: (node_to, new_node), **link2_attrs, **link2_rev_geom_attrs }
+        overlay.add_edge(dict(link1_d))
+        overlay.add_edge(dict(link2_d))
         
         self.log.duration(time_func, 'created links for new node (GraphHandler function)', unit='ms')
         return { 'node_from': node_from, 'new_node': new_node, 'node_to': node_to, 'link1': link1_d, 'link2': link2_d }
 
-    def load_new_edges_to_graph(self) -> None:
-        time_add_edges = time.time()
-        if self.__new_edges:
-            new_edge_ids = self.__add_new_edges_to_graph(list(self.__new_edges.keys()))
-            new_edge_attrs: List[dict] = list(self.__new_edges.values())
-            for idx, edge_id in enumerate(new_edge_ids):
-                for key, value in new_edge_attrs[idx].items():
-                    self.graph.es[edge_id][key] = value
+    def get_path_length(self, edge_ids: List[int], overlay: GraphOverlay = None) -> float:
+        """Returns the length of a path (that may contain virtual edges of the overlay).
+        """
+        lengths = self.__edge_arrays[E.length.value]
+        virtual_edge_ids = [edge_id for edge_id in edge_ids if overlay and edge_id in overlay.edges]
+        return (
+            float(np.nansum(lengths[[edge_id for edge_id in edge_ids if edge_id not in virtual_edge_ids]]))
+            + sum(overlay.edges[edge_id][E.length.value] for edge_id in virtual_edge_ids)
+        )
+
+    def get_search_area(
+        self, 
+        orig_node: int, 
+        dest_node: int, 
+        max_length: float, 
+        overlay: GraphOverlay = None
+    ) -> np.ndarray:
+        """Returns the search area of paths of at most the given length between the nodes, as a boolean array of
+        the nodes of the graph that such paths may pass (see GraphSearch.get_search_area()).
+        """
+        return self.__search.get_search_area(orig_node, dest_node, max_length, overlay)
 
-        self.__new_edges = {}
-        self.log.duration(time_add_edges, 'loaded new features to graph', unit='ms')
+    def get_parametric_costs(
+        self, 
+        travel_mode: TravelMode, 
+        routing_mode: RoutingMode, 
+        overlay: GraphOverlay = None
+    ) -> ParametricCosts:
+        """Returns the costs of the routing mode as linear functions of sensitivity (for the sensitivity sweep, 
+        see GraphSearch.get_parametric_costs()).
+        """
+        return self.__search.get_parametric_costs(travel_mode, routing_mode, overlay)
 
-    def get_least_cost_path(self, orig_node: int, dest_node: int, weight: str='length') -> List[int]:
-        """Calculates a least cost path by the given edge weight.
+    def get_least_cost_path(
+        self, 
+        orig_node: int, 
+        dest_node: int, 
+        weight: str='length', 
+        overlay: GraphOverlay = None,
+        search_area: np.ndarray = None
+    ) -> List[int]:
+        """Calculates a least cost path by the given edge weight (see GraphSearch.get_least_cost_path()). Origin 
+        and destination can be virtual nodes of the overlay.
 
-        Args:
-            orig_node: The name of the origin node (int).
-            dest_node: The name of the destination node (int).
-            weight: The name of the edge attribute to use as cost in the least cost path optimization.
         Returns:
             The least cost path as a sequence of edges (ids).
+        Raises:
+            RoutingException if the origin and the destination are the same or there is no path between them.
         """
-        if (orig_node != dest_node):
-            try:
-                s_path = self.graph.get_shortest_paths(orig_node, to=dest_node, weights=weight, mode=1, output="epath")
-                return s_path[0]
-            except:
-                raise Exception(f'Could not find paths by {weight}')
-        else:
-            raise RoutingException(ErrorKeys.OD_SAME_LOCATION.value)
+        return self.__search.get_least_cost_path(orig_node, dest_node, weight, overlay, search_area)
+
+    def get_shortest_path_trees_from(
+        self, 
+        orig_node: int, 
+        weight: str='length', 
+        overlay: GraphOverlay = None,
+        max_cost: float = inf
+    ) -> List[Tuple[float, List[int], ShortestPathTree]]:
+        """Finds the shortest path trees by the given edge weight from the origin (see 
+        GraphSearch.get_shortest_path_trees_from()).
+        """
+        return self.__search.get_shortest_path_trees_from(orig_node, weight, overlay, max_cost)
 
-    def reset_edge_cache(self):
-        self.__edge_cache = {}
+    def get_least_cost_paths_from(
+        self, 
+        orig_node: int, 
+        dest_nodes: List[int], 
+        weight: str='length', 
+        overlay: GraphOverlay = None
+    ) -> List[Union[List[int], None]]:
+        """Calculates the least cost paths from the origin to many destinations by the given edge weight (see 
+        GraphSearch.get_least_cost_paths_from()).
 
-    def delete_added_linking_edges(self, 
-        orig_edges: dict=None,
-        orig_node: dict=None, 
-        dest_edges: dict=None,
-        dest_node: dict=None, 
-        ) -> None:
-        """Deletes linking edges from the graph. Needed after routing in order to keep the graph unchanged.
+        Returns:
+            The least cost paths (edge ids) in the order of the destinations (None if not reachable).
         """
-        delete_node_ids = []
+        return self.__search.get_least_cost_paths_from(orig_node, dest_nodes, weight, overlay)
 
-        if orig_edges:
-            # delete node because it was not in the graph before routing
-            delete_node_ids.append(orig_node['node'])
-        
-        if dest_edges:
-            # delete node because it was not in the graph before routing
-            delete_node_ids.append(dest_node['node'])
+    def get_parametric_least_cost_path(
+        self, 
+        orig_node: int, 
+        dest_node: int, 
+        costs: ParametricCosts, 
+        sen: float, 
+        overlay: GraphOverlay = None,
+        search_area: np.ndarray = None
+    ) -> List[int]:
+        """Calculates a least cost path by parametric costs (see get_parametric_costs()) of the given sensitivity.
+
+        Raises:
+            RoutingException if the origin and the destination are the same or there is no path between them.
+        """
+        return self.__search.get_parametric_least_cost_path(orig_node, dest_node, costs, sen, overlay, search_area)
 
-        try:
-            self.graph.delete_vertices(delete_node_ids)
-            self.log.debug(f'Deleted {len(delete_node_ids)} nodes')
-        except Exception:
-            self.log.error('Could not delete added nodes or edges from the graph')
+    def get_pareto_paths(
+        self, 
+        orig_node: int, 
+        dest_node: int, 
+        costs: ParametricCosts, 
+        max_detour_ratio: float,
+        exposure_tolerance: float,
+        overlay: GraphOverlay = None
+    ) -> List[ParetoPath]:
+        """Finds the Pareto-optimal paths by the base costs and exposure costs of parametric costs (see 
+        GraphSearch.get_pareto_paths()).
 
-        # make sure that graph has the expected number of edges and nodes after routing
-        if (self.graph.ecount() != self.ecount):
-            self.log.error('Graph has incorrect number of edges: '+ str(self.graph.ecount()) + ' is not '+ str(self.ecount))
-        if (self.graph.vcount() != self.vcount):
-            self.log.error('Graph has incorrect number of nodes: '+ str(self.graph.vcount()) + ' is not '+ str(self.vcount))
+        Returns:
+            The paths (with base & exposure costs and lengths) ordered by base cost.
+        Raises:
+            RoutingException if the origin and the destination are the same or there is no path between them.
+        """
+        return self.__search.get_pareto_paths(
+            orig_node, dest_node, costs, max_detour_ratio, exposure_tolerance, overlay)
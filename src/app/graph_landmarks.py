@@ -0,0 +1,197 @@
+"""
+This module provides the landmark tables of a graph (see app/landmarks.py) by cost family and the landmark
+bounds of the edge weights of the cost attributes for the A* searches of the routing engine.
+
+A cost family is the length of a travel mode (e.g. walk_length) or the exposure costs of a travel mode and
+routing mode per unit of sensitivity (e.g. bike_quiet). The tables of the static cost families (length, noise
+& GVI) are built offline (see app/landmark_builder.py) and the tables of AQ costs after each AQI update.
+
+"""
+
+import os
+import time
+from typing import Dict, List, Tuple, Union
+import numpy as np
+import env
+from app.types import AqiGeneration
+from app.csr_graph import CsrGraph
+from app.landmarks import (
+    LandmarkTable, LandmarkBounds, get_landmarks_dir, select_landmarks, get_landmark_bounds, save_landmark_tables,
+    read_landmark_tables
+)
+from app.sensitivity_sweep import get_sensitivities
+from app.logger import Logger
+from app.constants import cost_prefix_dict, TravelMode, RoutingMode
+from utils.arrays import get_array_hash
+from utils.igraph import Edge as E
+
+
+def get_landmark_family(travel_mode: TravelMode, routing_mode: RoutingMode = None) -> str:
+    """Returns the name of a cost family of landmark tables, e.g. walk_length or bike_quiet.
+    """
+    return f'{travel_mode.value}_{routing_mode.value if routing_mode else "length"}'
+
+
+def get_cost_modes(weight: str) -> Tuple[TravelMode, Union[RoutingMode, None]]:
+    """Returns the travel mode and routing mode of a cost attribute (e.g. c_n_b_0.1 -> bike & quiet). Length
+    is the cost of walking shortest paths (without routing mode).
+    """
+    cost_modes = sorted(
+        ((cost_prefix, travel_mode, routing_mode)
+            for travel_mode, prefixes in cost_prefix_dict.items() for routing_mode, cost_prefix in prefixes.items()),
+        key=lambda cost_mode: len(cost_mode[0]),
+        reverse=True
+    )
+    for cost_prefix, travel_mode, routing_mode in cost_modes:
+        if weight.startswith(cost_prefix):
+            return travel_mode, routing_mode
+    return TravelMode.WALK, None
+
+
+class GraphLandmarks:
+    """Landmark tables of a graph by cost family.
+
+    Attributes:
+        landmarks: Landmark nodes of the landmark tables (None if the tables are not used).
+        __edge_arrays: The static numeric edge attributes of the graph (see GraphHandler).
+        __tables: Landmark tables of the static cost families (length, noise & GVI) by family.
+        __aqi_tables: Landmark tables of the AQ costs of an AQI generation (with the generation).
+    """
+
+    def __init__(self, log: Logger, csr_graph: CsrGraph, edge_arrays: Dict[str, np.ndarray]):
+        self.log = log
+        self.landmarks: Union[np.ndarray, None] = None
+        self.__csr_graph = csr_graph
+        self.__edge_arrays = edge_arrays
+        self.__tables: Dict[str, LandmarkTable] = {}
+        self.__aqi_tables: Tuple[Union[AqiGeneration, None], Dict[str, LandmarkTable]] = (None, {})
+
+    def __get_base_weights(self, family: str, aqi_generation: AqiGeneration = None) -> Union[np.ndarray, None]:
+        """Returns the base weights of a cost family of landmark tables: the (biking) lengths of a travel mode
+        or the exposure costs per unit of sensitivity, derived from the costs of the lowest sensitivity of the
+        routing mode. Returns None if the costs are not available or there are no exposure costs.
+        """
+        travel_mode = TravelMode(family.split('_')[0])
+        lengths = self.__edge_arrays[E.length.value]
+        if travel_mode == TravelMode.BIKE:
+            biking_lengths = self.__edge_arrays[E.length_b.value]
+            lengths = np.where(np.isnan(biking_lengths) | (biking_lengths == 0), lengths, biking_lengths)
+        if family == get_landmark_family(travel_mode):
+            return lengths
+        routing_mode = RoutingMode(family.split('_')[1])
+        sen = min(get_sensitivities(routing_mode))
+        cost_attr = cost_prefix_dict[travel_mode][routing_mode] + str(sen)
+        edge_arrays = aqi_generation.edge_arrays if aqi_generation and routing_mode == RoutingMode.CLEAN else self.__edge_arrays
+        if cost_attr not in edge_arrays:
+            return None
+        base_weights = np.nan_to_num(np.maximum((edge_arrays[cost_attr] - lengths) / sen, 0.0), nan=0.0)
+        return base_weights if base_weights.any() else None
+
+    def __get_static_families(self) -> List[str]:
+        """Returns the cost families of the landmark tables that are built offline. Walking length is needed
+        for the shortest paths of both travel modes.
+        """
+        travel_modes = [
+            travel_mode for travel_mode, enabled
+            in ((TravelMode.WALK, env.walking_enabled), (TravelMode.BIKE, env.cycling_enabled)) if enabled
+        ]
+        return [get_landmark_family(TravelMode.WALK)] + [
+            get_landmark_family(travel_mode, routing_mode)
+            for travel_mode in travel_modes
+            for routing_mode in (None, RoutingMode.QUIET, RoutingMode.GREEN)
+            if travel_mode != TravelMode.WALK or routing_mode
+        ]
+
+    def load(self, graph_file: str) -> None:
+        """Loads the landmarks and the landmark tables of the static cost families if they have been built (see
+        app/landmark_builder.py). Tables that do not match the base weights of the graph are not used.
+        """
+        landmarks_dir = get_landmarks_dir(graph_file)
+        if not os.path.exists(landmarks_dir):
+            return
+        landmarks, landmark_tables, metadata = read_landmark_tables(landmarks_dir)
+        if metadata['vcount'] != self.__csr_graph.vcount or metadata['ecount'] != self.__csr_graph.ecount:
+            self.log.warning(
+                f'Landmark tables {landmarks_dir} were built for another graph, not using them '
+                '- rebuild them with: python -m app.landmark_builder')
+            return
+        valid_tables = {}
+        for family, table in landmark_tables.items():
+            base_weights = self.__get_base_weights(family)
+            if base_weights is None or table.weights_hash != get_array_hash(base_weights):
+                self.log.warning(
+                    f'Landmark table {family} does not match the graph, not using it '
+                    '- rebuild the tables with: python -m app.landmark_builder')
+                continue
+            valid_tables[family] = table
+        self.log.info(f'Loaded landmark tables for {list(valid_tables)} ({len(landmarks)} landmarks): {landmarks_dir}')
+        self.landmarks, self.__tables = landmarks, valid_tables
+
+    def export(self, landmarks_dir: str, landmark_count: int) -> None:
+        """Selects landmarks and builds the landmark tables of the static cost families (length, noise & GVI)
+        and saves them to the directory.
+        """
+        landmarks = select_landmarks(self.__csr_graph, self.__edge_arrays[E.length.value], landmark_count)
+        landmark_tables = {}
+        for family in self.__get_static_families():
+            base_weights = self.__get_base_weights(family)
+            if base_weights is None:
+                self.log.info(f'No base weights for landmark table {family}')
+                continue
+            start_time = time.time()
+            landmark_tables[family] = LandmarkTable.build(
+                self.__csr_graph, base_weights, landmarks, get_array_hash(base_weights))
+            self.log.duration(start_time, f'Built landmark table {family}', log_level='info')
+        save_landmark_tables(
+            landmarks_dir, landmarks, landmark_tables,
+            metadata={ 'vcount': self.__csr_graph.vcount, 'ecount': self.__csr_graph.ecount })
+
+    def update_aqi_tables(self, aqi_generation: AqiGeneration) -> bool:
+        """Builds the landmark tables of the AQ costs of the AQI generation (replacing the ones of the previous
+        generation). Returns False if the landmark tables are not used.
+        """
+        if self.landmarks is None:
+            return False
+        start_time = time.time()
+        aqi_tables = {}
+        for travel_mode in TravelMode:
+            family = get_landmark_family(travel_mode, RoutingMode.CLEAN)
+            base_weights = self.__get_base_weights(family, aqi_generation)
+            if base_weights is not None:
+                aqi_tables[family] = LandmarkTable.build(
+                    self.__csr_graph, base_weights, self.landmarks, get_array_hash(base_weights))
+        self.__aqi_tables = (aqi_generation, aqi_tables)
+        self.log.duration(start_time, f'Built AQ landmark tables of {aqi_generation.aqi_data}', log_level='info')
+        return True
+
+    def get_table(self, family: str) -> Union[LandmarkTable, None]:
+        """Returns the landmark table of a static cost family (None if not loaded).
+        """
+        return self.__tables.get(family)
+
+    def get_bounds(
+        self,
+        weight: str,
+        weights: np.ndarray,
+        aqi_generation: AqiGeneration
+    ) -> Union[LandmarkBounds, None]:
+        """Returns the landmark bounds of the edge weights of a cost attribute from the landmark tables of the
+        length and the exposure costs of its travel mode and routing mode (if available).
+        """
+        if self.landmarks is None:
+            return None
+        travel_mode, routing_mode = get_cost_modes(weight)
+        landmark_tables = dict(self.__tables)
+        tables_generation, aqi_tables = self.__aqi_tables
+        if tables_generation is aqi_generation:
+            landmark_tables.update(aqi_tables)
+        length_family = get_landmark_family(travel_mode)
+        exposure_family = get_landmark_family(travel_mode, routing_mode) if routing_mode else None
+        if length_family not in landmark_tables:
+            return None
+        return get_landmark_bounds(
+            weights,
+            (self.__get_base_weights(length_family), landmark_tables[length_family]),
+            (self.__get_base_weights(exposure_family, aqi_generation), landmark_tables[exposure_family])
+            if exposure_family in landmark_tables else None
+        )
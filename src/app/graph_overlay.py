@@ -0,0 +1,54 @@
+from typing import List, Dict
+from shapely.geometry import Point
+from app.types import PathEdge, AqiGeneration
+from utils.igraph import Edge as E
+
+
+class GraphOverlay:
+    """A per-request overlay of the graph that holds the virtual origin & destination nodes and the linking edges
+    that connect them to the graph. The virtual nodes and edges exist only in the overlay (the graph is not
+    modified during routing), and they are identified with ids that follow the node and edge ids of the graph.
+
+    Attributes:
+        aqi_generation: The AQI generation that is used for the whole lifetime of the request.
+        nodes: Geometries of the virtual nodes by node id.
+        edges: Attributes of the virtual edges by edge id (including the node pair of the edge, uv).
+        edge_cache: A cache of path edges of the request.
+    """
+
+    def __init__(self, vcount: int, ecount: int, aqi_generation: AqiGeneration):
+        self.__next_node_id = vcount
+        self.__next_edge_id = ecount
+        self.aqi_generation = aqi_generation
+        self.nodes: Dict[int, Point] = {}
+        self.edges: Dict[int, dict] = {}
+        self.edge_cache: Dict[int, PathEdge] = {}
+        self.__out_edges: Dict[int, List[int]] = {}
+        self.__in_edges: Dict[int, List[int]] = {}
+
+    def add_node(self, point: Point) -> int:
+        """Adds a virtual node at the given location and returns the id of the new node.
+        """
+        node_id = self.__next_node_id
+        self.nodes[node_id] = point
+        self.__next_node_id += 1
+        return node_id
+
+    def add_edge(self, attrs: dict) -> int:
+        """Adds a virtual edge with the given attributes (incl. uv) and returns the id of the new edge.
+        """
+        edge_id = self.__next_edge_id
+        self.edges[edge_id] = attrs
+        self.__out_edges.setdefault(attrs[E.uv.value][0], []).append(edge_id)
+        self.__in_edges.setdefault(attrs[E.uv.value][1], []).append(edge_id)
+        self.__next_edge_id += 1
+        return edge_id
+
+    def is_virtual_node(self, node_id: int) -> bool:
+        return node_id in self.nodes
+
+    def get_out_edges(self, node_id: int) -> List[int]:
+        return list(self.__out_edges.get(node_id, []))
+
+    def get_in_edges(self, node_id: int) -> List[int]:
+        return list(self.__in_edges.get(node_id, []))
@@ -0,0 +1,461 @@
+"""
+This module provides the least cost path searches of a graph: the search entry points of GraphHandler that
+combine the searches of the routing engine (see app/routing_engines.py), the contraction hierarchy (see
+app/contraction_hierarchy.py), the shortest path trees, the sensitivity sweep and the Pareto search with the
+virtual nodes and edges of the overlay of a routing request (see app/graph_overlay.py).
+
+The edge weights of the cost attributes are prepared for the routing engine once and cached (the edge
+weights of AQ costs only for the latest AQI generation).
+
+"""
+
+import os
+from math import inf
+from typing import Callable, Dict, List, Tuple, Union
+import numpy as np
+from shapely.geometry import Point
+import env
+from app.types import AqiGeneration, is_aqi_edge_attr
+from app.graph_overlay import GraphOverlay
+from app.csr_graph import CsrGraph
+from app.routing_engines import EdgeWeights, get_routing_engine
+from app.shortest_path_tree import ShortestPathTree, find_shortest_path_tree
+from app.contraction_hierarchy import ContractionHierarchy, get_ch_file
+from app.graph_landmarks import GraphLandmarks, get_landmark_family
+from app.sensitivity_sweep import ParametricCosts, get_linear_costs, get_sensitivities
+from app.pareto_search import ParetoPath, find_pareto_paths
+from app.logger import Logger
+from app.constants import RoutingException, ErrorKeys, cost_prefix_dict, TravelMode, RoutingMode
+from utils.igraph import Edge as E
+
+
+class GraphSearch:
+    """Least cost path searches of a graph (by node ids of the graph and of the overlay of a request).
+
+    Attributes:
+        landmarks: Landmark tables of the graph for the landmark bounds of the A* searches (if used).
+        __get_edge_array: Returns a numeric edge attribute by AQI generation (see GraphHandler.get_edge_array()).
+        __get_aqi_generation: Returns the latest AQI generation of the graph.
+        __routing_engine: The routing engine (env.routing_engine) that searches least cost paths over the CSR
+            adjacency of the graph.
+        __length_ch: Contraction hierarchy for the shortest paths by length (if built for the graph).
+        __edge_weights: Cached edge weights (in the forms used by the routing engine) by cost attribute.
+        __parametric_edge_costs: Cached base & exposure costs of the sensitivity sweep (except AQ costs) by the
+            cost attributes of the lowest and the highest sensitivity.
+        __aqi_edge_weights: Edge weights of the AQ costs of the latest AQI generation (with the generation).
+    """
+
+    def __init__(
+        self,
+        log: Logger,
+        graph_file: str,
+        csr_graph: CsrGraph,
+        node_xs: np.ndarray,
+        node_ys: np.ndarray,
+        edge_arrays: Dict[str, np.ndarray],
+        get_edge_array: Callable[[str, AqiGeneration], np.ndarray],
+        get_aqi_generation: Callable[[], AqiGeneration]
+    ):
+        self.log = log
+        self.__csr_graph = csr_graph
+        self.__node_xs = node_xs
+        self.__node_ys = node_ys
+        self.__get_edge_array = get_edge_array
+        self.__get_aqi_generation = get_aqi_generation
+        self.__routing_engine = get_routing_engine(env.routing_engine, csr_graph, node_xs, node_ys)
+        if env.routing_engine == 'astar':
+            self.log.warning(
+                'Routing engine astar is faster than dijkstra only on short trips (about 1-2 km) '
+                '- use ROUTING_ENGINE=dijkstra if the trips are longer')
+        self.__edge_weights: Dict[str, EdgeWeights] = {}
+        self.__parametric_edge_costs: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+        self.__aqi_edge_weights: Tuple[Union[AqiGeneration, None], Dict[str, EdgeWeights]] = (None, {})
+        self.__length_ch = self.__load_length_ch(graph_file)
+        self.landmarks = GraphLandmarks(log, csr_graph, edge_arrays)
+        if self.__routing_engine.uses_landmarks:
+            self.landmarks.load(graph_file)
+
+    def __load_length_ch(self, graph_file: str) -> Union[ContractionHierarchy, None]:
+        """Loads the contraction hierarchy of the graph for the shortest path searches if it has been built
+        (see app/ch_builder.py) and is up to date with the graph.
+        """
+        ch_file = get_ch_file(graph_file)
+        if not os.path.exists(ch_file):
+            return None
+        length_ch = ContractionHierarchy.load(ch_file)
+        if not length_ch.is_valid_for(self.__csr_graph.vcount, self.__get_edge_array(E.length.value)):
+            self.log.warning(
+                f'Contraction hierarchy {ch_file} was built for another graph, using routing engine for shortest paths '
+                '- rebuild it with: python -m app.ch_builder')
+            return None
+        self.log.info(f'Loaded contraction hierarchy for shortest paths: {ch_file}')
+        return length_ch
+
+    def export_length_ch(self, ch_file: str) -> None:
+        """Builds a contraction hierarchy of the graph by edge length and saves it to the file.
+        """
+        edge_sources, edge_targets = self.__csr_graph.get_edges()
+        length_ch = ContractionHierarchy.build(
+            self.log, self.__csr_graph.vcount, edge_sources, edge_targets, self.__get_edge_array(E.length.value))
+        length_ch.save(ch_file)
+
+    def get_csr_weights(self, weight: str, aqi_generation: AqiGeneration, reverse: bool = False) -> np.ndarray:
+        """Returns the (float64) weights of a numeric edge attribute in the CSR order of the forward or reverse
+        adjacency (missing weights as infinity). The weights are created once per edge attribute (and AQI
+        generation) and must not be modified.
+        """
+        return self.__get_edge_weights(weight, aqi_generation).get_form(
+            'csr_reverse' if reverse else 'csr',
+            lambda weights: self.__csr_graph.get_csr_weights(weights, reverse)
+        )
+
+    def prepare_aqi_edge_weights(self, aqi_generation: AqiGeneration) -> None:
+        """Prepares the edge weights of the AQ costs of a new AQI generation for the routing engine (before the
+        generation is published, not by the routing requests).
+        """
+        aqi_edge_weights = {
+            attr: EdgeWeights(arr, self.landmarks.get_bounds(attr, arr, aqi_generation))
+            for attr, arr in aqi_generation.edge_arrays.items() if attr != E.aqi.value
+        }
+        for edge_weights in aqi_edge_weights.values():
+            self.__routing_engine.prepare_weights(edge_weights)
+        self.__aqi_edge_weights = (aqi_generation, aqi_edge_weights)
+
+    def update_aqi_landmark_tables(self, aqi_generation: AqiGeneration) -> None:
+        """Builds the landmark tables of the AQ costs of the AQI generation and replaces the edge weights of the
+        AQ costs with ones that use them, if the generation is still the latest one. Until then, the landmark
+        bounds of the AQ costs are based on length only.
+        """
+        if self.landmarks.update_aqi_tables(aqi_generation) and aqi_generation is self.__get_aqi_generation():
+            self.prepare_aqi_edge_weights(aqi_generation)
+
+    def __get_edge_weights(self, weight: str, aqi_generation: AqiGeneration) -> EdgeWeights:
+        """Returns the edge weights of the edge attribute for least cost path searches. The edge weights are
+        created once and cached (the edge weights of AQ costs only for the latest AQI generation).
+        """
+        if is_aqi_edge_attr(weight):
+            latest_generation, cached_edge_weights = self.__aqi_edge_weights
+            if aqi_generation is not latest_generation:
+                # a request that started before an AQI update
+                return EdgeWeights(aqi_generation.edge_arrays[weight])
+        else:
+            cached_edge_weights = self.__edge_weights
+        if weight not in cached_edge_weights:
+            weights = self.__get_edge_array(weight, aqi_generation)
+            cached_edge_weights[weight] = EdgeWeights(weights, self.landmarks.get_bounds(weight, weights, aqi_generation))
+        return cached_edge_weights[weight]
+
+    def __get_request_aqi_generation(self, overlay: Union[GraphOverlay, None]) -> AqiGeneration:
+        return overlay.aqi_generation if overlay else self.__get_aqi_generation()
+
+    def get_search_area(
+        self,
+        orig_node: int,
+        dest_node: int,
+        max_length: float,
+        overlay: GraphOverlay = None
+    ) -> np.ndarray:
+        """Returns the search area of paths of at most the given length between the nodes, as a boolean array of
+        the nodes of the graph that such paths may pass: the nodes inside the ellipse of the origin and the
+        destination (as foci) and, if the landmark table of walking lengths is loaded, the nodes within the
+        landmark bounds of the lengths from the origin and to the destination.
+        """
+        points = [
+            overlay.nodes[node] if overlay and overlay.is_virtual_node(node)
+            else Point(self.__node_xs[node], self.__node_ys[node])
+            for node in (orig_node, dest_node)
+        ]
+        min_lengths = (
+            np.hypot(self.__node_xs - points[0].x, self.__node_ys - points[0].y)
+            + np.hypot(self.__node_xs - points[1].x, self.__node_ys - points[1].y)
+        )
+        length_table = self.landmarks.get_table(get_landmark_family(TravelMode.WALK))
+        if length_table is not None:
+            get_link_length = lambda edge_id: overlay.edges[edge_id][E.length.value]
+            from_orig, to_dest = (
+                np.min([
+                    link_length + get_lower_bounds(node) for node, link_length, _
+                    in self.__get_search_endpoints(endpoint, get_link_length, overlay, origin=origin)
+                ], axis=0)
+                for endpoint, origin, get_lower_bounds
+                in ((orig_node, True, length_table.get_lower_bounds_from), (dest_node, False, length_table.get_lower_bounds_to))
+            )
+            min_lengths = np.maximum(min_lengths, from_orig + to_dest)
+        # (with a tolerance for the rounding of the edge lengths)
+        return min_lengths <= max_length * 1.001 + 1.0
+
+    def get_parametric_costs(
+        self,
+        travel_mode: TravelMode,
+        routing_mode: RoutingMode,
+        overlay: GraphOverlay = None
+    ) -> ParametricCosts:
+        """Returns the costs of the routing mode as linear functions of sensitivity (for the sensitivity sweep),
+        derived from the costs of the lowest and the highest sensitivity. The costs of the linking edges are
+        read from the overlay (if given) and AQ costs from its AQI generation.
+        """
+        aqi_generation = self.__get_request_aqi_generation(overlay)
+        sens = get_sensitivities(routing_mode)
+        cost_prefix = cost_prefix_dict[travel_mode][routing_mode]
+        min_sen, max_sen = min(sens), max(sens)
+        min_attr, max_attr = cost_prefix + str(min_sen), cost_prefix + str(max_sen)
+        get_edge_costs = lambda: get_linear_costs(
+            min_sen, self.__get_edge_array(min_attr, aqi_generation),
+            max_sen, self.__get_edge_array(max_attr, aqi_generation))
+        if is_aqi_edge_attr(min_attr):
+            base_costs, exposure_costs = get_edge_costs()
+        else:
+            if (min_attr, max_attr) not in self.__parametric_edge_costs:
+                self.__parametric_edge_costs[(min_attr, max_attr)] = get_edge_costs()
+            base_costs, exposure_costs = self.__parametric_edge_costs[(min_attr, max_attr)]
+        link_costs = {
+            edge_id: get_linear_costs(min_sen, edge[min_attr], max_sen, edge[max_attr])
+            for edge_id, edge in (overlay.edges.items() if overlay else [])
+        }
+        return ParametricCosts((min_sen, min_attr), (max_sen, max_attr), base_costs, exposure_costs, link_costs)
+
+    def __get_search_endpoints(
+        self,
+        node: int,
+        get_link_cost: Callable[[int], Union[float, Tuple[float, float]]],
+        overlay: Union[GraphOverlay, None],
+        origin: bool
+    ) -> List[Tuple[int, Union[float, Tuple[float, float]], List[int]]]:
+        """Returns the nodes of the graph from/to which a least cost path is searched in the graph for a path
+        from/to the given node, as tuples of node id, cost (or costs) and edge ids from/to the given node. A virtual
+        node is replaced by the nodes of the graph that it is linked to (by virtual edges).
+        """
+        if not overlay or not overlay.is_virtual_node(node):
+            return [(node, 0.0, [])]
+        endpoints = []
+        edge_ids = overlay.get_out_edges(node) if origin else overlay.get_in_edges(node)
+        for edge_id in edge_ids:
+            edge = overlay.edges[edge_id]
+            graph_node = edge[E.uv.value][1] if origin else edge[E.uv.value][0]
+            if not overlay.is_virtual_node(graph_node):
+                endpoints.append((graph_node, get_link_cost(edge_id), [edge_id]))
+        return endpoints
+
+    def __find_graph_paths(
+        self,
+        sources: List[Tuple[int, float, List[int]]],
+        targets: List[Tuple[int, float, List[int]]],
+        find_paths: Callable[[int, List[int], bool], List[Union[Tuple[float, List[int]], None]]]
+    ) -> List[Tuple[float, List[int]]]:
+        """Returns the least cost paths between all pairs of source and target nodes (found in the graph) as
+        tuples of total cost and edge ids. Search is done from the side that has fewer nodes.
+        """
+        paths = []
+        reverse = len(sources) > len(targets)
+        for (node, cost, edge_ids) in (targets if reverse else sources):
+            to_endpoints = sources if reverse else targets
+            to_nodes = [endpoint[0] for endpoint in to_endpoints]
+            graph_paths = find_paths(node, to_nodes, reverse)
+            for (to_node, to_cost, to_edge_ids), graph_path in zip(to_endpoints, graph_paths):
+                if not graph_path:
+                    continue # not reachable
+                path_cost, epath = graph_path
+                if reverse:
+                    paths.append((cost + to_cost + path_cost, to_edge_ids + epath + edge_ids))
+                else:
+                    paths.append((cost + to_cost + path_cost, edge_ids + epath + to_edge_ids))
+        return paths
+
+    def __find_least_cost_path(
+        self,
+        orig_node: int,
+        dest_node: int,
+        overlay: Union[GraphOverlay, None],
+        get_link_cost: Callable[[int], float],
+        find_paths: Callable[[int, List[int], bool], List[Union[Tuple[float, List[int]], None]]]
+    ) -> List[int]:
+        """Returns the least cost path between the nodes (that may be virtual nodes of the overlay) by the costs
+        of the linking edges and the least cost paths in the graph (from a node to a list of nodes).
+
+        Raises:
+            RoutingException (PATHFINDING_ERROR) if the destination is not reachable from the origin.
+        """
+        sources = self.__get_search_endpoints(orig_node, get_link_cost, overlay, origin=True)
+        targets = self.__get_search_endpoints(dest_node, get_link_cost, overlay, origin=False)
+        paths = self.__find_graph_paths(sources, targets, find_paths) if sources and targets else []
+        if overlay:
+            # virtual edges between virtual origin and destination (on the same edge of the graph)
+            paths += [
+                (get_link_cost(edge_id), [edge_id])
+                for edge_id in overlay.get_out_edges(orig_node)
+                if overlay.edges[edge_id][E.uv.value][1] == dest_node
+            ]
+        if not paths:
+            raise RoutingException(ErrorKeys.PATHFINDING_ERROR.value)
+        return min(paths, key=lambda path: path[0])[1]
+
+    def get_least_cost_path(
+        self,
+        orig_node: int,
+        dest_node: int,
+        weight: str='length',
+        overlay: GraphOverlay = None,
+        search_area: np.ndarray = None
+    ) -> List[int]:
+        """Calculates a least cost path by the given edge weight. Origin and destination can be virtual nodes
+        of the overlay: the path is then combined from the least cost paths between the nodes of the graph
+        that the virtual nodes are linked to (and the linking edges). Shortest paths (by length) are queried
+        from the contraction hierarchy if available.
+
+        Args:
+            orig_node: The name of the origin node (int).
+            dest_node: The name of the destination node (int).
+            weight: The name of the edge attribute to use as cost in the least cost path optimization.
+            overlay: The overlay of the routing request (virtual nodes & edges and AQI generation).
+            search_area: Nodes of the graph that the path may pass (see get_search_area()), or None for all.
+        Returns:
+            The least cost path as a sequence of edges (ids).
+        Raises:
+            RoutingException if the origin and the destination are the same or there is no path between them.
+        """
+        if (orig_node == dest_node):
+            raise RoutingException(ErrorKeys.OD_SAME_LOCATION.value)
+        aqi_generation = self.__get_request_aqi_generation(overlay)
+        use_length_ch = weight == E.length.value and self.__length_ch is not None and search_area is None
+        edge_weights = None if use_length_ch else self.__get_edge_weights(weight, aqi_generation)
+        find_paths = (
+            (lambda node, to_nodes, reverse:
+                self.__length_ch.find_least_cost_paths(node, to_nodes, reverse=reverse)) if use_length_ch
+            else (lambda node, to_nodes, reverse:
+                self.__routing_engine.find_least_cost_paths(
+                    edge_weights, node, to_nodes, reverse=reverse, search_area=search_area))
+        )
+        return self.__find_least_cost_path(
+            orig_node, dest_node, overlay, lambda edge_id: overlay.edges[edge_id][weight], find_paths)
+
+    def get_shortest_path_trees_from(
+        self,
+        orig_node: int,
+        weight: str='length',
+        overlay: GraphOverlay = None,
+        max_cost: float = inf
+    ) -> List[Tuple[float, List[int], ShortestPathTree]]:
+        """Finds a shortest path tree (see app/shortest_path_tree.py) by the given edge weight from each node of
+        the graph that the origin is linked to (or from the origin if it is not a virtual node of the overlay).
+        The trees include the nodes whose costs from the origin are at most max_cost.
+
+        Returns:
+            The trees as tuples of the cost and the edge ids of the link from the origin, and the tree.
+        """
+        edge_weights = self.__get_edge_weights(weight, self.__get_request_aqi_generation(overlay))
+        get_link_cost = lambda edge_id: overlay.edges[edge_id][weight]
+        return [
+            (cost, edge_ids, find_shortest_path_tree(self.__csr_graph, edge_weights, node, max_cost=max_cost - cost))
+            for node, cost, edge_ids in self.__get_search_endpoints(orig_node, get_link_cost, overlay, origin=True)
+            if cost <= max_cost
+        ]
+
+    def get_least_cost_paths_from(
+        self,
+        orig_node: int,
+        dest_nodes: List[int],
+        weight: str='length',
+        overlay: GraphOverlay = None
+    ) -> List[Union[List[int], None]]:
+        """Calculates the least cost paths from the origin to many destinations by the given edge weight with
+        one shortest path tree search (see app/shortest_path_tree.py) from each node of the graph that the origin
+        is linked to. Origin and destinations can be virtual nodes of the overlay.
+
+        Returns:
+            The least cost paths (edge ids) in the order of the destinations (None if not reachable).
+        """
+        get_link_cost = lambda edge_id: overlay.edges[edge_id][weight]
+        trees = self.get_shortest_path_trees_from(orig_node, weight, overlay)
+        # virtual edges from a virtual origin to virtual destinations (on the same edge of the graph)
+        direct_edges = {
+            overlay.edges[edge_id][E.uv.value][1]: edge_id for edge_id in overlay.get_out_edges(orig_node)
+        } if overlay else {}
+        paths = []
+        for dest_node in dest_nodes:
+            least_cost, least_cost_path = inf, None
+            for cost, edge_ids, tree in trees:
+                for node, to_cost, to_edge_ids in self.__get_search_endpoints(dest_node, get_link_cost, overlay, origin=False):
+                    path_cost = cost + tree.get_cost(node) + to_cost
+                    if path_cost < least_cost:
+                        least_cost, least_cost_path = path_cost, edge_ids + tree.get_edge_ids(node) + to_edge_ids
+            if dest_node in direct_edges and get_link_cost(direct_edges[dest_node]) < least_cost:
+                least_cost_path = [direct_edges[dest_node]]
+            paths.append(least_cost_path)
+        return paths
+
+    def get_parametric_least_cost_path(
+        self,
+        orig_node: int,
+        dest_node: int,
+        costs: ParametricCosts,
+        sen: float,
+        overlay: GraphOverlay = None,
+        search_area: np.ndarray = None
+    ) -> List[int]:
+        """Calculates a least cost path by parametric costs (see get_parametric_costs()) of the given sensitivity.
+        The cost attributes (and their cached edge weights) are used for the lowest and the highest sensitivity.
+
+        Raises:
+            RoutingException if the origin and the destination are the same or there is no path between them.
+        """
+        cost_attr = costs.get_cost_attr(sen)
+        if cost_attr:
+            return self.get_least_cost_path(
+                orig_node, dest_node, weight=cost_attr, overlay=overlay, search_area=search_area)
+        if (orig_node == dest_node):
+            raise RoutingException(ErrorKeys.OD_SAME_LOCATION.value)
+        aqi_generation = self.__get_request_aqi_generation(overlay)
+        weights = costs.get_edge_costs(sen)
+        edge_weights = EdgeWeights(weights, self.landmarks.get_bounds(costs.min_sen[1], weights, aqi_generation))
+        return self.__find_least_cost_path(
+            orig_node,
+            dest_node,
+            overlay,
+            lambda edge_id: costs.get_link_cost(edge_id, sen),
+            lambda node, to_nodes, reverse: self.__routing_engine.find_least_cost_paths(
+                edge_weights, node, to_nodes, reverse=reverse, search_area=search_area))
+
+    def get_pareto_paths(
+        self,
+        orig_node: int,
+        dest_node: int,
+        costs: ParametricCosts,
+        max_detour_ratio: float,
+        exposure_tolerance: float,
+        overlay: GraphOverlay = None
+    ) -> List[ParetoPath]:
+        """Finds the Pareto-optimal paths by the base costs and exposure costs of parametric costs (see
+        get_parametric_costs()) with a bi-criteria search (see app/pareto_search.py). The lengths of the paths are
+        at most max_detour_ratio times the length of the shortest path.
+
+        Returns:
+            The paths (with base & exposure costs and lengths) ordered by base cost.
+        Raises:
+            RoutingException if the origin and the destination are the same or there is no path between them.
+        """
+        if (orig_node == dest_node):
+            raise RoutingException(ErrorKeys.OD_SAME_LOCATION.value)
+        get_link_costs = lambda edge_id: (*costs.link_costs[edge_id], overlay.edges[edge_id][E.length.value])
+        sources, targets = (
+            [(node, link_costs or (0.0, 0.0, 0.0), edge_ids) for node, link_costs, edge_ids
+                in self.__get_search_endpoints(node, get_link_costs, overlay, origin=origin)]
+            for node, origin in ((orig_node, True), (dest_node, False))
+        )
+        direct_paths = [
+            ParetoPath(*get_link_costs(edge_id), [edge_id])
+            for edge_id in overlay.get_out_edges(orig_node)
+            if overlay.edges[edge_id][E.uv.value][1] == dest_node
+        ] if overlay else []
+        paths = find_pareto_paths(
+            self.__csr_graph,
+            costs.base_costs,
+            costs.exposure_costs,
+            self.__get_edge_array(E.length.value),
+            sources,
+            targets,
+            max_detour_ratio,
+            exposure_tolerance=exposure_tolerance,
+            direct_paths=direct_paths)
+        if not paths:
+            raise RoutingException(ErrorKeys.PATHFINDING_ERROR.value)
+        return paths
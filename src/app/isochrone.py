@@ -0,0 +1,213 @@
+"""
+This module provides isochrones (reachability) from an origin: the edges that are reachable within a length or
+cost budget by the cost attribute of a travel mode and routing mode (e.g. noise costs of walking by one of the
+noise sensitivities), and the least costs and the cumulative exposures (length, nei, aqc & mean GVI) of the
+least cost paths to the reached nodes. The isochrone is found by one bounded shortest path tree search from the
+origin (see GraphHandler.get_shortest_path_trees_from()), and the exposures are summed along the tree.
+
+The isochrones can be requested from the routing API (see green_paths_app.py) or used in-process, e.g.:
+
+    G = GraphHandler(Logger(), 'graphs/kumpula.graphml')
+    isochrone = get_isochrone(Logger(), G, TravelMode.WALK, RoutingMode.QUIET, (60.2174, 24.9699), 800)
+
+"""
+
+from typing import Dict, List, Tuple, Union
+import time
+import numpy as np
+from shapely.geometry import LineString
+from shapely.ops import substring
+import app.noise_exposures as noise_exps
+import app.aq_exposures as aq_exps
+import app.od_handler as od_handler
+import utils.geometry as geom_utils
+from app.graph_handler import GraphHandler
+from app.sensitivity_sweep import get_sensitivities
+from app.graph_overlay import GraphOverlay
+from app.types import AqiGeneration
+from app.constants import RoutingException, ErrorKeys, TravelMode, RoutingMode, cost_prefix_dict
+from app.logger import Logger
+from utils.igraph import Edge as E, Node as N
+
+
+# the exposures that are summed along the paths (gvi_l = GVI x length for the mean GVI)
+exposure_names = ['length', 'nei', 'aqc', 'gvi_l']
+
+
+def get_edge_exposures(
+    lengths: np.ndarray,
+    noises_list: List[Union[dict, None]],
+    aqis: np.ndarray,
+    gvis: np.ndarray,
+    db_costs: Dict[int, float]
+) -> Dict[str, np.ndarray]:
+    """Returns the exposures of edges in the same way as the path attributes of the routing API are aggregated
+    (see app/od_matrix.py). Exposures are NaN if the edges lack the exposure data.
+    """
+    lengths, aqis = np.asarray(lengths, dtype=np.float64), np.asarray(aqis, dtype=np.float64)
+    return {
+        'length': lengths,
+        'nei': np.array([
+            noise_exps.get_noise_cost(noises, db_costs) if noises is not None else np.nan for noises in noises_list
+        ], dtype=np.float64),
+        'aqc': np.where(
+            np.isnan(aqis) | (aqis < 0.95), np.nan, np.round(lengths * aq_exps.get_aqi_coeffs(aqis), 2)),
+        'gvi_l': np.asarray(gvis, dtype=np.float64) * lengths
+    }
+
+
+def get_graph_edge_exposures(
+    G: GraphHandler, 
+    edge_ids: np.ndarray, 
+    aqi_generation: AqiGeneration
+) -> Dict[str, np.ndarray]:
+    lengths = G.get_edge_array(E.length.value)[edge_ids]
+    return get_edge_exposures(
+        lengths,
+        G.graph.es[edge_ids.tolist()][E.noises.value] if len(edge_ids) else [],
+        G.get_edge_array(E.aqi.value, aqi_generation)[edge_ids],
+        G.get_edge_array(E.gvi.value)[edge_ids],
+        G.db_costs
+    )
+
+
+def get_link_edge_exposures(G: GraphHandler, overlay: GraphOverlay, edge_ids: List[int]) -> Dict[str, np.ndarray]:
+    edges = [G.get_edge_attrs_by_id(edge_id, overlay) for edge_id in edge_ids]
+    to_float = lambda value: np.nan if value is None else value
+    return get_edge_exposures(
+        [edge[E.length.value] for edge in edges],
+        [edge[E.noises.value] for edge in edges],
+        [to_float(edge[E.aqi.value]) for edge in edges],
+        [to_float(edge[E.gvi.value]) for edge in edges],
+        G.db_costs
+    )
+
+
+def get_weight(routing_mode: RoutingMode, travel_mode: TravelMode, sensitivity: Union[float, None]) -> str:
+    """Returns the cost attribute of the isochrone: length or the cost attribute of a sensitivity of the routing
+    mode.
+
+    Raises:
+        RoutingException if the sensitivity is not one of the sensitivities of the routing mode.
+    """
+    if sensitivity is None:
+        return E.length.value
+    sens = [sen for sen in get_sensitivities(routing_mode) if sen == sensitivity]
+    if not sens:
+        raise RoutingException(ErrorKeys.INVALID_SENSITIVITY_PARAM.value)
+    return cost_prefix_dict[travel_mode][routing_mode] + str(sens[0])
+
+
+def get_line_feature(geom: LineString, props: dict) -> dict:
+    return {
+        'type': 'Feature',
+        'properties': props,
+        'geometry': {
+            'coordinates': geom_utils.round_coordinates(geom.coords, digits=6),
+            'type': 'LineString'
+        }
+    }
+
+
+def get_reached_line(geom: LineString, share: float) -> LineString:
+    return geom if share >= 1.0 else substring(geom, 0.0, share, normalized=True)
+
+
+def get_isochrone(
+    log: Logger,
+    G: GraphHandler,
+    travel_mode: TravelMode,
+    routing_mode: RoutingMode,
+    orig_coords: Tuple[float, float],
+    max_cost: float,
+    sensitivity: Union[float, None] = None
+) -> dict:
+    """Finds the edges and nodes that are reachable from the origin within the budget (max_cost) by length (if
+    sensitivity is None) or by the costs of a sensitivity of the routing mode.
+
+    Args:
+        orig_coords: The origin as (latitude, longitude).
+    Returns:
+        The reached edges (edge_FC) as a GeoJSON feature collection of (partially reached edges clipped) lines
+        with the cost at the start of the edge (cost) and the reached share of the edge (share), and the reached
+        nodes (node_FC) as a feature collection of points with the least cost (cost) and the length, nei, aqc
+        and gvi_m of the least cost path to the node (None if some edges of the path lack the exposure data).
+    Raises:
+        RoutingException if the origin is not found or the sensitivity is invalid.
+    """
+    weight = get_weight(routing_mode, travel_mode, sensitivity)
+    start_time = time.time()
+    overlay = G.create_overlay()
+    orig_point = geom_utils.project_geom(geom_utils.get_point_from_lat_lon({ 'lat': orig_coords[0], 'lon': orig_coords[1] }))
+    orig_node, _ = od_handler.get_orig_node_and_linking_edges(
+        log, G, overlay, orig_point, aq_exps.get_aq_sensitivities(), noise_exps.get_noise_sensitivities(), G.db_costs)
+    orig_node = orig_node['node']
+    trees = G.get_shortest_path_trees_from(orig_node, weight, overlay, max_cost=max_cost)
+    log.duration(start_time, f'found {len(trees)} path trees', unit='ms', log_level='info')
+
+    # the least costs & the cumulative exposures of the nodes from the trees of the nodes the origin is linked to
+    start_time = time.time()
+    costs = np.full(G.vcount, np.inf)
+    exposures = { name: np.full(G.vcount, np.nan) for name in exposure_names }
+    for link_cost, link_edge_ids, tree in trees:
+        link_exposures = get_link_edge_exposures(G, overlay, link_edge_ids)
+        _, tree_edge_ids = tree.get_tree_edges()
+        tree_exposures = get_graph_edge_exposures(G, tree_edge_ids, overlay.aqi_generation)
+        tree_costs = link_cost + tree.costs
+        better = tree_costs < costs
+        costs = np.where(better, tree_costs, costs)
+        for name in exposure_names:
+            exposures[name] = np.where(
+                better, link_exposures[name].sum() + tree.get_path_sums(tree_exposures[name]), exposures[name])
+
+    nodes = np.flatnonzero(costs <= max_cost)
+    xs, ys = geom_utils.project_coords(
+        *zip(*[(geom.x, geom.y) for geom in G.graph.vs[nodes.tolist()][N.geometry.value]]) if len(nodes) else ([], []),
+        geom_epsg=3879, to_epsg=4326)
+    to_value = lambda value, digits: None if np.isnan(value) else round(float(value), digits)
+    node_features = [
+        {
+            'type': 'Feature',
+            'properties': {
+                'node': int(node),
+                'cost': round(float(costs[node]), 2),
+                'length': to_value(exposures['length'][node], 2),
+                'nei': to_value(exposures['nei'][node], 1),
+                'aqc': to_value(exposures['aqc'][node], 2),
+                'gvi_m': to_value(exposures['gvi_l'][node] / exposures['length'][node], 2)
+                    if exposures['length'][node] else None
+            },
+            'geometry': { 'coordinates': [round(x, 6), round(y, 6)], 'type': 'Point' }
+        }
+        for node, x, y in zip(nodes, xs, ys)
+    ]
+
+    # the edges from the reached nodes (and from the origin) with the reached shares of the edges
+    sources, _ = G.get_csr_graph().get_edges()
+    edge_ids = np.flatnonzero(costs[sources] < max_cost)
+    edge_costs = costs[sources[edge_ids]]
+    weights = G.get_edge_array(weight, overlay.aqi_generation)[edge_ids]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = np.where(weights > 0, np.minimum((max_cost - edge_costs) / weights, 1.0), 1.0)
+    traversable = ~np.isnan(weights)
+    edges = list(zip(
+        G.graph.es[edge_ids[traversable].tolist()][E.geom_wgs.value] if traversable.any() else [],
+        edge_costs[traversable], shares[traversable]
+    ))
+    if overlay.is_virtual_node(orig_node):
+        edges = [
+            (overlay.edges[edge_id][E.geom_wgs.value], 0.0, min(max_cost / overlay.edges[edge_id][weight], 1.0)
+                if overlay.edges[edge_id][weight] > 0 else 1.0)
+            for edge_id in overlay.get_out_edges(orig_node)
+        ] + edges
+    edge_features = [
+        get_line_feature(get_reached_line(geom, share), { 'cost': round(float(cost), 2), 'share': round(float(share), 3) })
+        for geom, cost, share in edges
+        if isinstance(geom, LineString)
+    ]
+    log.duration(start_time, f'collected {len(node_features)} nodes & {len(edge_features)} edges', unit='ms', log_level='info')
+
+    return {
+        'edge_FC': { 'type': 'FeatureCollection', 'features': edge_features },
+        'node_FC': { 'type': 'FeatureCollection', 'features': node_features }
+    }
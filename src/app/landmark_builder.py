@@ -0,0 +1,34 @@
+"""
+This module selects the landmarks of a graph and builds the landmark (ALT) tables of the static cost families
+(length, noise & GVI costs by travel mode) for the A* searches (see app/landmarks.py), and saves them next to
+the graph file. The tables are loaded by GraphHandler at startup if the routing engine uses them (astar) and
+they match the graph. The tables of AQ costs are built at runtime after each AQI update.
+
+The tables depend on the enabled features and sensitivities in env.py, hence they must be rebuilt if the
+configuration or the graph changes. Each landmark adds two distances per node to each table.
+
+This script is intended to be run from the root of the project (src/) with the command:
+python -m app.landmark_builder graphs/hma.graphml [landmark count]
+
+"""
+
+import sys
+import time
+from app.logger import Logger
+from app.graph_handler import GraphHandler
+from app.landmarks import get_landmarks_dir
+
+
+def build_landmarks(log: Logger, graph_file: str, landmark_count: int) -> None:
+    start_time = time.time()
+    G = GraphHandler(log, graph_file)
+    landmarks_dir = get_landmarks_dir(graph_file)
+    G.export_landmark_tables(landmarks_dir, landmark_count)
+    log.info(f'Built landmark tables of {graph_file} to {landmarks_dir} in {round(time.time() - start_time, 1)} s')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        print('Usage: python -m app.landmark_builder <graph.graphml or graph bundle dir> [landmark count]')
+        sys.exit(1)
+    build_landmarks(Logger(b_printing=True), sys.argv[1], int(sys.argv[2]) if len(sys.argv) == 3 else 8)
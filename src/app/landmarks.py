@@ -0,0 +1,231 @@
+"""
+This module provides landmark (ALT) lower bounds of the least cost path costs for the A* searches of the
+routing engine (see app/routing_engines.py).
+
+A set of landmarks is selected across the graph (farthest first by edge length) and the distances from and
+to all landmarks are calculated for the base weights of each cost family of a travel mode: length and the
+exposure (noise, AQ & GVI) costs per unit of sensitivity. By the triangle inequality, the distances give a
+lower bound of the cost between any two nodes by the base weights. The lower bound of a cost attribute is a
+sum of the lower bounds of the base weights multiplied with coefficients that keep the combined base
+weights at most the costs of all edges. Hence the bounds are admissible and consistent for any costs
+(e.g. rounded costs of any sensitivity), they are just tighter if the costs resemble the base weights.
+
+The tables of the static cost families (length, noise & GVI) are built offline (see app/landmark_builder.py)
+and saved next to the graph file. The tables of AQ costs are built in the background after each AQI update.
+
+"""
+
+import os
+import json
+from operator import sub
+from typing import Callable, Dict, List, Tuple, Union
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra, connected_components
+from app.csr_graph import CsrGraph
+
+
+landmarks_format = 'green-paths-landmarks'
+manifest_file = 'manifest.json'
+# the number of edges used in searching the coefficients of landmark bounds
+search_sample_size = 20000
+
+
+def get_landmarks_dir(graph_file: str) -> str:
+    """Returns the path of the landmark tables of a graph (GraphML file or graph bundle), e.g.
+    graphs/hma.graphml -> graphs/hma.landmarks
+    """
+    return os.path.splitext(graph_file.rstrip('/'))[0] + '.landmarks'
+
+
+def get_base_weight_matrix(csr_graph: CsrGraph, base_weights: np.ndarray, reverse: bool = False) -> csr_matrix:
+    """Returns the base weights as a weight matrix for calculating landmark distances. Missing base weights
+    (NaN) are zero, since the distances must not exceed the costs of any traversable edge.
+    """
+    indptr, indices, edge_ids = csr_graph.get_adjacency(reverse)
+    csr_weights = np.nan_to_num(np.asarray(base_weights, dtype=np.float64)[edge_ids], nan=0.0)
+    return csr_matrix((csr_weights, indices, indptr), shape=(csr_graph.vcount, csr_graph.vcount))
+
+
+def select_landmarks(csr_graph: CsrGraph, lengths: np.ndarray, count: int) -> np.ndarray:
+    """Selects landmarks from the largest (weakly) connected component of the graph: the first landmark is
+    the farthest node from the center of the component and each next one is the farthest node from the
+    selected landmarks (by edge length, in either direction).
+    """
+    weight_matrix = get_base_weight_matrix(csr_graph, lengths)
+    _, component_labels = connected_components(weight_matrix, directed=True, connection='weak')
+    in_component = component_labels == np.bincount(component_labels).argmax()
+    component_nodes = np.flatnonzero(in_component)
+    undirected_matrix = weight_matrix.maximum(weight_matrix.T).tocsr()
+
+    def get_farthest_node(from_nodes: List[int]) -> int:
+        dists = dijkstra(undirected_matrix, directed=False, indices=from_nodes, min_only=True)
+        return int(component_nodes[np.argmax(np.where(np.isinf(dists[component_nodes]), -1, dists[component_nodes]))])
+
+    landmarks = [get_farthest_node([int(component_nodes[0])])]
+    while len(landmarks) < min(count, len(component_nodes)):
+        landmarks.append(get_farthest_node(landmarks))
+    return np.array(landmarks, dtype=np.int64)
+
+
+class LandmarkTable:
+    """Distances from the landmarks to all nodes and from all nodes to the landmarks by one base weight, as
+    arrays of nodes x landmarks. Infinite distances (of unreachable nodes) are replaced with the largest
+    distance of the table, which keeps the triangle inequality over all edges (and the bounds consistent).
+    """
+
+    def __init__(self, dists_from: np.ndarray, dists_to: np.ndarray, weights_hash: str):
+        self.dists_from = dists_from
+        self.dists_to = dists_to
+        self.weights_hash = weights_hash
+
+    @classmethod
+    def build(
+        cls,
+        csr_graph: CsrGraph,
+        base_weights: np.ndarray,
+        landmarks: np.ndarray,
+        weights_hash: str
+    ) -> 'LandmarkTable':
+        dists = []
+        for reverse in (False, True):
+            weight_matrix = get_base_weight_matrix(csr_graph, base_weights, reverse)
+            landmark_dists = dijkstra(weight_matrix, directed=True, indices=landmarks).T
+            is_inf = np.isinf(landmark_dists)
+            landmark_dists[is_inf] = landmark_dists[~is_inf].max(initial=0.0)
+            dists.append(np.ascontiguousarray(landmark_dists))
+        return cls(dists[0], dists[1], weights_hash)
+
+    def get_lower_bounds_from(self, node: int) -> np.ndarray:
+        """Returns the lower bounds of the distances from the node to all nodes (as an array by node).
+        """
+        return np.maximum(
+            (self.dists_from - self.dists_from[node]).max(axis=1, initial=0.0),
+            (self.dists_to[node] - self.dists_to).max(axis=1, initial=0.0))
+
+    def get_lower_bounds_to(self, node: int) -> np.ndarray:
+        """Returns the lower bounds of the distances from all nodes to the node (as an array by node).
+        """
+        return np.maximum(
+            (self.dists_from[node] - self.dists_from).max(axis=1, initial=0.0),
+            (self.dists_to - self.dists_to[node]).max(axis=1, initial=0.0))
+
+
+class LandmarkBounds:
+    """Lower bounds of the least cost path costs by an edge weight, as a sum of the bounds of landmark tables
+    multiplied with coefficients (see get_landmark_bounds()).
+    """
+
+    def __init__(self, weighted_tables: List[Tuple[float, LandmarkTable]]):
+        self.weighted_tables = weighted_tables
+
+    def get_lower_bounds(self, orig: int, dest: int) -> Callable[[int], Tuple[float, float]]:
+        """Returns a function that returns the lower bounds of the costs from a node to the destination and
+        from the origin to the node.
+        """
+        tables = [
+            (coef, table.dists_from, table.dists_to, table.dists_from[orig].tolist(), table.dists_to[orig].tolist(),
+                table.dists_from[dest].tolist(), table.dists_to[dest].tolist())
+            for coef, table in self.weighted_tables
+        ]
+
+        def get_node_lower_bounds(node: int) -> Tuple[float, float]:
+            # (a few landmarks are faster to process as lists than as arrays)
+            to_dest, from_orig = 0.0, 0.0
+            for coef, dists_from, dists_to, from_orig_dists, to_orig_dists, from_dest_dists, to_dest_dists in tables:
+                from_node_dists, to_node_dists = dists_from[node].tolist(), dists_to[node].tolist()
+                to_dest += coef * max(
+                    0.0, max(map(sub, from_dest_dists, from_node_dists)), max(map(sub, to_node_dists, to_dest_dists)))
+                from_orig += coef * max(
+                    0.0, max(map(sub, from_node_dists, from_orig_dists)), max(map(sub, to_orig_dists, to_node_dists)))
+            return to_dest, from_orig
+
+        return get_node_lower_bounds
+
+
+def get_landmark_bounds(
+    weights: np.ndarray,
+    length_table: Tuple[np.ndarray, LandmarkTable],
+    exposure_table: Union[Tuple[np.ndarray, LandmarkTable], None] = None
+) -> LandmarkBounds:
+    """Returns the lower bounds of the costs by the edge weights from the landmark tables of length and 
+    exposure (optional) base weights. The coefficients of the base weights are chosen so that the combined 
+    base weights never exceed the weights of any traversable edge and their sum over all edges is as large
+    as possible. The exposure coefficient is the largest that fits for a length coefficient, hence the 
+    sum is concave by the length coefficient and its maximum is searched by ternary search.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    traversable = ~np.isnan(weights)
+    weights = weights[traversable]
+    lengths = np.nan_to_num(np.asarray(length_table[0], dtype=np.float64)[traversable], nan=0.0)
+    has_length = lengths > 0
+    max_length_coef = max(float((weights[has_length] / lengths[has_length]).min()), 0.0) if has_length.any() else 0.0
+    if exposure_table is None:
+        return LandmarkBounds([(max_length_coef, length_table[1])] if max_length_coef > 0 else [])
+
+    exposures = np.nan_to_num(np.asarray(exposure_table[0], dtype=np.float64)[traversable], nan=0.0)
+    has_exposure = exposures > 0
+    if not has_exposure.any():
+        return get_landmark_bounds(weights, (lengths, length_table[1]))
+    # the largest exposure coefficient that fits an edge is linear by the length coefficient
+    weight_ratios = weights[has_exposure] / exposures[has_exposure]
+    length_ratios = lengths[has_exposure] / exposures[has_exposure]
+
+    def get_exposure_coef(length_coef: float, step: int = 1) -> float:
+        return max(float((weight_ratios[::step] - length_coef * length_ratios[::step]).min()), 0.0)
+
+    # the length coefficient is searched with a sample of the edges (the exposure coefficient of the found
+    # length coefficient fits all edges)
+    sample_step = max(len(weight_ratios) // search_sample_size, 1)
+    length_sum, exposure_sum = float(lengths.sum()), float(exposures.sum())
+    get_bound_sum = lambda length_coef: (
+        length_coef * length_sum + get_exposure_coef(length_coef, sample_step) * exposure_sum)
+    low, high = 0.0, max_length_coef
+    for _ in range(30):
+        mid_low, mid_high = low + (high - low) / 3, high - (high - low) / 3
+        if get_bound_sum(mid_low) < get_bound_sum(mid_high):
+            low = mid_low
+        else:
+            high = mid_high
+    # the maximum may be at either end of the range
+    length_coef = max((max_length_coef, 0.0, low), key=get_bound_sum)
+    exposure_coef = get_exposure_coef(length_coef)
+    return LandmarkBounds([
+        (coef, table) for coef, (_, table) in ((length_coef, length_table), (exposure_coef, exposure_table)) if coef > 0
+    ])
+
+
+def save_landmark_tables(landmarks_dir: str, landmarks: np.ndarray, tables: Dict[str, LandmarkTable], metadata: dict) -> None:
+    """Saves the landmark tables (by cost family) to a directory of NumPy files and a manifest.
+    """
+    os.makedirs(landmarks_dir, exist_ok=True)
+    np.save(os.path.join(landmarks_dir, 'landmarks.npy'), landmarks)
+    for family, table in tables.items():
+        np.save(os.path.join(landmarks_dir, f'{family}.from.npy'), table.dists_from)
+        np.save(os.path.join(landmarks_dir, f'{family}.to.npy'), table.dists_to)
+    manifest = {
+        'format': landmarks_format,
+        'metadata': metadata,
+        'families': { family: table.weights_hash for family, table in tables.items() }
+    }
+    with open(os.path.join(landmarks_dir, manifest_file), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_landmark_tables(landmarks_dir: str, mmap_mode: str = 'r') -> Tuple[np.ndarray, Dict[str, LandmarkTable], dict]:
+    """Loads the landmarks, landmark tables (by cost family) and metadata from a directory. The distance
+    arrays are read-only memory-mapped by default, i.e. shared by all processes that load them.
+    """
+    with open(os.path.join(landmarks_dir, manifest_file), 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != landmarks_format:
+        raise ValueError(f'Not a landmarks directory: {landmarks_dir}')
+    tables = {
+        family: LandmarkTable(
+            np.load(os.path.join(landmarks_dir, f'{family}.from.npy'), mmap_mode=mmap_mode, allow_pickle=False),
+            np.load(os.path.join(landmarks_dir, f'{family}.to.npy'), mmap_mode=mmap_mode, allow_pickle=False),
+            weights_hash
+        )
+        for family, weights_hash in manifest['families'].items()
+    }
+    return np.load(os.path.join(landmarks_dir, 'landmarks.npy'), allow_pickle=False), tables, manifest['metadata']
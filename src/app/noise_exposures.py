@@ -7,8 +7,11 @@ between paths.
 
 from typing import List, Dict, Union
 from collections import defaultdict
+from itertools import chain
+import numpy as np
 from shapely.geometry import LineString
 from utils.igraph import Edge as E
+from utils.arrays import round_exact
 from app.constants import cost_prefix_dict, TravelMode, RoutingMode
 import env
 
@@ -177,6 +180,60 @@ def get_noise_adjusted_edge_cost(
     return round(base_cost + noise_cost, 2) 
 
 
+def get_noise_cost_matrix(noises_list: List[Union[dict, None]], db_costs: Dict[int, float]) -> np.ndarray:
+    """Returns the base noise costs (dB cost coefficient * contaminated distance) of the noise exposures of all 
+    edges as a dense matrix of edges x dB bins. The bins of each row are in the order of the noise exposures
+    of the edge (noises) and the rows are padded with zeros. Rows of edges without noise exposures (None or {}) 
+    are zeros.
+    """
+    sizes = np.array([len(noises) if noises else 0 for noises in noises_list], dtype=np.int64)
+    exp_count = int(sizes.sum())
+    dbs = np.fromiter(
+        chain.from_iterable(noises.keys() for noises in noises_list if noises), dtype=np.int64, count=exp_count)
+    exps = np.fromiter(
+        chain.from_iterable(noises.values() for noises in noises_list if noises), dtype=np.float64, count=exp_count)
+
+    unique_dbs, db_idxs = np.unique(dbs, return_inverse=True)
+    db_cost_vec = np.array([db_costs[db] for db in unique_dbs.tolist()], dtype=np.float64)
+
+    rows = np.repeat(np.arange(len(noises_list)), sizes)
+    offsets = np.cumsum(sizes) - sizes
+    bins = np.arange(exp_count) - np.repeat(offsets, sizes)
+
+    noise_cost_matrix = np.zeros((len(noises_list), int(sizes.max(initial=0))), dtype=np.float64)
+    noise_cost_matrix[rows, bins] = db_cost_vec[db_idxs.reshape(-1)] * exps
+    return noise_cost_matrix
+
+
+def get_noise_costs(noise_cost_matrix: np.ndarray, sen: float = 1) -> np.ndarray:
+    """Returns the total noise costs of all edges as an array (see get_noise_cost()). The dB bins are summed in 
+    the order of the noise exposures of the edges, so that the rounded costs are identical to get_noise_cost().
+    """
+    noise_costs = np.zeros(len(noise_cost_matrix), dtype=np.float64)
+    for col in range(noise_cost_matrix.shape[1]):
+        noise_costs += noise_cost_matrix[:, col] * sen
+    return round_exact(noise_costs, 2)
+
+
+def get_noise_adjusted_edge_costs(
+    sensitivity: float,
+    noise_cost_matrix: np.ndarray,
+    has_noises: np.ndarray,
+    lengths: np.ndarray,
+    biking_lengths: Union[np.ndarray, None] = None
+) -> np.ndarray:
+    """Returns composite edge costs of all edges as an array in the same way as get_noise_adjusted_edge_cost().
+    Edges without noise data (has_noises is False) get high noise costs. Missing biking lengths (NaN or 0) 
+    are replaced with lengths.
+    """
+    noise_costs = np.where(has_noises, get_noise_costs(noise_cost_matrix, sensitivity), 20 * lengths)
+    if biking_lengths is None:
+        base_costs = lengths
+    else:
+        base_costs = np.where(np.isnan(biking_lengths) | (biking_lengths == 0), lengths, biking_lengths)
+    return round_exact(base_costs + noise_costs, 2)
+
+
 def interpolate_link_noises(
     link_len_ratio: float, 
     link_geom: LineString, 
@@ -1,7 +1,9 @@
-from typing import List, Set, Dict, Tuple
+from typing import List, Set, Dict, Tuple, Union
 import time
 from shapely.geometry import Point, LineString
 from app.graph_handler import GraphHandler
+from app.graph_overlay import GraphOverlay
+from app.snap_cache import Snap
 from app.logger import Logger
 from utils.igraph import Edge as E, Node as N
 from app.constants import RoutingException, ErrorKeys
@@ -15,13 +17,39 @@ def __get_closest_point_on_line(line: LineString, point: Point) -> Point:
     return closest_point
 
 
-def get_nearest_node(log: Logger, G: GraphHandler, point: Point, link_edges: dict=None, long_distance: bool=False) -> Dict:
+def find_snap(G: GraphHandler, point: Point) -> Union[Snap, None]:
+    """Finds the nearest edge and node to a point and the nearest point on the nearest edge (None if either
+    is not found). The results are cached by GraphHandler.snap_cache (see app/snap_cache.py).
+    """
+    nearest_edge = G.find_nearest_edge(point)
+    nearest_node = G.find_nearest_node(point)
+    if (nearest_edge is None or nearest_node is None):
+        return None
+    return Snap(
+        edge_id = nearest_edge[E.id_ig.value],
+        edge_dist = nearest_edge['dist'],
+        edge_point = __get_closest_point_on_line(nearest_edge[E.geometry.value], point),
+        node = nearest_node,
+        node_dist = G.get_node_point_geom(nearest_node).distance(point)
+    )
+
+
+def get_nearest_node(
+    log: Logger, 
+    G: GraphHandler, 
+    overlay: GraphOverlay,
+    point: Point, 
+    link_edges: dict=None, 
+    long_distance: bool=False
+) -> Dict:
     """Finds (or creates) the nearest node to a given point. 
-    If the nearest node is further than the nearest edge to the point, a new node is created
-    on the nearest edge on the nearest point on the edge.
+    If the nearest node is further than the nearest edge to the point, a new (virtual) node is created
+    to the overlay on the nearest edge on the nearest point on the edge. The nearest edge and node are
+    looked up from the snap cache of the graph by the coordinates of the point (see app/snap_cache.py).
 
     Args:
         G: A GraphHandler instance used in routing.
+        overlay: The overlay of the routing request (for virtual nodes and the AQI generation).
         point: A location as shapely Point.
         edge_gdf: A GeoDataFrame containing edges of the graph (and line geometries).
         node_gdf: A GeoDataFrame containing nodes of the graph (and point geometries).
@@ -35,49 +63,116 @@ def get_nearest_node(log: Logger, G: GraphHandler, point: Point, link_edges: dic
         A dictionary containing the name of the new nearest node ('node'),
         offset from the given xy location in meters ('offset'),
         boolean variable 'add_links' that indicates whether the nearest node is a newly added node
-        and needs to be connected to the graph later by adding new edges to the graph,
+        and needs to be connected to the graph by adding new (virtual) edges to the overlay,
         'nearest edge' that contains the attributes of the nearest edge and
         'nearest_edge_point' which is a Shapely Point object located on the nearest point on the nearest edge.
         (The last two objects are needed for creating the linking edges for newly created nodes)
     """
-    nearest_edge = G.find_nearest_edge(point)
-    if (nearest_edge is None):
+    snap = G.snap_cache.get_snap(point, lambda snap_point: find_snap(G, snap_point))
+    if (snap is None):
         raise Exception('Nearest edge not found')
-    nearest_node: int = G.find_nearest_node(point)
+    nearest_edge = G.get_edge_attrs_by_id(snap.edge_id, overlay)
+    nearest_edge['dist'] = snap.edge_dist
+    nearest_node = snap.node
     start_time = time.time()
-    nearest_node_geom = G.get_node_point_geom(nearest_node)
-    nearest_edge_point = __get_closest_point_on_line(nearest_edge[E.geometry.value], point)
-    nearest_node_vs_edge_dist = nearest_node_geom.distance(point) - nearest_edge['dist']
+    nearest_edge_point = snap.edge_point
+    nearest_node_vs_edge_dist = snap.node_dist - snap.edge_dist
 
     # use the nearest node if it is on the nearest edge and at least almost as near as the nearest edge
     # this can give a significant performance boost since adding (and deleting) linking edges to the graph is avoided 
     if (not link_edges): # check only if new node was not created for origin (no need to try to avoid creating new node for destination)
         acceptable_od_offset = 25 if not long_distance else 35
         if (nearest_node_vs_edge_dist < acceptable_od_offset and nearest_node in nearest_edge[E.uv.value]):
-            return { 'node': nearest_node, 'offset': round(nearest_node_geom.distance(point), 1), 'add_links': False }
+            return { 'node': nearest_node, 'offset': round(snap.node_dist, 1), 'add_links': False }
     if (nearest_node_vs_edge_dist < 10):
-        return { 'node': nearest_node, 'offset': round(nearest_node_geom.distance(point), 1), 'add_links': False }
+        return { 'node': nearest_node, 'offset': round(snap.node_dist, 1), 'add_links': False }
     # check if the nearest edge of the destination is one of the linking edges created for origin 
     if link_edges:
         if (nearest_edge_point.distance(link_edges['link1'][E.geometry.value]) < 0.2):
             nearest_edge = link_edges['link1']
         if (nearest_edge_point.distance(link_edges['link2'][E.geometry.value]) < 0.2):
             nearest_edge = link_edges['link2']
-    # create a new node on the nearest edge to the graph
-    new_node = G.add_new_node_to_graph(nearest_edge_point)
-    # new edges from the new node to existing nodes need to be created to the graph
+    # create a new (virtual) node on the nearest edge
+    new_node = overlay.add_node(nearest_edge_point)
+    # new edges from the new node to existing nodes need to be created to the overlay
     # hence return the geometry of the nearest edge and the nearest point on the nearest edge
     links_to = { 'nearest_edge': nearest_edge, 'nearest_edge_point': nearest_edge_point }
     log.duration(start_time, 'got geoms for adding node & links', unit='ms')
     return { 'node': new_node, 'offset': round(nearest_edge_point.distance(point), 1), 'add_links': True, **links_to }
 
 
-def get_orig_dest_nodes_and_linking_edges(log: Logger, G: GraphHandler, orig_point: Point, dest_point: Point, aq_sens: List[float], noise_sens: List[float], db_costs: Dict[int,float]):
+def get_orig_node_and_linking_edges(
+    log: Logger, 
+    G: GraphHandler, 
+    overlay: GraphOverlay,
+    orig_point: Point, 
+    aq_sens: List[float], 
+    noise_sens: List[float], 
+    db_costs: Dict[int,float],
+    long_distance: bool = False
+) -> Tuple[dict, Union[dict, None]]:
+    """Finds the nearest node to the origin and the newly created edges that connect the origin node to the 
+    graph (or None if the nearest node is an existing node). New nodes and edges are only added to the overlay.
+
+    Raises:
+        RoutingException (ORIGIN_NOT_FOUND) if the origin could not be linked to the graph.
+    """
+    try:
+        orig_node = get_nearest_node(log, G, overlay, orig_point, long_distance=long_distance)
+        # add linking edges to graph if new node was created on the nearest edge
+        if (orig_node and orig_node['add_links']):
+            return orig_node, G.create_linking_edges_for_new_node(
+                overlay, orig_node['node'], orig_node['nearest_edge_point'], orig_node['nearest_edge'], aq_sens, noise_sens, db_costs, True)
+        return orig_node, None
+    except Exception:
+        raise RoutingException(ErrorKeys.ORIGIN_NOT_FOUND.value)
+
+
+def get_dest_node_and_linking_edges(
+    log: Logger, 
+    G: GraphHandler, 
+    overlay: GraphOverlay,
+    dest_point: Point, 
+    orig_link_edges: Union[dict, None],
+    aq_sens: List[float], 
+    noise_sens: List[float], 
+    db_costs: Dict[int,float],
+    long_distance: bool = False
+) -> Tuple[dict, Union[dict, None]]:
+    """Finds the nearest node to the destination and the newly created edges that connect the destination node 
+    to the graph (or None if the nearest node is an existing node). New nodes and edges are only added to the 
+    overlay. Several destinations can be added to the same overlay (e.g. for an OD matrix from one origin).
+
+    Raises:
+        RoutingException (DESTINATION_NOT_FOUND) if the destination could not be linked to the graph.
+    """
+    try:
+        dest_node = get_nearest_node(log, G, overlay, dest_point, link_edges=orig_link_edges, long_distance=long_distance)
+        # add linking edges to graph if new node was created on the nearest edge
+        if (dest_node and dest_node['add_links']):
+            return dest_node, G.create_linking_edges_for_new_node(
+                overlay, dest_node['node'], dest_node['nearest_edge_point'], dest_node['nearest_edge'], aq_sens, noise_sens, db_costs, False)
+        return dest_node, None
+    except Exception:
+        raise RoutingException(ErrorKeys.DESTINATION_NOT_FOUND.value)
+
+
+def get_orig_dest_nodes_and_linking_edges(
+    log: Logger, 
+    G: GraphHandler, 
+    overlay: GraphOverlay,
+    orig_point: Point, 
+    dest_point: Point, 
+    aq_sens: List[float], 
+    noise_sens: List[float], 
+    db_costs: Dict[int,float]
+):
     """Finds the nearest nodes to origin and destination as well as the newly created edges that connect 
-    the origin and destination nodes to the graph.
+    the origin and destination nodes to the graph. New nodes and edges are only added to the overlay.
 
     Args:
         G: A GraphHandler instance used in routing.
+        overlay: The overlay of the routing request.
         orig_point: An origin location as shapely Point.
         dest_point: A destination location shapely Point.
         edge_gdf: A GeoDataFrame containing edges of the graph (and line geometries).
@@ -91,27 +186,9 @@ def get_orig_dest_nodes_and_linking_edges(log: Logger, G: GraphHandler, orig_poi
         dest_link_edges: The newly created edges (dict) that link the destination node to the graph.
         If some of these are not found, None is returned respectively.
     """
-    orig_link_edges = None
-    dest_link_edges = None
     long_distance: bool = orig_point.distance(dest_point) > 5000
-
-    try:
-        orig_node = get_nearest_node(log, G, orig_point, long_distance=long_distance)
-        # add linking edges to graph if new node was created on the nearest edge
-        if (orig_node and orig_node['add_links']):
-            orig_link_edges = G.create_linking_edges_for_new_node(
-                orig_node['node'], orig_node['nearest_edge_point'], orig_node['nearest_edge'], aq_sens, noise_sens, db_costs, True)
-    except Exception:
-        raise RoutingException(ErrorKeys.ORIGIN_NOT_FOUND.value)
-    try:
-        dest_node = get_nearest_node(log, G, dest_point, link_edges=orig_link_edges, long_distance=long_distance)
-        # add linking edges to graph if new node was created on the nearest edge
-        if (dest_node and dest_node['add_links']):
-            dest_link_edges = G.create_linking_edges_for_new_node(
-                dest_node['node'], dest_node['nearest_edge_point'], dest_node['nearest_edge'], aq_sens, noise_sens, db_costs, False)
-    except Exception:
-        raise RoutingException(ErrorKeys.DESTINATION_NOT_FOUND.value)
-
-    G.load_new_edges_to_graph()
-
+    orig_node, orig_link_edges = get_orig_node_and_linking_edges(
+        log, G, overlay, orig_point, aq_sens, noise_sens, db_costs, long_distance=long_distance)
+    dest_node, dest_link_edges = get_dest_node_and_linking_edges(
+        log, G, overlay, dest_point, orig_link_edges, aq_sens, noise_sens, db_costs, long_distance=long_distance)
     return orig_node, dest_node, orig_link_edges, dest_link_edges
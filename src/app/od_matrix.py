@@ -0,0 +1,146 @@
+"""
+This module provides OD matrices from one origin to many destinations: the length and the exposures (noise
+exposure index nei, AQ cost aqc and mean GVI) of the shortest path and the least cost paths of all sensitivities
+of a routing mode to each destination. The paths of each cost attribute are read from one shortest path tree
+search from the origin (see GraphHandler.get_least_cost_paths_from()) and only the exposures of the paths are
+aggregated (from the path edges), i.e. no GeoJSON is built for the paths.
+
+The OD matrices can be requested from the routing API (see green_paths_app.py) or used in-process, e.g.:
+
+    G = GraphHandler(Logger(), 'graphs/kumpula.graphml')
+    od_matrix = get_od_matrix(Logger(), G, TravelMode.WALK, RoutingMode.QUIET, (60.2174, 24.9699), dest_coords)
+
+"""
+
+from typing import Dict, List, Tuple, Union
+import time
+import app.noise_exposures as noise_exps
+import app.aq_exposures as aq_exps
+import app.greenery_exposures as gvi_exps
+import app.od_handler as od_handler
+import utils.geometry as geom_utils
+from app.types import PathEdge
+from app.graph_handler import GraphHandler
+from app.sensitivity_sweep import get_sensitivities
+from app.path_finder import routing_pool
+from app.constants import RoutingException, ErrorKeys, TravelMode, RoutingMode, cost_prefix_dict
+from app.logger import Logger
+from utils.igraph import Edge as E
+
+
+def get_path_aqc(edges: List[PathEdge]) -> Union[float, None]:
+    """Returns the AQ cost of a path, or None if some edges lack AQI or have invalid AQI (as in isochrones).
+    """
+    if not edges or None in [edge.aqi for edge in edges]:
+        return None
+    try:
+        return round(aq_exps.get_total_aqi_cost_from_exps([(edge.aqi, edge.length) for edge in edges]), 2)
+    except aq_exps.InvalidAqiException:
+        return None
+
+
+def get_path_exposures(edges: List[PathEdge], db_costs: Dict[int, float]) -> dict:
+    """Returns the length and the exposures of a path by the edges of the path in the same way as the path
+    attributes of the routing API are aggregated (see app.path.Path), i.e. nei as in PathNoiseAttrs, aqc as in
+    PathAqiAttrs and gvi_m as in PathGviAttrs. Exposures are None if some edges lack the exposure data (or
+    have invalid AQI).
+    """
+    length = round(sum(edge.length for edge in edges), 2)
+    missing_noises = None in [edge.noises for edge in edges]
+    missing_gvi = None in [edge.gvi for edge in edges]
+    noises = noise_exps.aggregate_exposures([edge.noises for edge in edges]) if not missing_noises else None
+    return {
+        'length': length,
+        'nei': round(noise_exps.get_noise_cost(noises, db_costs), 1) if not missing_noises else None,
+        'aqc': get_path_aqc(edges),
+        'gvi_m': gvi_exps.get_mean_gvi([(edge.gvi, edge.length) for edge in edges]) if not missing_gvi and length else None
+    }
+
+
+def get_cost_attrs(travel_mode: TravelMode, routing_mode: RoutingMode) -> List[Tuple[str, str]]:
+    """Returns the names of the paths of an OD matrix and the cost attributes by which they are searched: the
+    shortest path (short) and the least cost paths of the sensitivities of the routing mode (e.g. c_n_0.1).
+    """
+    cost_prefix = cost_prefix_dict[travel_mode][routing_mode]
+    return [('short', E.length.value)] + [
+        (cost_prefix + str(sen), cost_prefix + str(sen)) for sen in get_sensitivities(routing_mode)
+    ]
+
+
+def get_od_matrix(
+    log: Logger,
+    G: GraphHandler,
+    travel_mode: TravelMode,
+    routing_mode: RoutingMode,
+    orig_coords: Tuple[float, float],
+    dest_coords: List[Tuple[float, float]]
+) -> List[dict]:
+    """Finds the paths from the origin to the destinations and returns the lengths and exposures of them.
+
+    Args:
+        orig_coords: The origin as (latitude, longitude).
+        dest_coords: The destinations as (latitude, longitude).
+    Returns:
+        A dictionary per destination (in the same order) of either the lengths and exposures of the paths by the
+        path names (see get_cost_attrs()) as 'paths' or the 'error_key' (ErrorKeys) of the destination. A path is
+        None if the destination is not reachable by the cost attribute.
+    Raises:
+        RoutingException if the origin is not found.
+    """
+    start_time = time.time()
+    overlay = G.create_overlay()
+    aq_sens, noise_sens = aq_exps.get_aq_sensitivities(), noise_exps.get_noise_sensitivities()
+    orig_point = geom_utils.project_geom(geom_utils.get_point_from_lat_lon({ 'lat': orig_coords[0], 'lon': orig_coords[1] }))
+    orig_node, orig_link_edges = od_handler.get_orig_node_and_linking_edges(
+        log, G, overlay, orig_point, aq_sens, noise_sens, G.db_costs)
+
+    dest_nodes: List[Union[int, None]] = []
+    errors: Dict[int, str] = {}
+    for idx, (lat, lon) in enumerate(dest_coords):
+        dest_point = geom_utils.project_geom(geom_utils.get_point_from_lat_lon({ 'lat': lat, 'lon': lon }))
+        try:
+            dest_node, _ = od_handler.get_dest_node_and_linking_edges(
+                log, G, overlay, dest_point, orig_link_edges, aq_sens, noise_sens, G.db_costs,
+                long_distance=orig_point.distance(dest_point) > 5000)
+            if dest_node['node'] == orig_node['node']:
+                raise RoutingException(ErrorKeys.OD_SAME_LOCATION.value)
+            dest_nodes.append(dest_node['node'])
+        except RoutingException as e:
+            dest_nodes.append(None)
+            errors[idx] = str(e)
+    log.duration(start_time, f'origin & {len(dest_coords)} destination nodes set', unit='ms', log_level='info')
+
+    start_time = time.time()
+    cost_attrs = get_cost_attrs(travel_mode, routing_mode)
+    routed_nodes = [node for node in dest_nodes if node is not None]
+    get_paths = lambda cost_attr: G.get_least_cost_paths_from(orig_node['node'], routed_nodes, cost_attr[1], overlay)
+    try:
+        paths_by_attr = list(routing_pool.map(get_paths, cost_attrs)) if routing_pool else [
+            get_paths(cost_attr) for cost_attr in cost_attrs]
+    except Exception:
+        raise RoutingException(ErrorKeys.PATHFINDING_ERROR.value)
+    log.duration(start_time, f'found {len(cost_attrs)} path trees', unit='ms', log_level='info')
+
+    start_time = time.time()
+    exposures_by_path: Dict[Tuple[int, ...], dict] = {}
+
+    def get_exposures(edge_ids: Union[List[int], None]) -> Union[dict, None]:
+        if edge_ids is None:
+            return None
+        path_key = tuple(edge_ids)
+        if path_key not in exposures_by_path:
+            exposures_by_path[path_key] = get_path_exposures(G.get_path_edges_by_ids(edge_ids, overlay), G.db_costs)
+        return exposures_by_path[path_key]
+
+    od_matrix = []
+    routed_paths = iter(zip(*paths_by_attr))
+    for idx, dest_node in enumerate(dest_nodes):
+        if dest_node is None:
+            od_matrix.append({ 'error_key': errors[idx] })
+            continue
+        dest_paths = next(routed_paths)
+        od_matrix.append({
+            'paths': { name: get_exposures(edge_ids) for (name, _), edge_ids in zip(cost_attrs, dest_paths) }
+        })
+    log.duration(start_time, 'aggregated path exposures', unit='ms', log_level='info')
+    return od_matrix
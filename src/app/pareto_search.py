@@ -0,0 +1,200 @@
+"""
+This module provides a bi-criteria (Pareto) search that finds all Pareto-optimal paths by base cost (length &
+penalties of missing exposure data) and exposure cost in a single search, as an alternative to the least cost
+path searches of a list of sensitivities.
+
+The search is a label-setting search (Martins' algorithm) over the CSR adjacency of the graph: labels of
+(base cost, exposure cost, length) are settled in lexicographic order of their costs plus the lower bounds of 
+the costs to the destination (by one reverse Dijkstra search per criterion). A label is pruned if
+    - it is dominated by a settled label of its node (by all three criteria),
+    - it is dominated by a found path (to the destination) even with the lower bounds (and the tolerance), or
+    - its length with the lower bound exceeds the maximum detour (relative to the shortest path length).
+The length is a criterion of the dominance of the labels of a node since it is constrained by the maximum 
+detour: a label that is dominated by base and exposure cost but is shorter may be the only one that can reach
+the destination within the maximum detour (base costs differ from lengths, e.g. by the penalties of missing 
+exposure data or the biking lengths). The paths to the destination are Pareto-optimal by base and exposure cost.
+
+Since the lower bounds are consistent, a settled label is never dominated by a later label and the base costs
+of the settled labels of a node only increase. Hence the dominance checks of a node only need the Pareto front
+of the settled labels of the node by exposure cost and length.
+
+"""
+
+import heapq
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, NamedTuple, Tuple, Union
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from app.csr_graph import CsrGraph
+
+
+class ParetoPath(NamedTuple):
+    base_cost: float
+    exposure_cost: float
+    length: float
+    edge_ids: List[int]
+
+
+# a label of a search node: (node, base cost, exposure cost, length, parent label, edge id or edge ids from the
+# parent)
+Label = Tuple[int, float, float, float, int, Union[int, List[int]]]
+
+# the node of the labels of the destination
+dest_node = -1
+
+
+def get_lower_bounds(
+    csr_graph: CsrGraph,
+    costs: np.ndarray,
+    targets: List[Tuple[int, Tuple[float, float, float], List[int]]],
+    criterion: int
+) -> np.ndarray:
+    """Returns the least costs by one criterion (0 = base cost, 1 = exposure cost, 2 = length) from all nodes
+    to the destination (via the target nodes and their link costs) by a reverse Dijkstra search.
+    """
+    indptr, indices, _ = csr_graph.get_adjacency(reverse=True)
+    weight_matrix = csr_matrix(
+        (csr_graph.get_csr_weights(costs, reverse=True), indices, indptr), shape=(csr_graph.vcount, csr_graph.vcount))
+    target_nodes = [node for node, _, _ in targets]
+    dists = dijkstra(weight_matrix, directed=True, indices=target_nodes).reshape(len(target_nodes), -1)
+    link_costs = np.array([link_cost[criterion] for _, link_cost, _ in targets], dtype=np.float64)
+    return (dists + link_costs[:, None]).min(axis=0)
+
+
+def find_pareto_paths(
+    csr_graph: CsrGraph,
+    base_costs: np.ndarray,
+    exposure_costs: np.ndarray,
+    lengths: np.ndarray,
+    sources: List[Tuple[int, Tuple[float, float, float], List[int]]],
+    targets: List[Tuple[int, Tuple[float, float, float], List[int]]],
+    max_detour_ratio: float,
+    exposure_tolerance: float = 0.0,
+    direct_paths: Union[List[ParetoPath], None] = None
+) -> List[ParetoPath]:
+    """Finds the Pareto-optimal paths by base cost and exposure cost from the source nodes to the target nodes,
+    whose length is at most max_detour_ratio times the length of the shortest path.
+
+    Args:
+        base_costs, exposure_costs: The (non-negative) costs of the edges of the graph by edge id (NaN = not
+            traversable).
+        lengths: The lengths of the edges of the graph by edge id.
+        sources: The nodes of the graph to start from, as tuples of node, (base cost, exposure cost, length) and
+            edge ids from the origin to the node (e.g. the linking edge from a virtual origin).
+        targets: The nodes of the graph to reach, as tuples of node, costs and edge ids to the destination.
+        exposure_tolerance: The least difference in exposure costs of the found paths relative to the exposure cost of
+            the first (least base cost) path, e.g. 0.05 limits the number of paths to 21. Zero finds all paths.
+        direct_paths: Paths from the origin to the destination that do not pass the graph (e.g. a virtual edge).
+    Returns:
+        The Pareto-optimal paths ordered by base cost (and by decreasing exposure cost).
+    """
+    direct_paths = direct_paths or []
+    base_bounds = get_lower_bounds(csr_graph, base_costs, targets, 0)
+    exposure_bounds = get_lower_bounds(csr_graph, exposure_costs, targets, 1)
+    # (the edges that are not traversable by the base costs are not traversable by the lengths either)
+    lengths = np.where(np.isnan(base_costs), np.nan, lengths)
+    length_bounds = get_lower_bounds(csr_graph, lengths, targets, 2)
+    least_length = min(
+        [link_costs[2] + length_bounds[node] for node, link_costs, _ in sources] + [path.length for path in direct_paths])
+    if np.isinf(least_length):
+        return []
+    # (a small tolerance for the rounding of the sums of lengths)
+    max_length = least_length * max_detour_ratio + 1e-6
+
+    indptr, indices, csr_edge_ids = csr_graph.get_adjacency()
+    indptr, indices, csr_edge_ids = indptr.tolist(), indices.tolist(), csr_edge_ids.tolist()
+    csr_base_costs = csr_graph.get_csr_weights(base_costs).tolist()
+    csr_exposure_costs = csr_graph.get_csr_weights(exposure_costs).tolist()
+    csr_lengths = csr_graph.get_csr_weights(lengths).tolist()
+    base_bounds, exposure_bounds, length_bounds = base_bounds.tolist(), exposure_bounds.tolist(), length_bounds.tolist()
+    target_links = {}
+    for node, link_costs, edge_ids in targets:
+        target_links.setdefault(node, []).append((link_costs, edge_ids))
+
+    labels: List[Label] = []
+    heap: List[Tuple[float, float, int]] = []
+    # the settled labels of the nodes as Pareto fronts of exposure costs (increasing, with the tolerance) and 
+    # lengths (decreasing)
+    fronts: Dict[int, Tuple[List[float], List[float]]] = {}
+
+    def is_dominated(node: int, exposure_cost: float, length: float) -> bool:
+        if node not in fronts:
+            return False
+        exposures, lengths = fronts[node]
+        # the least length of the settled labels of at most the exposure cost
+        idx = bisect_right(exposures, exposure_cost) - 1
+        return idx >= 0 and lengths[idx] <= length
+
+    def settle(node: int, exposure_cost: float, length: float) -> None:
+        exposures, lengths = fronts.setdefault(node, ([], []))
+        exposure_cost = exposure_cost * (1 - exposure_tolerance / 2)
+        # replace the labels of the front that the settled label dominates
+        start = end = bisect_left(exposures, exposure_cost)
+        while end < len(lengths) and lengths[end] >= length:
+            end += 1
+        exposures[start:end] = [exposure_cost]
+        lengths[start:end] = [length]
+
+    def push_label(
+        node: int,
+        base_cost: float,
+        exposure_cost: float,
+        length: float,
+        parent: int,
+        edges: Union[int, List[int]]
+    ) -> None:
+        labels.append((node, base_cost, exposure_cost, length, parent, edges))
+        if node == dest_node:
+            heapq.heappush(heap, (base_cost, exposure_cost, len(labels) - 1))
+        else:
+            heapq.heappush(heap, (base_cost + base_bounds[node], exposure_cost + exposure_bounds[node], len(labels) - 1))
+
+    for node, (base_cost, exposure_cost, length), edge_ids in sources:
+        if length + length_bounds[node] <= max_length:
+            push_label(node, base_cost, exposure_cost, length, -1, edge_ids)
+    for path in direct_paths:
+        if path.length <= max_length:
+            push_label(dest_node, path.base_cost, path.exposure_cost, path.length, -1, path.edge_ids)
+
+    paths: List[ParetoPath] = []
+    # paths need to have less exposure than this (the exposure of the last found path minus the tolerance)
+    min_dest_exposure = np.inf
+    while heap:
+        _, exposure_key, label_id = heapq.heappop(heap)
+        if exposure_key >= min_dest_exposure:
+            continue # dominated by a found path
+        node, base_cost, exposure_cost, length, _, _ = labels[label_id]
+        if node == dest_node:
+            min_dest_exposure = exposure_cost * (1 - exposure_tolerance)
+            paths.append(ParetoPath(base_cost, exposure_cost, length, get_label_edge_ids(labels, label_id)))
+            continue
+        if is_dominated(node, exposure_cost, length):
+            continue # dominated by a settled label of the node
+        settle(node, exposure_cost, length)
+        for link_costs, edge_ids in target_links.get(node, []):
+            if length + link_costs[2] <= max_length:
+                push_label(
+                    dest_node, base_cost + link_costs[0], exposure_cost + link_costs[1], length + link_costs[2],
+                    label_id, edge_ids)
+        for idx in range(indptr[node], indptr[node + 1]):
+            to_node = indices[idx]
+            to_base_cost = base_cost + csr_base_costs[idx]
+            to_exposure_cost = exposure_cost + csr_exposure_costs[idx]
+            to_length = length + csr_lengths[idx]
+            if (to_length + length_bounds[to_node] > max_length
+                    or to_exposure_cost + exposure_bounds[to_node] >= min_dest_exposure
+                    or is_dominated(to_node, to_exposure_cost, to_length)):
+                continue
+            push_label(to_node, to_base_cost, to_exposure_cost, to_length, label_id, csr_edge_ids[idx])
+    return paths
+
+
+def get_label_edge_ids(labels: List[Label], label_id: int) -> List[int]:
+    """Returns the edge ids of the path of a label (from the origin).
+    """
+    edge_ids = []
+    while label_id >= 0:
+        _, _, _, _, label_id, edges = labels[label_id]
+        edge_ids += edges[::-1] if isinstance(edges, list) else [edges]
+    return edge_ids[::-1]
@@ -4,6 +4,7 @@ import env
 import utils.geometry as geom_utils
 from app.logger import Logger
 from app.types import PathEdge
+from app.graph_overlay import GraphOverlay
 from app.path_noise_attrs import PathNoiseAttrs, create_path_noise_attrs
 from app.path_aqi_attrs import PathAqiAttrs, create_aqi_attrs
 from app.path_gvi_attrs import PathGviAttrs, create_gvi_attrs
@@ -38,10 +39,10 @@ class Path:
 
     def set_path_type(self, path_type: str): self.path_type = path_type
 
-    def set_path_edges(self, G: GraphHandler) -> None:
+    def set_path_edges(self, G: GraphHandler, overlay: GraphOverlay = None) -> None:
         """Iterates through the path's node list and loads the respective edges (& their attributes) from a graph.
         """
-        self.edges = G.get_path_edges_by_ids(self.edge_ids)
+        self.edges = G.get_path_edges_by_ids(self.edge_ids, overlay)
 
     def aggregate_path_attrs(self, log: Logger) -> None:
         """Aggregates path attributes form list of edges.
@@ -118,12 +119,9 @@ class Path:
             features.append(feature)
         return features
 
-    def get_as_geojson_feature(self) -> dict:
-        wgs_coords = [coord for edge in self.edges for coord in edge.coords_wgs]
-        wgs_coords = geom_utils.round_coordinates(wgs_coords, digits=6)
-
-        feature_d = self.__get_geojson_feature_dict(wgs_coords)
-
+    def get_props(self) -> dict:
+        """Returns the path attributes (incl. exposures) as a dictionary of property names and values.
+        """
         props = {
             'type': self.path_type.value,
             'id': self.name,
@@ -139,6 +137,18 @@ class Path:
         noise_props = self.noise_attrs.get_noise_props_dict() if self.noise_attrs else {}
         aqi_props = self.aqi_attrs.get_aqi_props_dict() if self.aqi_attrs else {}
         gvi_props = self.gvi_attrs.get_gvi_props_dict() if self.gvi_attrs else {}
+        return { 
+            **props, 
+            **noise_props, 
+            **aqi_props,
+            **gvi_props
+        }
+
+    def get_as_geojson_feature(self) -> dict:
+        wgs_coords = [coord for edge in self.edges for coord in edge.coords_wgs]
+        wgs_coords = geom_utils.round_coordinates(wgs_coords, digits=6)
+
+        feature_d = self.__get_geojson_feature_dict(wgs_coords)
 
         research_props = {
             'edge_ids': self.edge_ids,
@@ -147,10 +157,7 @@ class Path:
         } if env.research_mode else {}
 
         feature_d['properties'] = { 
-            **props, 
-            **noise_props, 
-            **aqi_props,
-            **gvi_props,
+            **self.get_props(), 
             **research_props 
         }
         return feature_d
@@ -1,6 +1,9 @@
-from typing import List, Dict
+from typing import Callable, List, Dict, Tuple, TypeVar, Union
 import time
 import json
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import env
 import app.noise_exposures as noise_exps 
 import app.aq_exposures as aq_exps 
 import app.greenery_exposures as gvi_exps 
@@ -9,28 +12,55 @@ import app.od_handler as od_handler
 from app.path import Path
 from app.path_set import PathSet
 from app.graph_handler import GraphHandler
+from app.sensitivity_sweep import find_tradeoff_paths
 from app.constants import TravelMode, RoutingMode, PathType, RoutingException, ErrorKeys, cost_prefix_dict
 from app.logger import Logger
 from utils.igraph import Edge as E
 
 
+T = TypeVar('T')
+
 sensitivities_by_routing_mode: Dict[RoutingMode, List[float]] = {
     RoutingMode.QUIET: noise_exps.get_noise_sensitivities(),
     RoutingMode.CLEAN: aq_exps.get_aq_sensitivities(),
     RoutingMode.GREEN: gvi_exps.get_gvi_sensitivities()
 }
 
+# the graph is read-only during the searches and the searches release the GIL, 
+# hence the searches of a request can be run concurrently in a thread pool of the worker
+routing_pool: Union[ThreadPoolExecutor, None] = (
+    ThreadPoolExecutor(max_workers=env.routing_threads, thread_name_prefix='routing') 
+    if env.routing_threads > 1 else None
+)
+
 class PathFinder:
     """An instance of PathFinder is responsible for orchestrating all routing related tasks from finding the 
     origin & destination nodes to returning the paths as GeoJSON feature collection.
-    
+
+    The origin & destination nodes and linking edges that are created for routing exist only in the overlay
+    of the instance (the graph is not modified). The latest AQI generation of the graph is pinned to the overlay
+    when the instance is created and used for the whole lifetime of the instance, so that AQI updates during 
+    routing do not mix AQ costs of different AQI data.
     """
 
-    def __init__(self, logger: Logger, travel_mode: TravelMode, routing_mode: RoutingMode, G: GraphHandler, orig_lat, orig_lon, dest_lat, dest_lon):
+    def __init__(
+        self, 
+        logger: Logger, 
+        travel_mode: TravelMode, 
+        routing_mode: RoutingMode, 
+        G: GraphHandler, 
+        orig_lat, 
+        orig_lon, 
+        dest_lat, 
+        dest_lon, 
+        max_detour_ratio: float = None
+    ):
         self.log = logger
         self.travel_mode = travel_mode
         self.routing_mode = routing_mode
+        self.max_detour_ratio = max_detour_ratio or env.max_detour_ratio
         self.G = G
+        self.overlay = G.create_overlay()
         orig_latLon = {'lat': float(orig_lat), 'lon': float(orig_lon)}
         dest_latLon = {'lat': float(dest_lat), 'lon': float(dest_lon)}
         self.orig_point = geom_utils.project_geom(geom_utils.get_point_from_lat_lon(orig_latLon))
@@ -53,7 +83,8 @@ class PathFinder:
         start_time = time.time()
         try:
             orig_node, dest_node, orig_link_edges, dest_link_edges = od_handler.get_orig_dest_nodes_and_linking_edges(
-                self.log, self.G, self.orig_point, self.dest_point, self.aq_sens, self.noise_sens, self.G.db_costs)
+                self.log, self.G, self.overlay, self.orig_point, self.dest_point, self.aq_sens, self.noise_sens, 
+                self.G.db_costs)
             self.orig_node = orig_node
             self.dest_node = dest_node
             self.orig_link_edges = orig_link_edges
@@ -70,24 +101,44 @@ class PathFinder:
             raise RoutingException(ErrorKeys.OD_SAME_LOCATION.value)
 
     def find_least_cost_paths(self):
-        """Finds both shortest and least cost paths. 
+        """Finds both shortest and least cost paths. The searches are run concurrently in the routing 
+        thread pool (if enabled). With the sensitivity sweep (env.sensitivity_sweep), the least cost paths are
+        the distinct paths between the lowest and the highest sensitivity (instead of the paths of each sensitivity).
+        With the Pareto search (env.pareto_search), they are the Pareto-optimal paths by length and exposure.
+
+        If the maximum detour ratio is set, the green paths are searched after the shortest path in the area
+        through which paths of at most the maximum detour can pass (and longer paths are left out).
 
         Raises:
             Only meaningful exception strings that can be shown in UI.
         """
         sens = sensitivities_by_routing_mode[self.routing_mode]
         cost_prefix = cost_prefix_dict[self.travel_mode][self.routing_mode]
+        cost_attrs = [cost_prefix + str(sen) for sen in sens]
         try:
             start_time = time.time()
-            shortest_path = self.G.get_least_cost_path(self.orig_node['node'], self.dest_node['node'], weight=E.length.value)
+            if env.pareto_search:
+                shortest_path, green_paths = self.__get_with_shortest_path(lambda: self.__get_pareto_paths(cost_prefix))
+            else:
+                find_green_paths = (
+                    (lambda search_area: self.__get_sweep_paths(cost_prefix, search_area)) if env.sensitivity_sweep
+                    else (lambda search_area: list(zip(sens, cost_attrs, self.__get_least_cost_paths(cost_attrs, search_area))))
+                )
+                if self.max_detour_ratio:
+                    shortest_path = self.__get_least_cost_paths([E.length.value])[0]
+                    max_length = self.max_detour_ratio * self.G.get_path_length(shortest_path, self.overlay)
+                    green_paths = [
+                        green_path for green_path in find_green_paths(self.__get_search_area(max_length))
+                        if self.G.get_path_length(green_path[2], self.overlay) <= max_length
+                    ]
+                else:
+                    shortest_path, green_paths = self.__get_with_shortest_path(lambda: find_green_paths(None))
             self.path_set.set_shortest_path(Path(
                 orig_node=self.orig_node['node'],
                 edge_ids=shortest_path,
                 name='short',
                 path_type=PathType.SHORT))
-            for sen in sens:
-                cost_attr = cost_prefix + str(sen)
-                least_cost_path = self.G.get_least_cost_path(self.orig_node['node'], self.dest_node['node'], weight=cost_attr)
+            for sen, cost_attr, least_cost_path in green_paths:
                 self.path_set.add_green_path(Path(
                     orig_node=self.orig_node['node'],
                     edge_ids=least_cost_path,
@@ -102,27 +153,113 @@ class PathFinder:
         except Exception as e:
             raise RoutingException(ErrorKeys.PATHFINDING_ERROR.value)
 
-    def process_paths_to_FC(self) -> dict:
+    def __get_least_cost_paths(self, weights: List[str], search_area: np.ndarray = None) -> List[List[int]]:
+        """Returns the least cost paths by the given edge weights (in the same order).
+        """
+        def get_least_cost_path(weight: str) -> List[int]:
+            return self.G.get_least_cost_path(
+                self.orig_node['node'], self.dest_node['node'], weight=weight, overlay=self.overlay, 
+                search_area=search_area)
+
+        if routing_pool:
+            return list(routing_pool.map(get_least_cost_path, weights))
+        return [get_least_cost_path(weight) for weight in weights]
+
+    def __get_search_area(self, max_length: float) -> np.ndarray:
+        """Returns the search area of the green paths of at most the maximum length.
+        """
+        start_time = time.time()
+        search_area = self.G.get_search_area(self.orig_node['node'], self.dest_node['node'], max_length, self.overlay)
+        self.log.duration(start_time, f'search area of {int(search_area.sum())} nodes set', unit='ms')
+        return search_area
+
+    def __get_with_shortest_path(self, get_green_paths: Callable[[], T]) -> Tuple[List[int], T]:
+        """Returns the shortest path and the green paths (by the given function). The shortest path is searched 
+        concurrently with the green paths (if the routing thread pool is enabled).
+        """
+        get_shortest_path = lambda: self.G.get_least_cost_path(
+            self.orig_node['node'], self.dest_node['node'], weight=E.length.value, overlay=self.overlay)
+        shortest_path = routing_pool.submit(get_shortest_path) if routing_pool else None
+        green_paths = get_green_paths()
+        return shortest_path.result() if shortest_path else get_shortest_path(), green_paths
+
+    def __get_sweep_paths(self, cost_prefix: str, search_area: np.ndarray = None) -> List[Tuple[float, str, List[int]]]:
+        """Returns the distinct least cost paths found by the sensitivity sweep as tuples of sensitivity, path name 
+        and path.
+        """
+        costs = self.G.get_parametric_costs(self.travel_mode, self.routing_mode, self.overlay)
+
+        def get_least_cost_path(sen: float) -> List[int]:
+            return self.G.get_parametric_least_cost_path(
+                self.orig_node['node'], self.dest_node['node'], costs, sen, overlay=self.overlay, 
+                search_area=search_area)
+
+        def find_paths(sens: List[float]) -> List[List[int]]:
+            if routing_pool:
+                return list(routing_pool.map(get_least_cost_path, sens))
+            return [get_least_cost_path(sen) for sen in sens]
+
+        sweep_paths = find_tradeoff_paths(find_paths, costs.get_path_costs, costs.min_sen[0], costs.max_sen[0])
+        self.log.debug(f'Found {len(sweep_paths)} distinct paths with sensitivity sweep')
+        return [(round(path.sen, 3), cost_prefix + str(round(path.sen, 3)), path.edge_ids) for path in sweep_paths]
+
+    def __get_pareto_paths(self, cost_prefix: str) -> List[Tuple[float, str, List[int]]]:
+        """Returns the Pareto-optimal paths by length (base cost) and exposure as tuples of cost coefficient, path
+        name and path. The cost coefficient of a path is the sensitivity above which it is cheaper than the 
+        previous (shorter) path and the paths are named by it as in the other routing modes. As the paths that are
+        not optimal at any sensitivity (i.e. not on the convex hull) would get a lower coefficient than the previous
+        path, the coefficients are kept increasing by the rounding step (whereby the names are also unique).
+        """
+        costs = self.G.get_parametric_costs(self.travel_mode, self.routing_mode, self.overlay)
+        pareto_paths = self.G.get_pareto_paths(
+            self.orig_node['node'], 
+            self.dest_node['node'], 
+            costs, 
+            self.max_detour_ratio or env.pareto_max_detour_ratio, 
+            env.pareto_exposure_tolerance, 
+            overlay=self.overlay)
+        self.log.debug(f'Found {len(pareto_paths)} paths with Pareto search')
+        cost_coeffs = [0.0]
+        for prev_path, path in zip(pareto_paths, pareto_paths[1:]):
+            cost_coeff = (path.base_cost - prev_path.base_cost) / (prev_path.exposure_cost - path.exposure_cost)
+            cost_coeffs.append(max(round(cost_coeff, 3), round(cost_coeffs[-1] + 0.001, 3)))
+        return [
+            (cost_coeff, cost_prefix + str(cost_coeff), path.edge_ids) 
+            for cost_coeff, path in zip(cost_coeffs, pareto_paths)
+        ]
+
+    def process_paths(self) -> None:
         """Loads & collects path attributes from the graph for all paths. Also aggregates and filters out nearly identical 
-        paths based on geometries and length. 
+        paths based on geometries and length. The processed paths are in the path set (path_set).
 
-        Returns:
-            All paths as GeoJSON FeatureCollection (as python dictionary).
         Raises:
             Only meaningful exception strings that can be shown in UI.
         """
         start_time = time.time()
         try:
             self.path_set.filter_out_unique_edge_sequence_paths()
-            self.path_set.set_path_edges(self.G)
+            self.path_set.set_path_edges(self.G, self.overlay)
             self.path_set.aggregate_path_attrs()
             self.path_set.filter_out_green_paths_missing_exp_data()
             self.path_set.set_path_exp_attrs(self.G.db_costs)
             self.path_set.filter_out_unique_geom_paths(buffer_m=50)
             self.path_set.set_green_path_diff_attrs()
             self.log.duration(start_time, 'aggregated paths', unit='ms', log_level='info')
-            
-            start_time = time.time()
+
+        except Exception:
+            raise RoutingException(ErrorKeys.PATH_PROCESSING_ERROR.value)
+
+    def process_paths_to_FC(self) -> dict:
+        """Processes the paths (see process_paths()) and returns them as GeoJSON feature collections.
+
+        Returns:
+            All paths as GeoJSON FeatureCollection (as python dictionary).
+        Raises:
+            Only meaningful exception strings that can be shown in UI.
+        """
+        self.process_paths()
+        start_time = time.time()
+        try:
             path_FC = self.path_set.get_paths_as_feature_collection()
             edge_FC = self.path_set.get_edges_as_feature_collection()
             self.log.duration(start_time, 'processed paths & edges to FC', unit='ms', log_level='info')
@@ -131,13 +268,3 @@ class PathFinder:
         
         except Exception:
             raise RoutingException(ErrorKeys.PATH_PROCESSING_ERROR.value)
-
-    def delete_added_graph_features(self):
-        """Keeps a graph clean by removing new nodes & edges created during routing from the graph.
-        """
-        self.log.debug('Deleting created nodes & edges from the graph')
-        self.G.delete_added_linking_edges(
-            orig_edges=self.orig_link_edges,
-            orig_node=self.orig_node, 
-            dest_edges=self.dest_link_edges,
-            dest_node=self.dest_node)
@@ -4,6 +4,7 @@ from app.constants import RoutingMode, PathType
 from app.logger import Logger
 from app.path import Path
 from app.types import edge_group_attr_by_routing_mode
+from app.graph_overlay import GraphOverlay
 
 
 class PathSet:
@@ -24,14 +25,14 @@ class PathSet:
 
     def get_all_paths(self) -> List[Path]: return [self.shortest_path] + self.green_paths
 
-    def set_path_edges(self, G) -> None:
+    def set_path_edges(self, G, overlay: GraphOverlay = None) -> None:
         """Loads edges for all paths in the set from a graph (based on node lists of the paths).
         """
         if self.shortest_path:
-            self.shortest_path.set_path_edges(G)
+            self.shortest_path.set_path_edges(G, overlay)
         if self.green_paths:
             for gp in self.green_paths:
-                gp.set_path_edges(G)
+                gp.set_path_edges(G, overlay)
 
     def aggregate_path_attrs(self) -> None:
         """Aggregates edge level path attributes to paths.
@@ -0,0 +1,433 @@
+"""
+This module provides the routing engines that find least cost paths over the CSR adjacency of the graph
+(see app.csr_graph). The engine is selected per deployment with env.routing_engine:
+
+    dijkstra: Dijkstra's algorithm of SciPy (csgraph), explores all nodes reachable from the source.
+    astar: Bidirectional A* search with a straight-line distance heuristic (by the node geometries),
+           explores mainly the nodes between origin and destination. The heuristic is tightened with the
+           landmark (ALT) lower bounds of the edge weights if available (see app/landmarks.py). As the search runs
+           in Python, it is faster than dijkstra only on short trips (about 1-2 km) and several times slower on
+           medium and long trips (see benchmarks/routing_engines.py).
+    heapq: Dijkstra's algorithm in Python (heapq) that stops when all targets are settled. It reuses its distance
+           and predecessor buffers between the searches and is a base for custom search algorithms.
+    igraph: Dijkstra's algorithm of igraph (get_shortest_paths) on a graph of the topology of the CSR adjacency,
+            the reference implementation of the engines (igraph converts the weights to a C vector on each search).
+
+Each engine prepares the weights of a cost attribute to the forms that its searches consume (e.g. weight
+matrices) only once, since the prepared weights are cached by GraphHandler.
+
+The searches can be restricted to a search area (a mask of the nodes), e.g. to the nodes through which a path
+of at most the maximum detour can pass (see GraphHandler.get_search_area()).
+
+"""
+
+import heapq
+import threading
+from abc import ABC, abstractmethod
+from math import hypot, inf
+from typing import Any, Callable, Dict, List, Tuple, Union
+import numpy as np
+import igraph as ig
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from app.csr_graph import CsrGraph
+from app.landmarks import LandmarkBounds
+
+
+class EdgeWeights:
+    """Edge weights of a cost attribute and the forms of the weights used by a routing engine, which are
+    created on first use. Landmark bounds (lower bounds of the path costs by the weights) are optional.
+    """
+
+    def __init__(self, weights: np.ndarray, landmark_bounds: Union[LandmarkBounds, None] = None):
+        self.weights = weights
+        self.landmark_bounds = landmark_bounds
+        self.__forms: Dict[str, Any] = {}
+
+    def get_form(self, form: str, create: Callable[[np.ndarray], Any]) -> Any:
+        if form not in self.__forms:
+            self.__forms[form] = create(self.weights)
+        return self.__forms[form]
+
+
+def get_weight_matrix(csr_graph: CsrGraph, edge_weights: EdgeWeights, reverse: bool = False) -> csr_matrix:
+    """Returns the edge weights as a (SciPy) weight matrix of the forward or reverse adjacency (created once).
+    """
+    indptr, indices, _ = csr_graph.get_adjacency(reverse)
+    vcount = csr_graph.vcount
+    return edge_weights.get_form(
+        'reverse_matrix' if reverse else 'matrix',
+        lambda weights: csr_matrix(
+            (csr_graph.get_csr_weights(weights, reverse), indices, indptr), shape=(vcount, vcount), copy=False)
+    )
+
+
+class RoutingEngine(ABC):
+    """Base class of the routing engines.
+    """
+
+    # True if the searches use the landmark bounds of the edge weights
+    uses_landmarks = False
+
+    def __init__(self, csr_graph: CsrGraph):
+        self.csr_graph = csr_graph
+
+    def prepare_weights(self, edge_weights: EdgeWeights) -> None:
+        """Creates the forms of the weights that are needed in the searches (in advance).
+        """
+        pass
+
+    @abstractmethod
+    def find_least_cost_paths(
+        self,
+        edge_weights: EdgeWeights,
+        source: int,
+        targets: List[int],
+        reverse: bool = False,
+        search_area: Union[np.ndarray, None] = None
+    ) -> List[Union[Tuple[float, List[int]], None]]:
+        """Finds the least cost paths from the source to the targets (or from the targets to the source if
+        reverse is True). Returns the cost and the edge ids of each path, or None for unreachable targets.
+        If a search area (boolean array by node) is given, the paths only pass the nodes of the area.
+        """
+        pass
+
+
+class DijkstraEngine(RoutingEngine):
+    """Runs one Dijkstra search (SciPy) from the source to all targets (in the reverse direction of the edges
+    if the paths are searched to the source). A search in a search area is run in the subgraph of the area.
+    """
+
+    def __get_weight_matrix(self, edge_weights: EdgeWeights, reverse: bool) -> csr_matrix:
+        return get_weight_matrix(self.csr_graph, edge_weights, reverse)
+
+    def prepare_weights(self, edge_weights: EdgeWeights) -> None:
+        self.__get_weight_matrix(edge_weights, False)
+
+    def __search_area(
+        self, 
+        weight_matrix: csr_matrix, 
+        source: int, 
+        search_area: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Runs the search in the subgraph of the search area and returns the distances and predecessors by
+        the nodes of the graph.
+        """
+        dists = np.full(self.csr_graph.vcount, np.inf)
+        preds = np.full(self.csr_graph.vcount, -9999, dtype=np.int32)
+        if not search_area[source]:
+            return dists, preds
+        area_nodes = np.flatnonzero(search_area)
+        area_matrix = weight_matrix[area_nodes][:, area_nodes]
+        area_dists, area_preds = dijkstra(
+            area_matrix, directed=True, indices=int(np.searchsorted(area_nodes, source)), return_predecessors=True)
+        dists[area_nodes] = area_dists
+        preds[area_nodes] = np.where(area_preds >= 0, area_nodes[np.maximum(area_preds, 0)], area_preds)
+        return dists, preds
+
+    def find_least_cost_paths(
+        self,
+        edge_weights: EdgeWeights,
+        source: int,
+        targets: List[int],
+        reverse: bool = False,
+        search_area: Union[np.ndarray, None] = None
+    ) -> List[Union[Tuple[float, List[int]], None]]:
+        weight_matrix = self.__get_weight_matrix(edge_weights, reverse)
+        indptr, indices, edge_ids = self.csr_graph.get_adjacency(reverse)
+        if search_area is None:
+            dists, preds = dijkstra(weight_matrix, directed=True, indices=source, return_predecessors=True)
+        else:
+            dists, preds = self.__search_area(weight_matrix, source, search_area)
+        paths = []
+        for target in targets:
+            if np.isinf(dists[target]):
+                paths.append(None)
+                continue
+            epath = []
+            node = target
+            while node != source:
+                pred = preds[node]
+                # the least cost edge between the nodes in case of parallel edges
+                row_start, row_end = indptr[pred], indptr[pred + 1]
+                candidates = np.flatnonzero(indices[row_start:row_end] == node) + row_start
+                epath.append(int(edge_ids[candidates[np.argmin(weight_matrix.data[candidates])]]))
+                node = pred
+            paths.append((float(dists[target]), epath if reverse else epath[::-1]))
+        return paths
+
+
+class BidirectionalAStarEngine(RoutingEngine):
+    """Runs a bidirectional A* search between each pair of source and target. The searches use the balanced
+    potentials of the straight-line distances to the source and to the target (scaled by the minimum ratio of
+    edge weight to straight-line edge length), which keeps the heuristics consistent for any weights. If the
+    edge weights have landmark bounds, the maximum of the straight-line and the landmark bounds is used. Nodes
+    outside the search area (if given) are not explored. Only faster than DijkstraEngine on short trips.
+    """
+
+    uses_landmarks = True
+
+    def __init__(self, csr_graph: CsrGraph, node_xs: np.ndarray, node_ys: np.ndarray):
+        super().__init__(csr_graph)
+        self.__node_xs: List[float] = np.asarray(node_xs, dtype=np.float64).tolist()
+        self.__node_ys: List[float] = np.asarray(node_ys, dtype=np.float64).tolist()
+        self.__adjacency = {
+            reverse: tuple(arr.tolist() for arr in csr_graph.get_adjacency(reverse)) for reverse in (False, True)
+        }
+        # straight-line lengths of the edges (by edge id) for scaling the heuristic
+        indptr, indices, edge_ids = csr_graph.get_adjacency()
+        sources = np.repeat(np.arange(csr_graph.vcount), np.diff(indptr))
+        xs, ys = np.asarray(node_xs, dtype=np.float64), np.asarray(node_ys, dtype=np.float64)
+        self.__edge_distances = np.empty(csr_graph.ecount)
+        self.__edge_distances[edge_ids] = np.hypot(xs[indices] - xs[sources], ys[indices] - ys[sources])
+
+    def __get_search_weights(self, weights: np.ndarray) -> Tuple[float, List[float], List[float]]:
+        """Returns the heuristic scale and the weight vectors in CSR order (forward & reverse) as lists.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.asarray(weights, dtype=np.float64) / self.__edge_distances
+        ratios = ratios[(self.__edge_distances > 0) & ~np.isnan(ratios)]
+        scale = float(ratios.min()) if len(ratios) else 0.0
+        return (
+            max(scale, 0.0),
+            self.csr_graph.get_csr_weights(weights).tolist(),
+            self.csr_graph.get_csr_weights(weights, reverse=True).tolist()
+        )
+
+    def prepare_weights(self, edge_weights: EdgeWeights) -> None:
+        edge_weights.get_form('astar', self.__get_search_weights)
+
+    def find_least_cost_paths(
+        self,
+        edge_weights: EdgeWeights,
+        source: int,
+        targets: List[int],
+        reverse: bool = False,
+        search_area: Union[np.ndarray, None] = None
+    ) -> List[Union[Tuple[float, List[int]], None]]:
+        search_weights = edge_weights.get_form('astar', self.__get_search_weights)
+        in_area = search_area.tolist() if search_area is not None else None
+        return [
+            self.__find_least_cost_path(search_weights, edge_weights.landmark_bounds, in_area, target, source) if reverse
+            else self.__find_least_cost_path(search_weights, edge_weights.landmark_bounds, in_area, source, target)
+            for target in targets
+        ]
+
+    def __find_least_cost_path(
+        self,
+        search_weights: Tuple[float, List[float], List[float]],
+        landmark_bounds: Union[LandmarkBounds, None],
+        in_area: Union[List[bool], None],
+        orig: int,
+        dest: int
+    ) -> Union[Tuple[float, List[int]], None]:
+        if in_area and not (in_area[orig] and in_area[dest]):
+            return None
+        if orig == dest:
+            return (0.0, [])
+        scale, forward_weights, reverse_weights = search_weights
+        xs, ys = self.__node_xs, self.__node_ys
+        orig_x, orig_y, dest_x, dest_y = xs[orig], ys[orig], xs[dest], ys[dest]
+        get_landmark_lower_bounds = landmark_bounds.get_lower_bounds(orig, dest) if landmark_bounds else None
+        potentials: Dict[int, float] = {}
+
+        def get_potential(node: int) -> float:
+            # forward potential, the potential of the reverse search is the negation of it
+            if node not in potentials:
+                x, y = xs[node], ys[node]
+                to_dest, from_orig = scale * hypot(x - dest_x, y - dest_y), scale * hypot(x - orig_x, y - orig_y)
+                if get_landmark_lower_bounds:
+                    landmark_to_dest, landmark_from_orig = get_landmark_lower_bounds(node)
+                    to_dest, from_orig = max(to_dest, landmark_to_dest), max(from_orig, landmark_from_orig)
+                potentials[node] = (to_dest - from_orig) / 2
+            return potentials[node]
+
+        searches = (
+            (self.__adjacency[False], forward_weights, { orig: 0.0 }, { orig: None }, [(get_potential(orig), orig)], set(), 1),
+            (self.__adjacency[True], reverse_weights, { dest: 0.0 }, { dest: None }, [(-get_potential(dest), dest)], set(), -1)
+        )
+        forward, backward = searches
+        best_cost, meeting_node = inf, None
+
+        while forward[4] and backward[4]:
+            if forward[4][0][0] + backward[4][0][0] >= best_cost:
+                break
+            search, other = (forward, backward) if forward[4][0][0] <= backward[4][0][0] else (backward, forward)
+            (indptr, indices, _), weights, costs, preds, heap, settled, sign = search
+            _, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled.add(node)
+            node_cost = costs[node]
+            other_costs = other[2]
+            for entry in range(indptr[node], indptr[node + 1]):
+                weight = weights[entry]
+                if weight == inf:
+                    continue
+                adj_node = indices[entry]
+                if in_area and not in_area[adj_node]:
+                    continue
+                cost = node_cost + weight
+                if cost < costs.get(adj_node, inf):
+                    costs[adj_node] = cost
+                    preds[adj_node] = (node, entry)
+                    heapq.heappush(heap, (cost + sign * get_potential(adj_node), adj_node))
+                    if adj_node in other_costs and cost + other_costs[adj_node] < best_cost:
+                        best_cost, meeting_node = cost + other_costs[adj_node], adj_node
+
+        if meeting_node is None:
+            return None
+        return (best_cost, self.__get_edge_path(forward[3], meeting_node, False)[::-1]
+            + self.__get_edge_path(backward[3], meeting_node, True))
+
+    def __get_edge_path(self, preds: Dict[int, Union[Tuple[int, int], None]], node: int, reverse: bool) -> List[int]:
+        """Returns the edge ids from the node to the root of the search (in search order).
+        """
+        _, _, edge_ids = self.__adjacency[reverse]
+        epath = []
+        while preds[node]:
+            node, entry = preds[node]
+            epath.append(edge_ids[entry])
+        return epath
+
+
+class HeapqEngine(RoutingEngine):
+    """Runs a Dijkstra search (heapq) from the source until all targets are settled. The distances and
+    predecessors of the nodes are kept in buffers that are allocated once per thread and reused between the
+    searches: only the entries of the nodes visited by a search are reset after it.
+    """
+
+    def __init__(self, csr_graph: CsrGraph):
+        super().__init__(csr_graph)
+        self.__adjacency = {}
+        for reverse in (False, True):
+            indptr, indices, edge_ids = csr_graph.get_adjacency(reverse)
+            entry_nodes = np.repeat(np.arange(csr_graph.vcount), np.diff(indptr))
+            self.__adjacency[reverse] = (indptr.tolist(), indices.tolist(), edge_ids.tolist(), entry_nodes.tolist())
+        self.__buffers = threading.local()
+
+    def __get_buffers(self) -> Tuple[List[float], List[int]]:
+        """Returns the distance and predecessor (CSR entry) buffers of the thread.
+        """
+        if not hasattr(self.__buffers, 'dists'):
+            self.__buffers.dists = [inf] * self.csr_graph.vcount
+            self.__buffers.preds = [-1] * self.csr_graph.vcount
+        return self.__buffers.dists, self.__buffers.preds
+
+    def __get_search_weights(self, weights: np.ndarray) -> Dict[bool, List[float]]:
+        return { reverse: self.csr_graph.get_csr_weights(weights, reverse).tolist() for reverse in (False, True) }
+
+    def prepare_weights(self, edge_weights: EdgeWeights) -> None:
+        edge_weights.get_form('heapq', self.__get_search_weights)
+
+    def find_least_cost_paths(
+        self,
+        edge_weights: EdgeWeights,
+        source: int,
+        targets: List[int],
+        reverse: bool = False,
+        search_area: Union[np.ndarray, None] = None
+    ) -> List[Union[Tuple[float, List[int]], None]]:
+        weights = edge_weights.get_form('heapq', self.__get_search_weights)[reverse]
+        indptr, indices, edge_ids, entry_nodes = self.__adjacency[reverse]
+        in_area = search_area.tolist() if search_area is not None else None
+        if in_area and not in_area[source]:
+            return [None for _ in targets]
+        dists, preds = self.__get_buffers()
+        visited = [source]
+        dists[source] = 0.0
+        try:
+            remaining_targets = set(targets)
+            heap = [(0.0, source)]
+            while heap and remaining_targets:
+                node_cost, node = heapq.heappop(heap)
+                if node_cost > dists[node]:
+                    continue
+                remaining_targets.discard(node)
+                for entry in range(indptr[node], indptr[node + 1]):
+                    adj_node = indices[entry]
+                    cost = node_cost + weights[entry]
+                    if cost < dists[adj_node] and not (in_area and not in_area[adj_node]):
+                        if dists[adj_node] == inf:
+                            visited.append(adj_node)
+                        dists[adj_node] = cost
+                        preds[adj_node] = entry
+                        heapq.heappush(heap, (cost, adj_node))
+            paths = []
+            for target in targets:
+                if dists[target] == inf:
+                    paths.append(None)
+                    continue
+                epath = []
+                node = target
+                while node != source:
+                    entry = preds[node]
+                    epath.append(edge_ids[entry])
+                    node = entry_nodes[entry]
+                paths.append((dists[target], epath if reverse else epath[::-1]))
+            return paths
+        finally:
+            for node in visited:
+                dists[node] = inf
+                preds[node] = -1
+
+
+class IgraphEngine(RoutingEngine):
+    """Runs igraph's Dijkstra search (get_shortest_paths) from the source to all targets on a graph that has the
+    topology of the CSR adjacency (the graph of GraphHandler is not used). The weights are passed to igraph as
+    lists, where the edges outside the search area (if given) have infinite weights.
+    """
+
+    def __init__(self, csr_graph: CsrGraph):
+        super().__init__(csr_graph)
+        sources, targets = csr_graph.get_edges()
+        self.__graph = ig.Graph(
+            n=csr_graph.vcount, edges=list(zip(sources.tolist(), targets.tolist())), directed=True)
+        self.__edge_sources, self.__edge_targets = sources, targets
+
+    def __get_search_weights(self, weights: np.ndarray) -> Tuple[np.ndarray, List[float]]:
+        weights = np.nan_to_num(np.asarray(weights, dtype=np.float64), nan=inf)
+        return weights, weights.tolist()
+
+    def prepare_weights(self, edge_weights: EdgeWeights) -> None:
+        edge_weights.get_form('igraph', self.__get_search_weights)
+
+    def find_least_cost_paths(
+        self,
+        edge_weights: EdgeWeights,
+        source: int,
+        targets: List[int],
+        reverse: bool = False,
+        search_area: Union[np.ndarray, None] = None
+    ) -> List[Union[Tuple[float, List[int]], None]]:
+        weight_array, weights = edge_weights.get_form('igraph', self.__get_search_weights)
+        if search_area is not None:
+            if not search_area[source]:
+                return [None for _ in targets]
+            in_area = search_area[self.__edge_sources] & search_area[self.__edge_targets]
+            weights = np.where(in_area, weight_array, inf).tolist()
+        epaths = self.__graph.get_shortest_paths(
+            source, to=targets, weights=weights, mode='in' if reverse else 'out', output='epath')
+        paths = []
+        for target, epath in zip(targets, epaths):
+            cost = sum(weights[edge_id] for edge_id in epath)
+            if cost == inf or (not epath and target != source):
+                paths.append(None)
+            else:
+                paths.append((cost, epath[::-1] if reverse else epath))
+        return paths
+
+
+routing_engines = ['dijkstra', 'astar', 'heapq', 'igraph']
+
+
+def get_routing_engine(name: str, csr_graph: CsrGraph, node_xs: np.ndarray, node_ys: np.ndarray) -> RoutingEngine:
+    if name == 'dijkstra':
+        return DijkstraEngine(csr_graph)
+    if name == 'astar':
+        return BidirectionalAStarEngine(csr_graph, node_xs, node_ys)
+    if name == 'heapq':
+        return HeapqEngine(csr_graph)
+    if name == 'igraph':
+        return IgraphEngine(csr_graph)
+    raise ValueError(f'Unknown routing engine: {name} (expected one of {routing_engines})')
@@ -0,0 +1,143 @@
+"""
+This module provides a parametric sensitivity sweep that finds all distinct least cost paths of a routing mode
+(e.g. quiet paths) between the lowest and the highest sensitivity with as few searches as possible.
+
+The cost of an edge is linear by sensitivity: base cost (length & penalties) + sensitivity * exposure cost.
+Hence the cost of a path is linear by sensitivity as well and the least path costs are a concave, piecewise
+linear function of sensitivity, whose pieces are the distinct least cost (tradeoff) paths. The sweep starts
+from the paths of the lowest and the highest sensitivity and searches a path at the sensitivity where their
+costs are equal (breakpoint). If a cheaper path is found, the ranges on both sides of it are searched in the
+same way, otherwise the breakpoint is confirmed. Each search either finds a new path or confirms a breakpoint,
+i.e. the sweep takes 2 * n - 1 searches for n distinct paths.
+
+"""
+
+from typing import Callable, Dict, List, NamedTuple, Tuple
+import numpy as np
+import app.noise_exposures as noise_exps
+import app.aq_exposures as aq_exps
+import app.greenery_exposures as gvi_exps
+from app.constants import RoutingMode
+
+
+# relative tolerance of the path costs in finding a cheaper path at a breakpoint
+cost_tolerance = 1e-9
+
+
+def get_sensitivities(routing_mode: RoutingMode) -> List[float]:
+    if routing_mode == RoutingMode.QUIET:
+        return noise_exps.get_noise_sensitivities()
+    if routing_mode == RoutingMode.CLEAN:
+        return aq_exps.get_aq_sensitivities()
+    return gvi_exps.get_gvi_sensitivities()
+
+
+class ParametricCosts:
+    """Edge costs of a routing mode as linear functions of sensitivity, derived from the costs of the lowest and
+    the highest sensitivity (base costs are the costs at zero sensitivity).
+
+    Attributes:
+        min_sen, max_sen: The lowest and the highest sensitivity (and the cost attributes of them).
+        base_costs: Base costs of the edges of the graph (by edge id).
+        exposure_costs: Exposure costs (per unit of sensitivity) of the edges of the graph (by edge id).
+        link_costs: Base and exposure costs of the virtual (linking) edges by edge id.
+    """
+
+    def __init__(
+        self,
+        min_sen: Tuple[float, str],
+        max_sen: Tuple[float, str],
+        base_costs: np.ndarray,
+        exposure_costs: np.ndarray,
+        link_costs: Dict[int, Tuple[float, float]]
+    ):
+        self.min_sen = min_sen
+        self.max_sen = max_sen
+        self.base_costs = base_costs
+        self.exposure_costs = exposure_costs
+        self.link_costs = link_costs
+
+    def get_cost_attr(self, sen: float) -> str:
+        """Returns the cost attribute of the sensitivity if it is the lowest or the highest sensitivity (else None).
+        """
+        for cost_sen, cost_attr in (self.min_sen, self.max_sen):
+            if sen == cost_sen:
+                return cost_attr
+        return None
+
+    def get_edge_costs(self, sen: float) -> np.ndarray:
+        return self.base_costs + sen * self.exposure_costs
+
+    def get_link_cost(self, edge_id: int, sen: float) -> float:
+        base_cost, exposure_cost = self.link_costs[edge_id]
+        return base_cost + sen * exposure_cost
+
+    def get_path_costs(self, edge_ids: List[int]) -> Tuple[float, float]:
+        """Returns the base and the exposure cost of a path.
+        """
+        graph_edge_ids = [edge_id for edge_id in edge_ids if edge_id not in self.link_costs]
+        link_costs = [self.link_costs[edge_id] for edge_id in edge_ids if edge_id in self.link_costs]
+        return (
+            float(self.base_costs[graph_edge_ids].sum()) + sum(cost for cost, _ in link_costs),
+            float(self.exposure_costs[graph_edge_ids].sum()) + sum(cost for _, cost in link_costs)
+        )
+
+
+def get_linear_costs(min_sen: float, min_costs: np.ndarray, max_sen: float, max_costs: np.ndarray) -> Tuple:
+    """Returns the base costs (at zero sensitivity) and exposure costs (per unit of sensitivity) of the costs of
+    two sensitivities.
+    """
+    exposure_costs = (max_costs - min_costs) / (max_sen - min_sen) if max_sen > min_sen else max_costs * 0.0
+    return min_costs - min_sen * exposure_costs, exposure_costs
+
+
+class TradeoffPath(NamedTuple):
+    sen: float
+    edge_ids: List[int]
+    base_cost: float
+    exposure_cost: float
+
+    def get_cost(self, sen: float) -> float:
+        return self.base_cost + sen * self.exposure_cost
+
+
+def find_tradeoff_paths(
+    find_paths: Callable[[List[float]], List[List[int]]],
+    get_path_costs: Callable[[List[int]], Tuple[float, float]],
+    min_sen: float,
+    max_sen: float
+) -> List[TradeoffPath]:
+    """Finds the distinct least cost paths between the lowest and the highest sensitivity (ordered by
+    sensitivity). The searches of each round (breakpoints of all open ranges) are requested at once, so that
+    they can be run concurrently.
+
+    Args:
+        find_paths: A function that returns the least cost paths (edge ids) of a list of sensitivities.
+        get_path_costs: A function that returns the base cost and the exposure cost of a path.
+    Returns:
+        The paths with the sensitivity by which each of them was found.
+    """
+    get_path = lambda sen, edge_ids: TradeoffPath(sen, edge_ids, *get_path_costs(edge_ids))
+    if max_sen <= min_sen:
+        return [get_path(min_sen, edge_ids) for edge_ids in find_paths([min_sen])]
+
+    min_path, max_path = (get_path(sen, edge_ids) for sen, edge_ids in zip((min_sen, max_sen), find_paths([min_sen, max_sen])))
+    paths = [min_path]
+    ranges = [(min_path, max_path)]
+    if max_path.edge_ids != min_path.edge_ids:
+        paths.append(max_path)
+    while ranges:
+        # the paths of a range have equal costs at the breakpoint (if the exposure costs differ)
+        ranges = [(low, high) for low, high in ranges if low.exposure_cost > high.exposure_cost]
+        breakpoints = [
+            (high.base_cost - low.base_cost) / (low.exposure_cost - high.exposure_cost) for low, high in ranges
+        ]
+        next_ranges = []
+        for (low, high), sen, edge_ids in zip(ranges, breakpoints, find_paths(breakpoints) if ranges else []):
+            path = get_path(sen, edge_ids)
+            low_cost = low.get_cost(sen)
+            if low_cost - path.get_cost(sen) > cost_tolerance * max(abs(low_cost), 1.0):
+                paths.append(path)
+                next_ranges += [(low, path), (path, high)]
+        ranges = next_ranges
+    return sorted(paths, key=lambda path: path.sen)
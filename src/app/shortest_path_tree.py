@@ -0,0 +1,105 @@
+"""
+This module provides shortest path trees: the least costs and the least cost paths from a source node to all
+nodes of the graph (or from all nodes to the source node) by one Dijkstra search (SciPy) over the CSR adjacency
+of the graph (see app.csr_graph). A tree is needed when paths from one origin to many destinations (or all
+nodes within a cost limit) are needed, e.g. for OD matrices: the paths are then read from the tree instead of
+searching them one by one.
+
+"""
+
+from math import inf
+from typing import List, Tuple, Union
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+from app.csr_graph import CsrGraph
+from app.routing_engines import EdgeWeights, get_weight_matrix
+
+
+class ShortestPathTree:
+    """Least costs and predecessors of the nodes of the graph by a search from a source node (or to it, if the
+    tree is reverse).
+
+    Attributes:
+        source: The root node of the tree.
+        reverse: True if the paths of the tree lead to the source (searched in the reverse direction of the edges).
+        costs: The least costs from the source (or to it) by node (inf = not reached).
+        pred_nodes: The previous nodes of the nodes on their paths from the source (-1 = not reached or the source).
+        pred_edges: The edges (ids) from the previous nodes (-1 = not reached or the source).
+    """
+
+    def __init__(self, source: int, reverse: bool, costs: np.ndarray, pred_nodes: np.ndarray, pred_edges: np.ndarray):
+        self.source = source
+        self.reverse = reverse
+        self.costs = costs
+        self.pred_nodes = pred_nodes
+        self.pred_edges = pred_edges
+
+    def get_cost(self, node: int) -> float:
+        return float(self.costs[node])
+
+    def get_edge_ids(self, node: int) -> Union[List[int], None]:
+        """Returns the edge ids of the path from the source to the node (or from the node to the source if the
+        tree is reverse), or None if the node was not reached.
+        """
+        if self.costs[node] == inf:
+            return None
+        epath = []
+        while node != self.source:
+            epath.append(int(self.pred_edges[node]))
+            node = int(self.pred_nodes[node])
+        return epath if self.reverse else epath[::-1]
+
+    def get_tree_edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the nodes reached by the tree (except the source) and the edges (ids) by which they are reached.
+        """
+        nodes = np.flatnonzero(self.pred_edges >= 0)
+        return nodes, self.pred_edges[nodes]
+
+    def get_path_sums(self, edge_values: np.ndarray) -> np.ndarray:
+        """Returns the sums of edge values along the paths of the tree by node (0 for the source and NaN for the 
+        nodes that were not reached), e.g. the cumulative exposures of the least cost paths. The sums are 
+        accumulated by pointer jumping, i.e. in log(depth) vectorized steps.
+
+        Args:
+            edge_values: The values of the edges of the tree in the order of get_tree_edges().
+        """
+        nodes, _ = self.get_tree_edges()
+        sums = np.asarray(edge_values, dtype=np.float64)
+        # the positions of the previous nodes in nodes (-1 = the source)
+        positions = np.full(len(self.costs), -1, dtype=np.int64)
+        positions[nodes] = np.arange(len(nodes))
+        pred_positions = positions[self.pred_nodes[nodes]]
+        while True:
+            linked = pred_positions >= 0
+            if not linked.any():
+                break
+            sums = np.where(linked, sums + sums[pred_positions], sums)
+            pred_positions = np.where(linked, pred_positions[pred_positions], -1)
+        node_sums = np.full(len(self.costs), np.nan)
+        node_sums[self.source] = 0.0
+        node_sums[nodes] = sums
+        return node_sums
+
+
+def find_shortest_path_tree(
+    csr_graph: CsrGraph,
+    edge_weights: EdgeWeights,
+    source: int,
+    reverse: bool = False,
+    max_cost: float = inf
+) -> ShortestPathTree:
+    """Finds the least cost paths from the source to all nodes (or from all nodes to the source if reverse is
+    True) whose costs are at most max_cost. Of parallel edges, the edge of the least weight is used.
+    """
+    weight_matrix = get_weight_matrix(csr_graph, edge_weights, reverse)
+    costs, pred_nodes = dijkstra(weight_matrix, directed=True, indices=source, return_predecessors=True, limit=max_cost)
+    pred_nodes = np.where(pred_nodes < 0, -1, pred_nodes).astype(np.int64)
+    indptr, indices, edge_ids = csr_graph.get_adjacency(reverse)
+    entry_nodes = np.repeat(np.arange(csr_graph.vcount), np.diff(indptr))
+    # the CSR entries (edges) from the previous nodes, ordered by node and weight (for parallel edges)
+    tree_entries = np.flatnonzero(pred_nodes[indices] == entry_nodes)
+    tree_entries = tree_entries[np.lexsort((weight_matrix.data[tree_entries], indices[tree_entries]))]
+    first_entries = tree_entries[np.diff(indices[tree_entries], prepend=-1) != 0]
+    pred_edges = np.full(csr_graph.vcount, -1, dtype=np.int64)
+    pred_edges[indices[first_entries]] = edge_ids[first_entries]
+    return ShortestPathTree(source, reverse, costs, pred_nodes, pred_edges)
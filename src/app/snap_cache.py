@@ -0,0 +1,87 @@
+"""
+This module provides an in-process LRU cache of the snapping results of origins and destinations (see
+od_handler.get_nearest_node()). Clients often request paths from the same locations (e.g. home or a saved
+place), hence the nearest edge and node of a point, the nearest point on the edge (where the edge is split for
+a new node) and the distances to them are cached by the exact coordinates of the point, and the later requests
+from the same point skip the nearest edge and node searches and the projection of the point to the edge.
+
+The results are not shared between nearby points (e.g. by rounded coordinates), since the nearest edge or node
+of a nearby point may differ from the cached one: a cached result is always the same as the one of an uncached
+search.
+
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Tuple, Union
+from shapely.geometry import Point
+
+
+class Snap(NamedTuple):
+    """The nearest edge and node of a point, the nearest point on the edge and the distances to them.
+    """
+    edge_id: int
+    edge_dist: float
+    edge_point: Point
+    node: int
+    node_dist: float
+
+
+class SnapCache:
+    """LRU cache of the snapping results (Snap) by coordinates (see the module docstring).
+
+    Attributes:
+        max_size: The maximum number of cached results (0 = the cache is disabled).
+        hits, misses: The numbers of the lookups that were or were not found from the cache.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.__snaps: OrderedDict[Tuple[float, float], Snap] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get_key(self, point: Point) -> Tuple[float, float]:
+        """Returns the key of the point: the (exact) coordinates of the point.
+        """
+        return (point.x, point.y)
+
+    def get_snap(self, point: Point, find_snap: Callable[[Point], Union[Snap, None]]) -> Union[Snap, None]:
+        """Returns the snapping result of the point from the cache or by find_snap() of the point. Points that
+        are not snapped (None) are not cached.
+        """
+        if not self.max_size:
+            return find_snap(point)
+        key = self.get_key(point)
+        with self.__lock:
+            snap = self.__snaps.get(key)
+            if snap:
+                self.__snaps.move_to_end(key)
+                self.hits += 1
+                return snap
+            self.misses += 1
+        snap = find_snap(point)
+        if snap:
+            with self.__lock:
+                self.__snaps[key] = snap
+                if len(self.__snaps) > self.max_size:
+                    self.__snaps.popitem(last=False)
+        return snap
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__snaps.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_status(self) -> dict:
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.__snaps),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None
+            }
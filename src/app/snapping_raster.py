@@ -0,0 +1,156 @@
+"""
+This module provides the snapping raster of a graph: a precomputed grid over the extent of the graph that stores
+the nearest node and the nearest edge of each cell, so that origins and destinations can be snapped to the graph
+by a constant-time lookup instead of the nearest node and edge searches (see SpatialIndex.find_nearest_nodes()
+and SpatialIndex.find_nearest_edges()).
+
+A cell stores a node (or an edge) only if it is the nearest node (or edge) of all points of the cell, i.e. the
+lookups are exact: cells near the boundaries of the nearest nodes or edges (and cells farther than the maximum
+distances of the searches) store -1 and the searches are run for the points of those cells. The split point of
+the nearest edge is projected from the point itself (not from the cell), hence the raster only replaces the
+searches.
+
+The raster is built offline (see app/snapping_raster_builder.py) and saved next to the graph file as a directory
+of NumPy files. It is loaded by GraphHandler at startup (read-only memory-mapped) if it matches the graph.
+
+"""
+
+import os
+import json
+import time
+from math import sqrt
+from typing import Callable, Tuple
+import numpy as np
+from app.logger import Logger
+
+
+snapping_raster_format = 1
+manifest_file = 'manifest.json'
+
+
+def get_snapping_raster_dir(graph_file: str) -> str:
+    """Returns the path of the snapping raster of a graph (GraphML file or graph bundle), e.g.
+    graphs/hma.graphml -> graphs/hma.snapping
+    """
+    return os.path.splitext(graph_file.rstrip('/'))[0] + '.snapping'
+
+
+class SnappingRaster:
+    """Nearest nodes and edges by cell of a grid (see the module docstring).
+
+    Attributes:
+        x0, y0: The lower left corner of the grid (EPSG:3879).
+        cell_size: The width & height of the cells (m).
+        nodes: The nearest nodes by cell (rows by y, columns by x), -1 if the cell needs a search.
+        edges: The nearest edges by cell (rows by y, columns by x), -1 if the cell needs a search.
+        metadata: The properties of the graph for which the raster was built (see is_valid_for()).
+    """
+
+    def __init__(self, x0: float, y0: float, cell_size: float, nodes: np.ndarray, edges: np.ndarray, metadata: dict):
+        self.x0 = x0
+        self.y0 = y0
+        self.cell_size = cell_size
+        self.nodes = nodes
+        self.edges = edges
+        self.metadata = metadata
+
+    def get_cells(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the rows and columns of the cells of the points and whether the points are inside the grid.
+        """
+        rows = np.floor((np.asarray(ys) - self.y0) / self.cell_size).astype(np.int64)
+        cols = np.floor((np.asarray(xs) - self.x0) / self.cell_size).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.nodes.shape[0]) & (cols >= 0) & (cols < self.nodes.shape[1])
+        return np.where(inside, rows, 0), np.where(inside, cols, 0), inside
+
+    def get_nearest_nodes(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """Returns the nearest nodes of the points (-1 if a search is needed).
+        """
+        rows, cols, inside = self.get_cells(xs, ys)
+        return np.where(inside, self.nodes[rows, cols], -1).astype(np.int64)
+
+    def get_nearest_edges(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """Returns the nearest edges of the points (-1 if a search is needed).
+        """
+        rows, cols, inside = self.get_cells(xs, ys)
+        return np.where(inside, self.edges[rows, cols], -1).astype(np.int64)
+
+    def is_valid_for(self, metadata: dict) -> bool:
+        return self.metadata == metadata
+
+    @classmethod
+    def build(
+        cls,
+        log: Logger,
+        bounds: Tuple[float, float, float, float],
+        cell_size: float,
+        find_nearest_nodes: Callable[[np.ndarray, np.ndarray, float], np.ndarray],
+        find_nearest_edges: Callable[[np.ndarray, np.ndarray, float], np.ndarray],
+        metadata: dict,
+        chunk_rows: int = 200
+    ) -> 'SnappingRaster':
+        """Builds a raster over the bounds (min x, min y, max x, max y) by the nearest nodes and edges of the cell
+        centers that are the nearest ones within the margin of the centers (half of the diagonal of a cell).
+
+        Args:
+            find_nearest_nodes: Returns the nearest nodes of points (x, y) that are the nearest ones of all
+                points within the margin, or -1 (see SpatialIndex.find_nearest_nodes()).
+            find_nearest_edges: As find_nearest_nodes for the edges (see SpatialIndex.find_nearest_edges()).
+        """
+        start_time = time.time()
+        min_x, min_y, max_x, max_y = bounds
+        shape = (int(np.ceil((max_y - min_y) / cell_size)), int(np.ceil((max_x - min_x) / cell_size)))
+        nodes = np.full(shape, -1, dtype=np.int32)
+        edges = np.full(shape, -1, dtype=np.int32)
+        margin = cell_size * sqrt(2) / 2
+        col_xs = min_x + (np.arange(shape[1]) + 0.5) * cell_size
+        for first_row in range(0, shape[0], chunk_rows):
+            rows = np.arange(first_row, min(first_row + chunk_rows, shape[0]))
+            xs, ys = np.meshgrid(col_xs, min_y + (rows + 0.5) * cell_size)
+            nodes[rows] = find_nearest_nodes(xs.ravel(), ys.ravel(), margin).reshape(xs.shape)
+            edges[rows] = find_nearest_edges(xs.ravel(), ys.ravel(), margin).reshape(xs.shape)
+            log.info(f'Built {rows[-1] + 1} / {shape[0]} rows of snapping raster')
+
+        cell_count = shape[0] * shape[1]
+        log.duration(
+            start_time,
+            f'Built snapping raster of {cell_count} cells ({round(100 * np.count_nonzero(nodes >= 0) / cell_count, 1)} % '
+            f'with node, {round(100 * np.count_nonzero(edges >= 0) / cell_count, 1)} % with edge)',
+            log_level='info')
+        return cls(min_x, min_y, cell_size, nodes, edges, metadata)
+
+    def save(self, raster_dir: str) -> None:
+        """Saves the raster to a directory of NumPy files and a manifest.
+        """
+        os.makedirs(raster_dir, exist_ok=True)
+        np.save(os.path.join(raster_dir, 'nodes.npy'), self.nodes)
+        np.save(os.path.join(raster_dir, 'edges.npy'), self.edges)
+        manifest = {
+            'format': snapping_raster_format,
+            'x0': self.x0,
+            'y0': self.y0,
+            'cell_size': self.cell_size,
+            'metadata': self.metadata
+        }
+        with open(os.path.join(raster_dir, manifest_file), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def load(cls, raster_dir: str, mmap_mode: str = 'r') -> 'SnappingRaster':
+        """Loads the raster from a directory. The arrays are read-only memory-mapped by default, i.e. shared by
+        all processes that load them.
+
+        Raises:
+            ValueError if the raster was saved in another format.
+        """
+        with open(os.path.join(raster_dir, manifest_file), 'r') as f:
+            manifest = json.load(f)
+        if manifest['format'] != snapping_raster_format:
+            raise ValueError(f'Unsupported snapping raster format: {manifest["format"]}')
+        return cls(
+            manifest['x0'],
+            manifest['y0'],
+            manifest['cell_size'],
+            np.load(os.path.join(raster_dir, 'nodes.npy'), mmap_mode=mmap_mode),
+            np.load(os.path.join(raster_dir, 'edges.npy'), mmap_mode=mmap_mode),
+            manifest['metadata']
+        )
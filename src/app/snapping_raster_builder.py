@@ -0,0 +1,32 @@
+"""
+This module builds the snapping raster of a graph for constant-time nearest node and edge lookups of origins and
+destinations and saves it next to the graph file (see app/snapping_raster.py). The raster is loaded by
+GraphHandler at startup if it matches the graph (the same nodes and edges), hence it must be rebuilt if the
+graph changes. Smaller cells leave fewer points to the nearest node and edge searches but take more memory
+(8 bytes per cell).
+
+This script is intended to be run from the root of the project (src/) with the command:
+python -m app.snapping_raster_builder graphs/hma.graphml 10
+
+"""
+
+import sys
+import time
+from app.logger import Logger
+from app.graph_handler import GraphHandler
+from app.snapping_raster import get_snapping_raster_dir
+
+
+def build_snapping_raster(log: Logger, graph_file: str, cell_size: float) -> None:
+    start_time = time.time()
+    G = GraphHandler(log, graph_file)
+    raster_dir = get_snapping_raster_dir(graph_file)
+    G.export_snapping_raster(raster_dir, cell_size)
+    log.info(f'Built snapping raster of {graph_file} to {raster_dir} in {round(time.time() - start_time, 1)} s')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        print('Usage: python -m app.snapping_raster_builder <graph.graphml or graph bundle dir> [cell size (m), default 10]')
+        sys.exit(1)
+    build_snapping_raster(Logger(b_printing=True), sys.argv[1], float(sys.argv[2]) if len(sys.argv) == 3 else 10.0)
@@ -0,0 +1,179 @@
+"""
+This module provides the spatial indexes of a graph for snapping origins and destinations to it: a KD-tree of
+the nodes, an STRtree of the edges and the snapping raster (see app/snapping_raster.py) that replaces the
+searches by lookups where the nearest node or edge is the same for the whole cell.
+
+All coordinates are projected (EPSG:3879).
+
+"""
+
+import os
+from typing import Tuple, Union
+import numpy as np
+from scipy.spatial import cKDTree
+from shapely import STRtree, points
+from shapely.geometry import Point
+from app.logger import Logger
+from app.snapping_raster import SnappingRaster, get_snapping_raster_dir
+from utils.arrays import get_array_hash
+
+
+# the maximum distances of the nearest node and edge searches of origins and destinations (m)
+nearest_node_max_dist = 500.0
+nearest_edge_max_dist = 650.0
+# the margin of the extent of the snapping raster around the nodes of the graph (m)
+snapping_raster_extent_margin = 100.0
+
+
+class SpatialIndex:
+    """Nearest node and edge searches of a graph.
+
+    Attributes:
+        edge_ids: The edge ids of the geometries of the edge tree (one edge per two-way edge pair).
+        __node_xs, __node_ys: Coordinates of the nodes (by node id).
+        __node_kdtree: KD-tree of the coordinates of the nodes.
+        __edge_tree: STRtree of the geometries of the edges (in the order of edge_ids).
+        __edge_tree_order: The indexes of the edge tree by edge id (for finding the geometry of an edge).
+        __snapping_raster: Precomputed nearest nodes and edges by grid cell (if built for the graph).
+    """
+
+    def __init__(self, log: Logger, node_xs: np.ndarray, node_ys: np.ndarray, edge_geoms: np.ndarray, edge_ids: np.ndarray):
+        self.log = log
+        self.edge_ids = edge_ids
+        self.__node_xs = node_xs
+        self.__node_ys = node_ys
+        self.__node_kdtree = cKDTree(np.column_stack((node_xs, node_ys)))
+        self.__edge_tree = STRtree(edge_geoms)
+        self.__edge_tree_order = np.argsort(edge_ids)
+        self.__snapping_raster: Union[SnappingRaster, None] = None
+
+    def __get_snapping_raster_metadata(self, edge_lengths: np.ndarray) -> dict:
+        return {
+            'vcount': len(self.__node_xs),
+            'ecount': len(edge_lengths),
+            'nodes_hash': get_array_hash(np.concatenate((self.__node_xs, self.__node_ys))),
+            'edges_hash': get_array_hash(np.concatenate((self.edge_ids, edge_lengths[self.edge_ids]))),
+            'node_max_dist': nearest_node_max_dist,
+            'edge_max_dist': nearest_edge_max_dist
+        }
+
+    def load_snapping_raster(self, graph_file: str, edge_lengths: np.ndarray) -> None:
+        """Loads the snapping raster of the graph for the nearest node and edge lookups if it has been built
+        (see app/snapping_raster_builder.py) and is up to date with the graph (nodes and edge lengths).
+        """
+        raster_dir = get_snapping_raster_dir(graph_file)
+        if not os.path.exists(raster_dir):
+            return
+        snapping_raster = SnappingRaster.load(raster_dir)
+        if not snapping_raster.is_valid_for(self.__get_snapping_raster_metadata(edge_lengths)):
+            self.log.warning(
+                f'Snapping raster {raster_dir} was built for another graph, not using it '
+                '- rebuild it with: python -m app.snapping_raster_builder')
+            return
+        self.log.info(f'Loaded snapping raster ({snapping_raster.cell_size} m cells): {raster_dir}')
+        self.__snapping_raster = snapping_raster
+
+    def export_snapping_raster(self, raster_dir: str, cell_size: float, edge_lengths: np.ndarray) -> None:
+        """Builds a snapping raster of the cells of the given size over the extent of the nodes of the graph
+        (with a margin) and saves it to the directory.
+        """
+        m = snapping_raster_extent_margin
+        snapping_raster = SnappingRaster.build(
+            self.log,
+            (self.__node_xs.min() - m, self.__node_ys.min() - m, self.__node_xs.max() + m, self.__node_ys.max() + m),
+            cell_size,
+            lambda xs, ys, margin: self.find_nearest_nodes(xs, ys, margin=margin),
+            lambda xs, ys, margin: self.find_nearest_edges(xs, ys, margin=margin)[0],
+            self.__get_snapping_raster_metadata(edge_lengths)
+        )
+        snapping_raster.save(raster_dir)
+
+    def find_nearest_node(self, point: Point, max_dist: float = nearest_node_max_dist) -> int:
+        """Returns the id of the nearest node to the point (-1 if no node is found within max_dist). The node is
+        looked up from the snapping raster (if loaded) and searched only if the cell of the point has no node.
+        """
+        xs, ys = np.array([point.x]), np.array([point.y])
+        nearest_node = -1
+        if self.__snapping_raster and max_dist == nearest_node_max_dist:
+            nearest_node = self.__snapping_raster.get_nearest_nodes(xs, ys)[0]
+        if nearest_node < 0:
+            nearest_node = self.find_nearest_nodes(xs, ys, max_dist)[0]
+        return int(nearest_node)
+
+    def find_nearest_nodes(
+        self,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        max_dist: float = nearest_node_max_dist,
+        margin: float = 0.0
+    ) -> np.ndarray:
+        """Finds the nearest nodes to many points with one query of the KD-tree of the nodes.
+
+        Args:
+            margin: If given, a node is returned only if it is the nearest node (within max_dist) of all points
+                within the margin of the point (e.g. of all points of a cell of the snapping raster).
+        Returns:
+            The ids of the nearest nodes in the order of the points (-1 if no node is found within max_dist).
+        """
+        if not margin:
+            dists, nodes = self.__node_kdtree.query(np.column_stack((xs, ys)), distance_upper_bound=max_dist)
+            return np.where(np.isfinite(dists), nodes, -1).astype(np.int64)
+        # the nearest node is the nearest one of the nearby points only if the second nearest node is farther
+        dists, nodes = self.__node_kdtree.query(
+            np.column_stack((xs, ys)), k=2, distance_upper_bound=max_dist + 3 * margin)
+        unique = (dists[:, 0] + margin < max_dist) & (dists[:, 1] - dists[:, 0] > 2 * margin)
+        return np.where(unique, nodes[:, 0], -1).astype(np.int64)
+
+    def find_nearest_edge(self, point: Point, max_dist: float = nearest_edge_max_dist) -> Tuple[int, float]:
+        """Returns the id of the nearest edge to the point and the distance to it (-1 and NaN if no edge is found
+        within max_dist). The edge is looked up from the snapping raster (if loaded) and searched only if the
+        cell of the point has no edge.
+        """
+        xs, ys = np.array([point.x]), np.array([point.y])
+        if self.__snapping_raster and max_dist == nearest_edge_max_dist:
+            edge_id = int(self.__snapping_raster.get_nearest_edges(xs, ys)[0])
+            if edge_id >= 0:
+                tree_idx = self.__edge_tree_order[np.searchsorted(self.edge_ids, edge_id, sorter=self.__edge_tree_order)]
+                return edge_id, float(self.__edge_tree.geometries[tree_idx].distance(point))
+        edge_ids, dists = self.find_nearest_edges(xs, ys, max_dist)
+        return int(edge_ids[0]), float(dists[0])
+
+    def find_nearest_edges(
+        self,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        max_dist: float = nearest_edge_max_dist,
+        margin: float = 0.0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the nearest edges to many points with one query of the STRtree of the edges. Of equally near
+        edges, the edge of the lowest id is returned.
+
+        Args:
+            margin: If given, an edge is returned only if it is the nearest edge (within max_dist) of all points
+                within the margin of the point (e.g. of all points of a cell of the snapping raster).
+        Returns:
+            The ids of the nearest edges (-1 if no edge is found within max_dist) and the distances to them (NaN
+            if not found) in the order of the points.
+        """
+        (point_idxs, tree_idxs), dists = self.__edge_tree.query_nearest(
+            points(np.column_stack((xs, ys))), max_distance=max_dist, return_distance=True, all_matches=True)
+        match_edge_ids = self.edge_ids[tree_idxs]
+        # the first match of each point by the lowest edge id (of the equally near edges)
+        order = np.lexsort((match_edge_ids, point_idxs))
+        first = order[np.diff(point_idxs[order], prepend=-1) != 0]
+        edge_ids = np.full(len(xs), -1, dtype=np.int64)
+        edge_dists = np.full(len(xs), np.nan)
+        edge_ids[point_idxs[first]] = match_edge_ids[first]
+        edge_dists[point_idxs[first]] = dists[first]
+        if margin:
+            # the nearest edge is the nearest one of the nearby points only if no other edge is within the margin
+            # of the nearest edge (twice the margin from the point)
+            found = np.flatnonzero((edge_ids >= 0) & (edge_dists + margin < max_dist))
+            near_point_idxs, _ = self.__edge_tree.query(
+                points(np.column_stack((xs[found], ys[found]))), predicate='dwithin',
+                distance=edge_dists[found] + 2 * margin)
+            unique = np.zeros(len(xs), dtype=bool)
+            unique[found] = np.bincount(near_point_idxs, minlength=len(found)) == 1
+            edge_ids[~unique] = -1
+            edge_dists[~unique] = np.nan
+        return edge_ids, edge_dists
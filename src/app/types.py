@@ -1,8 +1,10 @@
 from dataclasses import dataclass, field
 from typing import Dict, Union, List, Tuple
+import numpy as np
 import app.noise_exposures as noise_exps
 import utils.geometry as geom_utils
-from app.constants import RoutingMode
+from utils.igraph import Edge as E
+from app.constants import RoutingMode, TravelMode, cost_prefix_dict
 
 
 @dataclass
@@ -41,6 +43,26 @@ class PathEdge:
         }
 
 
+@dataclass(frozen=True)
+class AqiGeneration:
+    """Class for a complete set of AQI based edge attributes (AQI & AQ costs as arrays by edge id) updated 
+    from one AQI data file. A generation is not modified after it is published to a graph, so that a routing
+    request can use the same generation for its whole lifetime.
+    """
+    aqi_data: str
+    aqi_data_utc_time_secs: Union[int, None]
+    edge_arrays: Dict[str, np.ndarray]
+
+
+__aqi_cost_prefixes = tuple(cost_prefix_dict[travel_mode][RoutingMode.CLEAN] for travel_mode in TravelMode)
+
+
+def is_aqi_edge_attr(attr: str) -> bool:
+    """Returns True if the edge attribute is AQI or AQ cost, i.e. an attribute of AQI generations.
+    """
+    return attr == E.aqi.value or attr.startswith(__aqi_cost_prefixes)
+
+
 edge_group_attr_by_routing_mode: Dict[RoutingMode, str] = {
     RoutingMode.CLEAN: 'aqi_cl',
     RoutingMode.QUIET: 'db_range',
@@ -0,0 +1,66 @@
+"""
+This benchmark compares the shortest path (length) query times of the contraction hierarchy (see
+app/contraction_hierarchy.py) to the default routing engine for short, medium and long trips on a synthetic
+grid graph. It also reports the build times of the hierarchy for the grid graph and for a sparse grid graph
+whose node degrees are closer to those of a street network (the build time of the full graph is dominated by
+the densely connected core of the grid).
+
+This script is intended to be run from the root of the project (src/) with the command:
+python -m benchmarks.contraction_hierarchy [grid size]
+
+"""
+
+import sys
+import time
+import numpy as np
+import igraph as ig
+from app.logger import Logger
+from app.csr_graph import CsrGraph
+from app.contraction_hierarchy import ContractionHierarchy
+from app.routing_engines import EdgeWeights, get_routing_engine
+from benchmarks.synthetic_graph import (
+    get_grid_graph, get_sparse_grid_graph, get_node_coords, get_cost_arrays, node_spacing
+)
+from benchmarks.utils import get_mean_duration_ms
+
+
+def get_build_time(graph: ig.Graph) -> float:
+    lengths = get_cost_arrays(graph, 1)['length']
+    sources, targets = np.array(graph.get_edgelist()).T
+    start_time = time.perf_counter()
+    ContractionHierarchy.build(Logger(b_printing=False), graph.vcount(), sources, targets, lengths)
+    return round(time.perf_counter() - start_time, 1)
+
+
+def run_benchmark(grid_size: int, repeats: int = 5) -> None:
+    graph = get_grid_graph(grid_size)
+    lengths = get_cost_arrays(graph, 1)['length']
+    sources, targets = np.array(graph.get_edgelist()).T
+    node_xs, node_ys = get_node_coords(grid_size)
+    engine = get_routing_engine('dijkstra', CsrGraph(graph.vcount(), sources, targets), node_xs, node_ys)
+    edge_weights = EdgeWeights(lengths)
+    engine.prepare_weights(edge_weights)
+    print(f'Grid graph of {graph.vcount()} nodes and {graph.ecount()} edges')
+
+    start_time = time.perf_counter()
+    length_ch = ContractionHierarchy.build(Logger(b_printing=False), graph.vcount(), sources, targets, lengths)
+    print(f'Built contraction hierarchy in {round(time.perf_counter() - start_time, 1)} s')
+    sparse_graph = get_sparse_grid_graph(grid_size)
+    print(
+        f'Built contraction hierarchy of sparse grid graph of {sparse_graph.vcount()} nodes and '
+        f'{sparse_graph.ecount()} edges in {get_build_time(sparse_graph)} s')
+
+    center = grid_size // 2 * grid_size + grid_size // 2
+    for trip_nodes in (10, grid_size // 4, grid_size // 2 - 1):
+        orig, dest = center - trip_nodes * (grid_size + 1), center + trip_nodes * (grid_size + 1)
+        trip_km = round(2 * trip_nodes * node_spacing * 2**0.5 / 1000, 1)
+        cost, _ = engine.find_least_cost_paths(edge_weights, orig, [dest])[0]
+        ch_cost, _ = length_ch.find_least_cost_paths(orig, [dest])[0]
+        assert round(cost, 6) == round(ch_cost, 6)
+        duration = get_mean_duration_ms(lambda: engine.find_least_cost_paths(edge_weights, orig, [dest]), repeats)
+        ch_duration = get_mean_duration_ms(lambda: length_ch.find_least_cost_paths(orig, [dest]), repeats)
+        print(f'{trip_km} km trip by length, dijkstra: {duration} ms, contraction hierarchy: {ch_duration} ms')
+
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,57 @@
+"""
+This benchmark compares the search times of the A* routing engine with and without landmark (ALT) bounds
+(see app/landmarks.py) for short, medium and long trips on a synthetic grid graph.
+
+This script is intended to be run from the root of the project (src/) with the command:
+python -m benchmarks.landmarks [grid size] [landmark count]
+
+"""
+
+import sys
+import numpy as np
+from app.csr_graph import CsrGraph
+from app.landmarks import LandmarkTable, select_landmarks, get_landmark_bounds
+from app.routing_engines import EdgeWeights, get_routing_engine
+from benchmarks.synthetic_graph import get_grid_graph, get_node_coords, get_cost_arrays, node_spacing
+from benchmarks.utils import get_mean_duration_ms
+
+
+def run_benchmark(grid_size: int, landmark_count: int, repeats: int = 5) -> None:
+    graph = get_grid_graph(grid_size)
+    costs = get_cost_arrays(graph, 6)
+    sources, targets = np.array(graph.get_edgelist()).T
+    csr_graph = CsrGraph(graph.vcount(), sources, targets)
+    node_xs, node_ys = get_node_coords(grid_size)
+    engine = get_routing_engine('astar', csr_graph, node_xs, node_ys)
+    print(f'Grid graph of {graph.vcount()} nodes and {graph.ecount()} edges, {landmark_count} landmarks')
+
+    lengths = costs['length']
+    landmarks = select_landmarks(csr_graph, lengths, landmark_count)
+    # exposure costs per unit of sensitivity
+    exposures = costs['cost_1'] - lengths
+    base_tables = [
+        (base_weights, LandmarkTable.build(csr_graph, base_weights, landmarks, '')) for base_weights in (lengths, exposures)
+    ]
+
+    center = grid_size // 2 * grid_size + grid_size // 2
+    for trip_nodes in (10, grid_size // 4, grid_size // 2 - 1):
+        orig, dest = center - trip_nodes * (grid_size + 1), center + trip_nodes * (grid_size + 1)
+        trip_km = round(2 * trip_nodes * node_spacing * 2**0.5 / 1000, 1)
+        for weight in ('length', 'cost_5'):
+            results = []
+            for name, edge_weights in (
+                ('euclidean', EdgeWeights(costs[weight])),
+                ('landmarks', EdgeWeights(costs[weight], get_landmark_bounds(costs[weight], *base_tables)))
+            ):
+                engine.prepare_weights(edge_weights)
+                cost, epath = engine.find_least_cost_paths(edge_weights, orig, [dest])[0]
+                results.append((round(cost, 6), epath))
+                duration = get_mean_duration_ms(lambda: engine.find_least_cost_paths(edge_weights, orig, [dest]), repeats)
+                print(f'{trip_km} km trip by {weight}, astar with {name} bounds: {duration} ms')
+            assert all(result[0] == results[0][0] for result in results)
+
+
+if __name__ == '__main__':
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 300,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8)
@@ -0,0 +1,64 @@
+"""
+This benchmark compares the Pareto search (see app/pareto_search.py) to the least cost path searches of a list
+of sensitivities (K searches) for short, medium and long trips on a synthetic grid graph. The quality of the
+paths is measured as the number of distinct paths and the largest relative cost gap between the least cost path
+of a sensitivity and the best path of the Pareto search by the costs of the sensitivity.
+
+This script is intended to be run from the root of the project (src/) with the command:
+python -m benchmarks.pareto_search [grid size] [max detour ratio] [exposure tolerance]
+
+"""
+
+import sys
+import numpy as np
+from app.csr_graph import CsrGraph
+from app.routing_engines import EdgeWeights, get_routing_engine
+from app.pareto_search import find_pareto_paths
+from app.sensitivity_sweep import get_linear_costs
+from benchmarks.synthetic_graph import get_grid_graph, get_node_coords, get_cost_arrays, node_spacing
+from benchmarks.utils import get_mean_duration_ms
+
+
+sens = [0.1, 0.4, 1.3, 3.5, 6]
+
+
+def run_benchmark(grid_size: int, max_detour_ratio: float, exposure_tolerance: float, repeats: int = 3) -> None:
+    graph = get_grid_graph(grid_size)
+    costs = get_cost_arrays(graph, 2)
+    lengths, exposures = costs['length'], costs['cost_1'] - costs['length']
+    sen_costs = [np.round(lengths + sen * exposures, 2) for sen in sens]
+    base_costs, exposure_costs = get_linear_costs(sens[0], sen_costs[0], sens[-1], sen_costs[-1])
+    sources, targets = np.array(graph.get_edgelist()).T
+    csr_graph = CsrGraph(graph.vcount(), sources, targets)
+    node_xs, node_ys = get_node_coords(grid_size)
+    engine = get_routing_engine('dijkstra', csr_graph, node_xs, node_ys)
+    edge_weights = [EdgeWeights(weights) for weights in sen_costs]
+    for weights in edge_weights:
+        engine.prepare_weights(weights)
+    print(f'Grid graph of {graph.vcount()} nodes and {graph.ecount()} edges')
+
+    center = grid_size // 2 * grid_size + grid_size // 2
+    for trip_nodes in (10, grid_size // 4, grid_size // 2 - 1):
+        orig, dest = center - trip_nodes * (grid_size + 1), center + trip_nodes * (grid_size + 1)
+        trip_km = round(2 * trip_nodes * node_spacing * 2**0.5 / 1000, 1)
+        find_k_paths = lambda: [engine.find_least_cost_paths(weights, orig, [dest])[0] for weights in edge_weights]
+        find_paths = lambda: find_pareto_paths(
+            csr_graph, base_costs, exposure_costs, lengths, [(orig, (0.0, 0.0, 0.0), [])], [(dest, (0.0, 0.0, 0.0), [])], 
+            max_detour_ratio, exposure_tolerance=exposure_tolerance)
+        k_paths, pareto_paths = find_k_paths(), find_paths()
+        cost_gaps = [
+            min(base_cost + sen * exposure_cost for base_cost, exposure_cost, _, _ in pareto_paths) / k_cost - 1
+            for sen, (k_cost, _) in zip(sens, k_paths)
+        ]
+        k_duration = get_mean_duration_ms(find_k_paths, repeats)
+        duration = get_mean_duration_ms(find_paths, repeats)
+        print(
+            f'{trip_km} km trip, K searches: {k_duration} ms ({len(set(tuple(epath) for _, epath in k_paths))} paths), '
+            f'Pareto search: {duration} ms ({len(pareto_paths)} paths, max cost gap {round(max(cost_gaps) * 100, 2)} %)')
+
+
+if __name__ == '__main__':
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 1.5,
+        float(sys.argv[3]) if len(sys.argv) > 3 else 0.05)
@@ -0,0 +1,45 @@
+"""
+This benchmark compares the search times of the routing engines (see app/routing_engines.py) for short,
+medium and long trips on a synthetic grid graph.
+
+This script is intended to be run from the root of the project (src/) with the command:
+python -m benchmarks.routing_engines [grid size]
+
+"""
+
+import sys
+import numpy as np
+from app.csr_graph import CsrGraph
+from app.routing_engines import EdgeWeights, get_routing_engine, routing_engines
+from benchmarks.synthetic_graph import get_grid_graph, get_node_coords, get_cost_arrays, node_spacing
+from benchmarks.utils import get_mean_duration_ms
+
+
+def run_benchmark(grid_size: int, repeats: int = 5) -> None:
+    graph = get_grid_graph(grid_size)
+    costs = get_cost_arrays(graph, 6)
+    sources, targets = np.array(graph.get_edgelist()).T
+    csr_graph = CsrGraph(graph.vcount(), sources, targets)
+    node_xs, node_ys = get_node_coords(grid_size)
+    engines = { name: get_routing_engine(name, csr_graph, node_xs, node_ys) for name in routing_engines }
+    print(f'Grid graph of {graph.vcount()} nodes and {graph.ecount()} edges')
+
+    center = grid_size // 2 * grid_size + grid_size // 2
+    for trip_nodes in (10, grid_size // 4, grid_size // 2 - 1):
+        orig, dest = center - trip_nodes * (grid_size + 1), center + trip_nodes * (grid_size + 1)
+        trip_km = round(2 * trip_nodes * node_spacing * 2**0.5 / 1000, 1)
+        for weight in ('length', 'cost_5'):
+            edge_weights = EdgeWeights(costs[weight])
+            results = []
+            for name, engine in engines.items():
+                engine.prepare_weights(edge_weights)
+                cost, _ = engine.find_least_cost_paths(edge_weights, orig, [dest])[0]
+                results.append(round(cost, 6))
+                duration = get_mean_duration_ms(lambda: engine.find_least_cost_paths(edge_weights, orig, [dest]), repeats)
+                print(f'{trip_km} km trip by {weight}, {name}: {duration} ms')
+            # (the paths may differ if there are several least cost paths)
+            assert all(result == results[0] for result in results)
+
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,51 @@
+"""
+This benchmark compares the latency of the least cost path searches of a routing request (the shortest path
+and one search per sensitivity) run sequentially and concurrently in a thread pool (see env.routing_threads).
+The speedup is limited by the number of available CPU cores.
+
+This script is intended to be run from the root of the project (src/) with the command:
+python -m benchmarks.routing_threads [grid size] [thread pool size]
+
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.csr_graph import CsrGraph
+from app.routing_engines import DijkstraEngine, EdgeWeights
+from benchmarks.synthetic_graph import get_grid_graph, get_cost_arrays
+from benchmarks.utils import get_mean_duration_ms
+
+
+def run_benchmark(grid_size: int, threads: int, cost_count: int = 6, repeats: int = 10) -> None:
+    graph = get_grid_graph(grid_size)
+    sources, targets = np.array(graph.get_edgelist()).T
+    engine = DijkstraEngine(CsrGraph(graph.vcount(), sources, targets))
+    edge_weights = [EdgeWeights(weights) for weights in get_cost_arrays(graph, cost_count).values()]
+    for weights in edge_weights:
+        engine.prepare_weights(weights)
+    orig, dest = 0, graph.vcount() - 1
+    print(
+        f'Grid graph of {graph.vcount()} nodes and {graph.ecount()} edges, {cost_count} searches per request, '
+        f'{os.cpu_count()} CPU cores')
+
+    def find_least_cost_path(weights: EdgeWeights):
+        return engine.find_least_cost_paths(weights, orig, [dest])
+
+    def route_sequentially():
+        return [find_least_cost_path(weights) for weights in edge_weights]
+
+    with ThreadPoolExecutor(max_workers=threads) as routing_pool:
+        def route_concurrently():
+            return list(routing_pool.map(find_least_cost_path, edge_weights))
+
+        assert route_sequentially() == route_concurrently()
+        print(f'Sequential searches: {get_mean_duration_ms(route_sequentially, repeats)} ms / request')
+        print(f'Thread pool of {threads}: {get_mean_duration_ms(route_concurrently, repeats)} ms / request')
+
+
+if __name__ == '__main__':
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 300, 
+        int(sys.argv[2]) if len(sys.argv) > 2 else 6)
@@ -0,0 +1,48 @@
+"""
+This benchmark compares the least cost path searches of a routing request (one search per cost attribute)
+with the edge weights converted for each search (to a list and by igraph) and with the cached edge weights
+of the (Dijkstra) routing engine (weight matrices that are consumed by the searches as is).
+
+This script is intended to be run from the root of the project (src/) with the command:
+python -m benchmarks.routing_weights [grid size]
+
+"""
+
+import sys
+import numpy as np
+from app.csr_graph import CsrGraph
+from app.routing_engines import DijkstraEngine, EdgeWeights
+from benchmarks.synthetic_graph import get_grid_graph, get_cost_arrays
+from benchmarks.utils import get_mean_duration_ms
+
+
+def run_benchmark(grid_size: int, cost_count: int = 6, repeats: int = 10) -> None:
+    graph = get_grid_graph(grid_size)
+    costs = get_cost_arrays(graph, cost_count)
+    sources, targets = np.array(graph.get_edgelist()).T
+    engine = DijkstraEngine(CsrGraph(graph.vcount(), sources, targets))
+    edge_weights = [EdgeWeights(weights) for weights in costs.values()]
+    for weights in edge_weights:
+        engine.prepare_weights(weights)
+    orig, dest = 0, graph.vcount() // 2 + grid_size // 2
+    print(f'Grid graph of {graph.vcount()} nodes and {graph.ecount()} edges, {cost_count} searches per request')
+
+    def convert_weights():
+        for weights in costs.values():
+            weights.tolist()
+
+    def route_igraph():
+        for weights in costs.values():
+            graph.get_shortest_paths(orig, to=[dest], weights=weights.tolist(), output='epath')
+
+    def route_engine():
+        for weights in edge_weights:
+            engine.find_least_cost_paths(weights, orig, [dest])
+
+    print(f'Weight conversion to lists only: {get_mean_duration_ms(convert_weights, repeats)} ms / request')
+    print(f'igraph (weights converted per search): {get_mean_duration_ms(route_igraph, repeats)} ms / request')
+    print(f'DijkstraEngine (cached weight matrices): {get_mean_duration_ms(route_engine, repeats)} ms / request')
+
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,52 @@
+"""
+This benchmark compares the search times of the routing engines (see app/routing_engines.py) with and without
+restricting the searches to the search area of a maximum detour ratio (the ellipse of the nodes through which
+a path of at most the maximum length can pass) for short, medium and long trips on a synthetic grid graph.
+
+This script is intended to be run from the root of the project (src/) with the command:
+python -m benchmarks.search_area [grid size] [max detour ratio]
+
+"""
+
+import sys
+import numpy as np
+from app.csr_graph import CsrGraph
+from app.routing_engines import EdgeWeights, get_routing_engine, routing_engines
+from benchmarks.synthetic_graph import get_grid_graph, get_node_coords, get_cost_arrays, node_spacing
+from benchmarks.utils import get_mean_duration_ms
+
+
+def run_benchmark(grid_size: int, max_detour_ratio: float, repeats: int = 5) -> None:
+    graph = get_grid_graph(grid_size)
+    costs = get_cost_arrays(graph, 6)
+    sources, targets = np.array(graph.get_edgelist()).T
+    csr_graph = CsrGraph(graph.vcount(), sources, targets)
+    node_xs, node_ys = get_node_coords(grid_size)
+    engines = { name: get_routing_engine(name, csr_graph, node_xs, node_ys) for name in routing_engines }
+    edge_weights = EdgeWeights(costs['cost_5'])
+    print(f'Grid graph of {graph.vcount()} nodes and {graph.ecount()} edges')
+
+    center = grid_size // 2 * grid_size + grid_size // 2
+    for trip_nodes in (10, grid_size // 4, grid_size // 2 - 1):
+        # (horizontal trips, since the shortest paths of diagonal trips are much longer than the straight lines)
+        orig, dest = center - trip_nodes, center + trip_nodes
+        trip_km = round(2 * trip_nodes * node_spacing / 1000, 1)
+        shortest_length, _ = engines['dijkstra'].find_least_cost_paths(EdgeWeights(costs['length']), orig, [dest])[0]
+        search_area = (
+            np.hypot(node_xs - node_xs[orig], node_ys - node_ys[orig]) 
+            + np.hypot(node_xs - node_xs[dest], node_ys - node_ys[dest])
+        ) <= max_detour_ratio * shortest_length
+        for name, engine in engines.items():
+            engine.prepare_weights(edge_weights)
+            duration = get_mean_duration_ms(lambda: engine.find_least_cost_paths(edge_weights, orig, [dest]), repeats)
+            area_duration = get_mean_duration_ms(
+                lambda: engine.find_least_cost_paths(edge_weights, orig, [dest], search_area=search_area), repeats)
+            print(
+                f'{trip_km} km trip, {name}: {duration} ms, '
+                f'in search area of {round(search_area.mean() * 100, 1)} % of nodes: {area_duration} ms')
+
+
+if __name__ == '__main__':
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 300,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 1.3)
@@ -0,0 +1,53 @@
+"""
+This module creates synthetic (grid) graphs for benchmarking the routing without the real graph data.
+
+"""
+
+from typing import Dict, Tuple
+import numpy as np
+import igraph as ig
+
+
+node_spacing = 40.0
+
+
+def get_grid_graph(size: int) -> ig.Graph:
+    """Returns a directed grid graph of size x size nodes with edges in both directions between the
+    neighbouring nodes.
+    """
+    graph = ig.Graph.Lattice([size, size], circular=False)
+    graph.to_directed()
+    return graph
+
+
+def get_sparse_grid_graph(size: int, removed_ratio: float = 0.35, seed: int = 1) -> ig.Graph:
+    """Returns the largest connected part of a grid graph (of get_grid_graph()) from which the given ratio of
+    the streets (edge pairs) is removed at random. The node degrees of the graph are closer to those of a street
+    network than the degrees of the full grid graph.
+    """
+    graph = ig.Graph.Lattice([size, size], circular=False)
+    removed = np.random.default_rng(seed).uniform(size=graph.ecount()) < removed_ratio
+    graph.delete_edges(np.flatnonzero(removed).tolist())
+    graph = graph.connected_components().giant()
+    graph.to_directed()
+    return graph
+
+
+def get_node_coords(size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the x and y coordinates of the nodes of a grid graph (of get_grid_graph()).
+    """
+    nodes = np.arange(size * size)
+    return (nodes % size) * node_spacing, (nodes // size) * node_spacing
+
+
+def get_cost_arrays(graph: ig.Graph, cost_count: int, seed: int = 1) -> Dict[str, np.ndarray]:
+    """Returns random edge lengths (at least the node spacing) and exposure based costs (length + exposure 
+    cost) for the graph, similar to the costs used in routing (e.g. length and c_n_*).
+    """
+    rng = np.random.default_rng(seed)
+    lengths = np.round(node_spacing * rng.uniform(1, 1.5, graph.ecount()), 2)
+    exposures = rng.uniform(0, 1, graph.ecount())
+    costs = { 'length': lengths }
+    for sen in range(1, cost_count):
+        costs[f'cost_{sen}'] = np.round(lengths + lengths * exposures * sen, 2)
+    return costs
@@ -0,0 +1,9 @@
+import time
+from typing import Callable
+
+
+def get_mean_duration_ms(func: Callable, repeats: int) -> float:
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return round((time.perf_counter() - start_time) / repeats * 1000, 1)
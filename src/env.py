@@ -8,7 +8,7 @@ features (walking_enabled, quiet_paths_enabled etc.) to allow smaller memory usa
 """
 
 import os
-from typing import List
+from typing import List, Union
 
 graph_subset: bool = os.getenv('GRAPH_SUBSET', 'False') == 'True'
 graph_file: str = r'graphs/kumpula.graphml' if graph_subset else r'graphs/hma.graphml'
@@ -22,6 +22,50 @@ quiet_paths_enabled: bool = True    # enables/disables noise cost calculation
 clean_paths_enabled: bool = True    # enables/disables air quality cost calculation
 gvi_paths_enabled: bool = True      # enables/disables green view cost calculation
 
+# size of the thread pool (per worker) for running the least cost path searches of a request concurrently 
+# (1 = the searches are run sequentially)
+routing_threads: int = int(os.getenv('ROUTING_THREADS', str(min(os.cpu_count() or 1, 6))))
+
+# the routing engine for the least cost path searches (see app/routing_engines.py): 
+# dijkstra (default), astar (bidirectional A*), heapq (Dijkstra in Python) or igraph
+# (astar is faster than dijkstra only on short trips of about 1-2 km and several times slower on longer trips, 
+# see benchmarks/routing_engines.py)
+routing_engine: str = os.getenv('ROUTING_ENGINE', 'dijkstra')
+
+# find the green paths with the sensitivity sweep (see app/sensitivity_sweep.py): all distinct least cost paths 
+# between the lowest and the highest sensitivity instead of the paths of each sensitivity
+sensitivity_sweep: bool = os.getenv('SENSITIVITY_SWEEP', 'False') == 'True'
+
+# the maximum length of the green paths relative to the shortest path (e.g. 1.5), the green path searches are 
+# restricted to the nodes through which such paths can pass (None = no limit, can be set per request)
+max_detour_ratio: Union[float, None] = float(os.environ['MAX_DETOUR_RATIO']) if os.getenv('MAX_DETOUR_RATIO') else None
+
+# find the green paths with the Pareto search (see app/pareto_search.py): the Pareto-optimal paths by length and 
+# exposure whose length is at most max_detour_ratio (or pareto_max_detour_ratio if not set) times the shortest 
+# path (overrides the sensitivity sweep)
+pareto_search: bool = os.getenv('PARETO_SEARCH', 'False') == 'True'
+pareto_max_detour_ratio: float = 1.5
+# the least relative difference in exposure between the paths of the Pareto search (0 = all Pareto-optimal paths)
+pareto_exposure_tolerance: float = float(os.getenv('PARETO_EXPOSURE_TOLERANCE', '0.05'))
+
+# the maximum number of destinations of an OD matrix request (see app/od_matrix.py)
+od_matrix_max_destinations: int = int(os.getenv('OD_MATRIX_MAX_DESTINATIONS', '5000'))
+
+# the maximum budget (length or cost) of an isochrone request (see app/isochrone.py)
+isochrone_max_cost: float = float(os.getenv('ISOCHRONE_MAX_COST', '5000'))
+
+# the maximum number of cached snapping results of origins and destinations (per worker, 0 = no cache, see
+# app/snap_cache.py)
+snap_cache_size: int = int(os.getenv('SNAP_CACHE_SIZE', '10000'))
+
+# the number of processes (per worker) for batch routing (see app/batch_routing.py, 0 = no processes) and the 
+# maximum number of ODs of a batch routing request
+batch_routing_processes: int = int(os.getenv('BATCH_ROUTING_PROCESSES', str(min(os.cpu_count() or 1, 4))))
+batch_routing_max_ods: int = int(os.getenv('BATCH_ROUTING_MAX_ODS', '10000'))
+# the directory of the results of batch routing requests (shared by the workers) and the time (s) to keep them
+batch_routing_results_dir: str = os.getenv('BATCH_ROUTING_RESULTS_DIR', 'batch_results/')
+batch_routing_results_ttl: int = int(os.getenv('BATCH_ROUTING_RESULTS_TTL', '3600'))
+
 # the default sensitivities for exposure optimized routing can be overridden with these:
 noise_sensitivities: List[float] = []
 aq_sensitivities: List[float] = []
@@ -1,13 +1,17 @@
 import logging
 import traceback
-from flask import Flask
+from typing import List, Tuple, Union
+from flask import Flask, Response
 from flask_cors import CORS
-from flask import jsonify
+from flask import jsonify, request
 import env
 from app.aqi_map_data_api import get_aqi_map_data_api
 from app.graph_handler import GraphHandler
 from app.graph_aqi_updater import GraphAqiUpdater
 from app.path_finder import PathFinder
+from app.batch_routing import BatchOd, BatchRoutingProcess, read_batch_results
+import app.od_matrix as od_matrix
+import app.isochrone as isochrone
 from app.constants import TravelMode, RoutingMode, RoutingException, ErrorKeys
 from app.logger import Logger
 import utils.geometry as geom_utils
@@ -29,6 +33,10 @@ log = Logger(app_logger=app.logger, b_printing=False)
 # initialize graph
 G = GraphHandler(log, env.graph_file)
 
+# the batch routing process is forked from this process (with the graph) before any threads are started
+batch_routing = BatchRoutingProcess(
+    log, G, env.batch_routing_processes, env.batch_routing_results_dir, env.batch_routing_results_ttl)
+
 if env.clean_paths_enabled:
     aqi_updater = GraphAqiUpdater(log, G)
 
@@ -56,6 +64,10 @@ def aqi_map_data_status():
 def aqi_map_data():
     return aqi_map_data_api.get_data()
 
+@app.route('/snap-cache-status')
+def snap_cache_status():
+    return jsonify(G.snap_cache.get_status())
+
 @app.route('/edge-attrs-near-point/<lat>,<lon>')
 def edge_attrs_near_point(lat, lon):
     point = geom_utils.project_geom(geom_utils.get_point_from_lat_lon({'lat': float(lat), 'lon': float(lon)}))
@@ -63,24 +75,61 @@ def edge_attrs_near_point(lat, lon):
     return jsonify(G.format_edge_dict_for_debugging(edge) if edge else None)
 
 
-@app.route('/paths/<travel_mode>/<exposure_mode>/<orig_lat>,<orig_lon>/<dest_lat>,<dest_lon>')
-def get_short_quiet_paths(travel_mode, exposure_mode, orig_lat, orig_lon, dest_lat, dest_lon):
+def get_routing_modes(travel_mode: str, exposure_mode: str) -> Tuple[TravelMode, RoutingMode]:
+    """Returns the travel mode and the routing mode of the request params.
+
+    Raises:
+        RoutingException with the error key of an invalid (or unavailable) mode.
+    """
     try:
         travel_mode = TravelMode(travel_mode)
     except Exception:
-        return jsonify({'error_key': ErrorKeys.INVALID_TRAVEL_MODE_PARAM.value})
+        raise RoutingException(ErrorKeys.INVALID_TRAVEL_MODE_PARAM.value)
 
     try:
         routing_mode = RoutingMode(exposure_mode)
     except Exception:
-        return jsonify({'error_key': ErrorKeys.INVALID_EXPOSURE_MODE_PARAM.value})
+        raise RoutingException(ErrorKeys.INVALID_EXPOSURE_MODE_PARAM.value)
 
     if routing_mode == RoutingMode.CLEAN:
         if (not env.clean_paths_enabled 
                 or not aqi_updater.get_aqi_update_status_response()['aqi_data_updated']):
-            return jsonify({'error_key': ErrorKeys.NO_REAL_TIME_AQI_AVAILABLE.value})
+            raise RoutingException(ErrorKeys.NO_REAL_TIME_AQI_AVAILABLE.value)
+
+    return travel_mode, routing_mode
+
+
+def get_max_detour_ratio(max_detour_ratio: Union[str, float, None]) -> Union[float, None]:
+    """Returns the maximum detour ratio of the request params (if given).
+
+    Raises:
+        RoutingException (INVALID_DETOUR_RATIO_PARAM) if the ratio is not a number of at least 1.
+    """
+    if max_detour_ratio is None:
+        return None
+    try:
+        max_detour_ratio = float(max_detour_ratio)
+        if not max_detour_ratio >= 1:
+            raise ValueError('Maximum detour ratio must be at least 1')
+        return max_detour_ratio
+    except Exception:
+        raise RoutingException(ErrorKeys.INVALID_DETOUR_RATIO_PARAM.value)
+
+
+@app.route('/paths/<travel_mode>/<exposure_mode>/<orig_lat>,<orig_lon>/<dest_lat>,<dest_lon>')
+def get_short_quiet_paths(travel_mode, exposure_mode, orig_lat, orig_lon, dest_lat, dest_lon):
+    try:
+        travel_mode, routing_mode = get_routing_modes(travel_mode, exposure_mode)
+    except RoutingException as e:
+        return jsonify({'error_key': str(e)})
+
+    try:
+        max_detour_ratio = get_max_detour_ratio(request.args.get('max_detour_ratio'))
+    except RoutingException as e:
+        return jsonify({'error_key': str(e)})
 
-    path_finder = PathFinder(log, travel_mode, routing_mode, G, orig_lat, orig_lon, dest_lat, dest_lon)
+    path_finder = PathFinder(
+        log, travel_mode, routing_mode, G, orig_lat, orig_lon, dest_lat, dest_lon, max_detour_ratio=max_detour_ratio)
 
     try:
         path_finder.find_origin_dest_nodes()
@@ -96,9 +145,122 @@ def get_short_quiet_paths(travel_mode, exposure_mode, orig_lat, orig_lon, dest_l
         log.error(traceback.format_exc())
         return jsonify({'error_key': ErrorKeys.UNKNOWN_ERROR.value})
 
-    finally:
-        path_finder.delete_added_graph_features()
-        G.reset_edge_cache()
+
+@app.route('/paths/batch', methods=['POST'])
+def get_batch_paths():
+    """Queues the ODs of the request body, e.g. { "ods": [{ "orig": [60.2120, 24.9686], "dest": [60.2015, 24.9612],
+    "travel_mode": "walk", "exposure_mode": "quiet" }] } (max_detour_ratio is optional), to the batch routing 
+    process (see app/batch_routing.py) and returns the id of the batch (batch_id) for getting the results.
+    """
+    try:
+        od_params = request.get_json(force=True)['ods']
+        if not 0 < len(od_params) <= env.batch_routing_max_ods:
+            raise ValueError(f'Invalid number of ODs: {len(od_params)}')
+    except Exception:
+        return jsonify({'error_key': ErrorKeys.INVALID_OD_PARAM.value})
+
+    ods: List[BatchOd] = []
+    errors: List[dict] = []
+    for idx, params in enumerate(od_params):
+        try:
+            if not isinstance(params, dict):
+                raise RoutingException(ErrorKeys.INVALID_OD_PARAM.value)
+            travel_mode, routing_mode = get_routing_modes(params.get('travel_mode'), params.get('exposure_mode'))
+            max_detour_ratio = get_max_detour_ratio(params.get('max_detour_ratio'))
+            try:
+                orig, dest = ((float(coords[0]), float(coords[1])) for coords in (params['orig'], params['dest']))
+            except Exception:
+                raise RoutingException(ErrorKeys.INVALID_OD_PARAM.value)
+            ods.append(BatchOd(idx, travel_mode, routing_mode, orig, dest, max_detour_ratio))
+        except RoutingException as e:
+            errors.append({ 'idx': idx, 'error_key': str(e) })
+
+    batch_id = batch_routing.submit(ods, errors, G.get_aqi_generation().aqi_data)
+    return jsonify({ 'batch_id': batch_id })
+
+
+@app.route('/paths/batch/<batch_id>')
+def get_batch_paths_results(batch_id):
+    """Returns the results of a batch that are completed so far as NDJSON in the order of completion (from the
+    result of the index given as query parameter offset, e.g. ?offset=100): either the path_FC or the error_key
+    of an OD with the index of the OD (idx). Header X-Batch-Done tells whether all results are returned.
+    """
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    batch_results = read_batch_results(env.batch_routing_results_dir, batch_id, offset)
+    if batch_results is None:
+        return jsonify({'error_key': ErrorKeys.BATCH_NOT_FOUND.value})
+    lines, done = batch_results
+    return Response(
+        ''.join(line + '\n' for line in lines), mimetype='application/x-ndjson', 
+        headers={ 'X-Batch-Done': str(done).lower() })
+
+
+@app.route('/od-matrix/<travel_mode>/<exposure_mode>/<orig_lat>,<orig_lon>', methods=['POST'])
+def get_od_matrix_exposures(travel_mode, exposure_mode, orig_lat, orig_lon):
+    """Returns the lengths and exposures of the paths from the origin to the destinations of the request body, 
+    e.g. { "destinations": [[60.2037, 24.9653], [60.2118, 24.9595]] } (see app/od_matrix.py).
+    """
+    try:
+        travel_mode, routing_mode = get_routing_modes(travel_mode, exposure_mode)
+    except RoutingException as e:
+        return jsonify({'error_key': str(e)})
+
+    try:
+        destinations = request.get_json(force=True)['destinations']
+        dest_coords = [(float(lat), float(lon)) for lat, lon in destinations]
+        if not 0 < len(dest_coords) <= env.od_matrix_max_destinations:
+            raise ValueError(f'Invalid number of destinations: {len(dest_coords)}')
+    except Exception:
+        return jsonify({'error_key': ErrorKeys.INVALID_DESTINATIONS_PARAM.value})
+
+    try:
+        dest_exposures = od_matrix.get_od_matrix(
+            log, G, travel_mode, routing_mode, (float(orig_lat), float(orig_lon)), dest_coords)
+        return jsonify({ 'destinations': dest_exposures })
+
+    except RoutingException as e:
+        log.error(traceback.format_exc())
+        return jsonify({'error_key': str(e)})
+
+    except Exception:
+        log.error(traceback.format_exc())
+        return jsonify({'error_key': ErrorKeys.UNKNOWN_ERROR.value})
+
+
+@app.route('/isochrone/<travel_mode>/<exposure_mode>/<orig_lat>,<orig_lon>/<budget>', methods=['GET'])
+def get_isochrone(travel_mode, exposure_mode, orig_lat, orig_lon, budget):
+    """Returns the edges and nodes reachable from the origin within the budget by length, or by the costs of
+    the sensitivity given as query parameter (e.g. ?sensitivity=3.5) (see app/isochrone.py).
+    """
+    try:
+        travel_mode, routing_mode = get_routing_modes(travel_mode, exposure_mode)
+    except RoutingException as e:
+        return jsonify({'error_key': str(e)})
+
+    try:
+        max_cost = float(budget)
+        if not 0 < max_cost <= env.isochrone_max_cost:
+            raise ValueError(f'Invalid budget: {budget}')
+    except Exception:
+        return jsonify({'error_key': ErrorKeys.INVALID_BUDGET_PARAM.value})
+
+    try:
+        sensitivity = request.args.get('sensitivity')
+        sensitivity = float(sensitivity) if sensitivity is not None else None
+    except Exception:
+        return jsonify({'error_key': ErrorKeys.INVALID_SENSITIVITY_PARAM.value})
+
+    try:
+        return jsonify(isochrone.get_isochrone(
+            log, G, travel_mode, routing_mode, (float(orig_lat), float(orig_lon)), max_cost, sensitivity))
+
+    except RoutingException as e:
+        log.error(traceback.format_exc())
+        return jsonify({'error_key': str(e)})
+
+    except Exception:
+        log.error(traceback.format_exc())
+        return jsonify({'error_key': ErrorKeys.UNKNOWN_ERROR.value})
 
 
 if __name__ == '__main__':
@@ -1,10 +1,14 @@
-from typing import Dict, Union, Tuple, Callable
+from typing import Dict, NamedTuple, Union, Tuple, Callable
 from unittest.mock import patch
 import pytest
 import json
 import time
+import numpy as np
+import igraph as ig
 from utils.geometry import project_geom
 from shapely.geometry import LineString
+from app.csr_graph import CsrGraph
+from benchmarks.synthetic_graph import get_grid_graph, get_node_coords, get_cost_arrays, node_spacing
 
 
 __noise_sensitivities = [ 0.1, 0.4, 1.3, 3.5, 6 ]
@@ -77,3 +81,46 @@ def test_exposure_prop_types() -> Callable[[dict, Union[float, None]], None]:
             diff = val_sum - expected_sum
             assert abs(diff) <= 0.015 # consider rounding
     return test_func
+
+
+class GridGraph(NamedTuple):
+    graph: ig.Graph
+    csr_graph: CsrGraph
+    node_xs: np.ndarray
+    node_ys: np.ndarray
+    lengths: np.ndarray
+    exposures: np.ndarray
+    costs: Dict[str, np.ndarray]
+
+
+@pytest.fixture(scope='session')
+def get_grid() -> Callable[..., GridGraph]:
+    """Returns a function that creates a synthetic grid graph (see benchmarks/synthetic_graph.py) with random
+    lengths and exposures for testing the routing algorithms without the graph data. The costs are the lengths
+    (length) and the exposure based costs (cost = length + 5 x exposure).
+
+    Args (of the function):
+        parallel_edges: Add parallel edges of higher (0 -> 1) and lower (1 -> 2) cost than the original edges.
+        isolated_node: Add a node without edges (as the last node).
+    """
+    def get_test_grid(size: int, seed: int, parallel_edges: bool = False, isolated_node: bool = False) -> GridGraph:
+        graph = get_grid_graph(size)
+        if parallel_edges:
+            graph.add_edges([(0, 1), (1, 2)])
+        cost_arrays = get_cost_arrays(graph, 2, seed=seed)
+        lengths = cost_arrays['length']
+        exposures = np.round(cost_arrays['cost_1'] - lengths, 2)
+        if parallel_edges:
+            lengths[-2], lengths[-1] = 1000.0, node_spacing
+            exposures[-2:] = 0.0
+        node_xs, node_ys = get_node_coords(size)
+        if isolated_node:
+            graph.add_vertices(1)
+            node_xs, node_ys = np.append(node_xs, 0.0), np.append(node_ys, size * node_spacing)
+        sources, targets = np.array(graph.get_edgelist()).T
+        return GridGraph(
+            graph, CsrGraph(graph.vcount(), sources, targets), node_xs, node_ys, lengths, exposures,
+            { 'length': lengths, 'cost': np.round(lengths + 5 * exposures, 2) }
+        )
+
+    return get_test_grid
@@ -23,6 +23,15 @@ def test_aq_routing_available(client):
     assert status['aqi_data_utc_time_secs'] == 1603634400 
 
 
+def test_snap_cache_status_path(client):
+    response = client.get('/snap-cache-status')
+    assert response.status_code == 200
+    status = json.loads(response.data)
+    assert status['max_size'] > 0
+    assert 'hits' in status
+    assert 'misses' in status
+
+
 def test_aqi_map_data_status_path(client):
     response = client.get('/aqi-map-data-status')
     assert response.status_code == 200
@@ -0,0 +1,77 @@
+import json
+import time
+
+
+ods = [
+    { 'orig': [60.212031, 24.968584], 'dest': [60.201520, 24.961191], 'travel_mode': 'walk', 'exposure_mode': 'quiet' },
+    { 'orig': [60.21743, 24.96996], 'dest': [60.2123, 24.95978], 'travel_mode': 'bike', 'exposure_mode': 'green',
+        'max_detour_ratio': 1.3 },
+    { 'orig': [60.21743, 24.96996], 'dest': [60.21743, 24.96996], 'travel_mode': 'walk', 'exposure_mode': 'quiet' },
+    { 'orig': [60.21743, 24.96996], 'dest': [60.2123, 24.95978], 'travel_mode': 'run', 'exposure_mode': 'quiet' }
+]
+
+
+def get_batch_results(client, batch_id: str) -> list:
+    """Polls the results of a batch until it is done."""
+    results = []
+    for _ in range(600):
+        response = client.get(f'/paths/batch/{batch_id}?offset={len(results)}')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        results += [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        if response.headers['X-Batch-Done'] == 'true':
+            return results
+        time.sleep(0.1)
+    raise TimeoutError(f'Batch {batch_id} was not done')
+
+
+def post_batch(client, ods: list) -> list:
+    response = client.post('/paths/batch', json={ 'ods': ods })
+    assert response.status_code == 200
+    return get_batch_results(client, json.loads(response.data)['batch_id'])
+
+
+def test_batch_paths_are_returned_as_ndjson(client):
+    results = post_batch(client, ods)
+    assert sorted(result['idx'] for result in results) == [0, 1, 2, 3]
+    results = { result['idx']: result for result in results }
+    for idx in (0, 1):
+        features = results[idx]['path_FC']['features']
+        assert len(features) > 1
+        assert features[0]['properties']['type'] == 'short'
+    assert results[2]['error_key'] == 'od_are_same_location'
+    assert results[3]['error_key'] == 'invalid_travel_mode_in_request_params'
+
+
+def test_batch_paths_equal_paths(client):
+    od = ods[0]
+    response = client.get(f'/paths/walk/quiet/{od["orig"][0]},{od["orig"][1]}/{od["dest"][0]},{od["dest"][1]}')
+    path_FC = json.loads(response.data)['path_FC']
+    assert post_batch(client, [od])[0]['path_FC'] == path_FC
+
+
+def test_batch_paths_without_ods(client):
+    response = client.post('/paths/batch', json={ 'ods': [] })
+    assert json.loads(response.data)['error_key'] == 'invalid_od_in_request_params'
+
+
+def test_batch_paths_with_invalid_od_item(client):
+    results = { result['idx']: result for result in post_batch(client, [ods[0], 5]) }
+    assert results[1]['error_key'] == 'invalid_od_in_request_params'
+    assert 'path_FC' in results[0]
+
+
+def test_batch_results_are_returned_from_offset(client):
+    response = client.post('/paths/batch', json={ 'ods': ods })
+    batch_id = json.loads(response.data)['batch_id']
+    results = get_batch_results(client, batch_id)
+    response = client.get(f'/paths/batch/{batch_id}?offset=2')
+    assert response.headers['X-Batch-Done'] == 'true'
+    assert [json.loads(line) for line in response.get_data(as_text=True).splitlines()] == results[2:]
+
+
+def test_unknown_batch_is_not_found(client):
+    response = client.get(f'/paths/batch/{"0" * 32}')
+    assert json.loads(response.data)['error_key'] == 'batch_not_found'
+    response = client.get('/paths/batch/invalid')
+    assert json.loads(response.data)['error_key'] == 'batch_not_found'
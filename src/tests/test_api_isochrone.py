@@ -0,0 +1,47 @@
+import json
+import pytest
+
+
+orig = '60.212031,24.968584'
+
+
+@pytest.fixture
+def isochrone(client) -> dict:
+    response = client.get(f'/isochrone/walk/quiet/{orig}/600')
+    assert response.status_code == 200
+    yield json.loads(response.data)
+
+
+def test_isochrone_has_reached_edges_and_nodes(isochrone):
+    edges = isochrone['edge_FC']['features']
+    nodes = isochrone['node_FC']['features']
+    assert len(edges) > 10 and len(nodes) > 10
+    assert all(0 < edge['properties']['share'] <= 1 for edge in edges)
+    assert any(edge['properties']['share'] < 1 for edge in edges)
+    for node in nodes:
+        props = node['properties']
+        assert props['cost'] <= 600
+        assert props['length'] == pytest.approx(props['cost'], abs=0.01)
+
+
+def test_isochrone_exposures_equal_od_matrix_exposures(client, isochrone):
+    nodes = [node for node in isochrone['node_FC']['features'] if node['properties']['cost'] > 300][:5]
+    destinations = [node['geometry']['coordinates'][::-1] for node in nodes]
+    response = client.post(f'/od-matrix/walk/quiet/{orig}', json={ 'destinations': destinations })
+    for node, dest in zip(nodes, json.loads(response.data)['destinations']):
+        assert node['properties']['length'] == pytest.approx(dest['paths']['short']['length'], abs=0.01)
+        assert node['properties']['nei'] == pytest.approx(dest['paths']['short']['nei'], abs=0.2)
+
+
+def test_isochrone_by_costs_of_sensitivity(client):
+    response = client.get(f'/isochrone/walk/quiet/{orig}/600?sensitivity=3.5')
+    nodes = json.loads(response.data)['node_FC']['features']
+    assert nodes
+    assert all(node['properties']['cost'] >= node['properties']['length'] - 0.01 for node in nodes)
+
+
+def test_isochrone_with_invalid_params(client):
+    response = client.get(f'/isochrone/walk/quiet/{orig}/600?sensitivity=0.7')
+    assert json.loads(response.data)['error_key'] == 'invalid_sensitivity_in_request_params'
+    response = client.get(f'/isochrone/walk/quiet/{orig}/-1')
+    assert json.loads(response.data)['error_key'] == 'invalid_budget_in_request_params'
@@ -0,0 +1,60 @@
+import json
+import pytest
+from app.types import PathEdge
+from app.od_matrix import get_path_exposures
+
+
+orig = '60.212031,24.968584'
+destinations = [[60.201520, 24.961191], [60.2123, 24.95978], [60.2118, 24.95952]]
+
+
+@pytest.fixture
+def od_matrix(client) -> dict:
+    response = client.post(f'/od-matrix/walk/quiet/{orig}', json={ 'destinations': destinations })
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert len(data['destinations']) == len(destinations)
+    yield data['destinations']
+
+
+def test_od_matrix_has_exposures_of_all_paths(od_matrix):
+    for dest in od_matrix:
+        paths = dest['paths']
+        assert 'short' in paths
+        assert 'c_n_0.1' in paths
+        for path in paths.values():
+            assert isinstance(path['length'], (float, int))
+            assert isinstance(path['nei'], (float, int))
+            assert isinstance(path['gvi_m'], (float, int))
+
+
+def test_od_matrix_exposures_equal_path_exposures(client, od_matrix):
+    dest = destinations[0]
+    response = client.get(f'/paths/walk/quiet/{orig}/{dest[0]},{dest[1]}')
+    short_path = [
+        feat['properties'] for feat in json.loads(response.data)['path_FC']['features']
+        if feat['properties']['id'] == 'short'
+    ][0]
+    paths = od_matrix[0]['paths']
+    assert paths['short']['length'] == pytest.approx(short_path['length'], abs=0.01)
+    assert paths['short']['nei'] == pytest.approx(short_path['nei'], abs=0.1)
+    assert paths['short']['gvi_m'] == pytest.approx(short_path['gvi_m'], abs=0.01)
+    assert all(path['length'] >= paths['short']['length'] - 0.01 for path in paths.values())
+
+
+def test_od_matrix_with_invalid_destinations(client):
+    response = client.post(f'/od-matrix/walk/quiet/{orig}', json={ 'destinations': [[60.2, 'x']] })
+    assert response.status_code == 200
+    assert json.loads(response.data)['error_key'] == 'invalid_destinations_in_request_params'
+
+
+def test_path_with_invalid_aqi_has_no_aqc():
+    edges = [
+        PathEdge(id=idx, length=10.0, length_b=10.0, aqi=aqi, aqi_cl=None, noises={ 55: 10.0 }, gvi=0.5, gvi_cl=None,
+            coords=[], coords_wgs=[])
+        for idx, aqi in enumerate((1.5, 0.5))
+    ]
+    exposures = get_path_exposures(edges, { 55: 0.1 })
+    assert exposures['aqc'] is None
+    assert exposures['length'] == 20.0
+    assert get_path_exposures(edges[:1], { 55: 0.1 })['aqc'] is not None
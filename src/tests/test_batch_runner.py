@@ -0,0 +1,117 @@
+import os
+import json
+import pytest
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import LineString
+import app.batch_runner as batch_runner
+from app.batch_runner import BatchOutput, get_chunk_gdf, path_columns
+from app.logger import Logger
+
+
+run_args = { 'ods_file': 'ods.csv', 'od_count': 4, 'chunk_size': 2 }
+
+
+def get_rows(od_ids: list) -> list:
+    return [
+        { 'od_id': od_ids[0], 'type': 'short', 'id': 'short', 'length': 12.5, 'missing_aqi': True,
+            'noises': json.dumps({ '55': 12.5 }), 'geometry': LineString([(0, 0), (12.5, 0)]) },
+        { 'od_id': od_ids[1], 'error_key': 'od_are_same_location', 'geometry': None }
+    ]
+
+
+def test_chunk_rows_have_all_output_columns():
+    gdf = get_chunk_gdf(get_rows([0, 1]), 3)
+    assert list(gdf.columns) == [*path_columns, 'geometry']
+    assert list(gdf['chunk']) == [3, 3]
+    assert list(gdf['od_id']) == ['0', '1']
+    assert gdf.crs.to_epsg() == 3879
+
+
+def test_gpkg_output_continues_from_checkpoint(tmp_path):
+    output = str(tmp_path / 'paths.gpkg')
+    batch_output = BatchOutput(output, run_args)
+    assert batch_output.get_done_chunks() == 0
+    batch_output.write_chunk(get_chunk_gdf(get_rows(['a', 'b']), 0), 0)
+    batch_output.write_chunk(get_chunk_gdf(get_rows(['c', 'd']), 1), 1)
+    assert list(gpd.read_file(output, layer='paths')['od_id']) == ['a', 'b', 'c', 'd']
+
+    # e.g. the run was interrupted before the checkpoint of the second chunk was saved
+    with open(output + '.checkpoint.json', 'w') as f:
+        json.dump({ 'run_args': run_args, 'done_chunks': 1 }, f)
+    assert BatchOutput(output, run_args).get_done_chunks() == 1
+    assert list(gpd.read_file(output, layer='paths')['od_id']) == ['a', 'b']
+
+
+def test_output_is_not_continued_with_other_args(tmp_path):
+    output = str(tmp_path / 'paths.gpkg')
+    BatchOutput(output, run_args).write_chunk(get_chunk_gdf(get_rows(['a', 'b']), 0), 0)
+    with pytest.raises(ValueError):
+        BatchOutput(output, { **run_args, 'chunk_size': 3 }).get_done_chunks()
+
+
+def test_output_is_not_overwritten_without_checkpoint(tmp_path):
+    output = str(tmp_path / 'paths.gpkg')
+    open(output, 'w').close()
+    with pytest.raises(ValueError):
+        BatchOutput(output, run_args).get_done_chunks()
+
+
+class Interrupted(Exception):
+    pass
+
+
+def read_output(output: str) -> gpd.GeoDataFrame:
+    if output.endswith('.gpkg'):
+        return gpd.read_file(output, layer='paths')
+    return pd.concat(
+        [gpd.read_parquet(os.path.join(output, part_file)) for part_file in sorted(os.listdir(output))],
+        ignore_index=True)
+
+
+@pytest.mark.parametrize('output_file', ['paths.gpkg', 'paths.parquet'])
+@pytest.mark.parametrize('interrupted', ['routing', 'checkpoint'])
+def test_interrupted_run_continues_without_duplicate_or_missing_rows(tmp_path, monkeypatch, output_file, interrupted):
+    if output_file.endswith('.parquet'):
+        pytest.importorskip('pyarrow')
+    ods_file = str(tmp_path / 'ods.csv')
+    output = str(tmp_path / output_file)
+    pd.DataFrame({
+        'id': [f'od{i}' for i in range(5)], 'orig_lat': 60.2, 'orig_lon': 24.96, 'dest_lat': 60.21, 'dest_lon': 24.97
+    }).to_csv(ods_file, index=False)
+    routed_chunks = []
+    first_run = [True]
+
+    def get_chunk_rows(G, router, ods, max_detour_ratio, with_edge_ids):
+        # the second chunk is interrupted while routing (or after its rows are written) in the first run
+        chunk = ods.index[0] // 2
+        if interrupted == 'routing' and first_run[0] and routed_chunks == [0]:
+            raise Interrupted
+        routed_chunks.append(chunk)
+        return [
+            { 'od_id': od_id, 'type': path_type, 'id': path_type, 'length': 10.0,
+                'geometry': LineString([(0, 0), (10.0, 0)]) }
+            for od_id in ods['id'] for path_type in ('short', 'quiet')
+        ]
+
+    replace = os.replace
+    def replace_checkpoint(src, dst):
+        if interrupted == 'checkpoint' and first_run[0] and routed_chunks == [0, 1]:
+            raise Interrupted
+        replace(src, dst)
+
+    monkeypatch.setattr(batch_runner, 'GraphHandler', lambda log, graph_file: None)
+    monkeypatch.setattr(batch_runner, 'BatchRouter', lambda log, G, processes: None)
+    monkeypatch.setattr(batch_runner, 'get_chunk_rows', get_chunk_rows)
+    monkeypatch.setattr(batch_runner.os, 'replace', replace_checkpoint)
+    with pytest.raises(Interrupted):
+        batch_runner.run_batch(Logger(), 'graph.graphml', ods_file, output, 0, 2)
+    assert list(read_output(output)['chunk'].unique()) == ([0, 1] if interrupted == 'checkpoint' else [0])
+
+    first_run[0] = False
+    batch_runner.run_batch(Logger(), 'graph.graphml', ods_file, output, 0, 2)
+    assert routed_chunks == ([0, 1, 1, 2] if interrupted == 'checkpoint' else [0, 1, 2])
+    gdf = read_output(output)
+    assert list(gdf['od_id']) == [f'od{i}' for i in range(5) for _ in range(2)]
+    assert list(gdf['type']) == ['short', 'quiet'] * 5
+    assert list(gdf['chunk']) == [0, 0, 0, 0, 1, 1, 1, 1, 2, 2]
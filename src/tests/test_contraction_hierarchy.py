@@ -0,0 +1,82 @@
+import pytest
+import numpy as np
+from app.logger import Logger
+from app.routing_engines import EdgeWeights, get_routing_engine
+from app.contraction_hierarchy import ContractionHierarchy, get_ch_file
+
+
+@pytest.fixture(scope='module')
+def grid(get_grid):
+    grid = get_grid(20, 42, parallel_edges=True)
+    yield grid.graph, grid.lengths
+
+
+@pytest.fixture(scope='module')
+def length_ch(grid):
+    graph, lengths = grid
+    sources, targets = np.array(graph.get_edgelist()).T
+    yield ContractionHierarchy.build(Logger(b_printing=False), graph.vcount(), sources, targets, lengths)
+
+
+def test_ch_file_is_next_to_graph_file():
+    assert get_ch_file('graphs/hma.graphml') == 'graphs/hma.length.ch.npz'
+    assert get_ch_file('graphs/hma.bundle/') == 'graphs/hma.length.ch.npz'
+
+
+def test_shortest_paths_equal_igraph_shortest_paths(grid, length_ch):
+    graph, lengths = grid
+    targets = list(range(0, graph.vcount(), 7))
+    for source in (0, 5, 210, 399):
+        paths = length_ch.find_least_cost_paths(source, targets)
+        ig_paths = graph.get_shortest_paths(source, to=targets, weights=lengths.tolist(), output='epath')
+        for target, (cost, epath), ig_epath in zip(targets, paths, ig_paths):
+            assert cost == pytest.approx(lengths[ig_epath].sum())
+            assert epath == ig_epath
+            assert graph.es[epath[0]].source == source if epath else target == source
+    assert length_ch.find_least_cost_paths(0, [2])[0][1] == [0, graph.ecount() - 1]
+
+
+@pytest.mark.parametrize('size,seed', [(6, 1), (15, 7), (25, 3)])
+@pytest.mark.parametrize('weight', ['length', 'cost'])
+def test_least_costs_equal_dijkstra_least_costs(get_grid, size, seed, weight):
+    grid = get_grid(size, seed, isolated_node=True)
+    weights = grid.costs[weight].copy()
+    # edges with missing weights (e.g. closed edges) are excluded from the hierarchy
+    weights[np.random.default_rng(seed).uniform(size=len(weights)) < 0.1] = np.nan
+    sources, targets = np.array(grid.graph.get_edgelist()).T
+    ch = ContractionHierarchy.build(Logger(b_printing=False), grid.graph.vcount(), sources, targets, weights)
+    engine = get_routing_engine('dijkstra', grid.csr_graph, grid.node_xs, grid.node_ys)
+    edge_weights = EdgeWeights(weights)
+    nodes = [int(node) for node in np.random.default_rng(seed).choice(grid.graph.vcount() - 1, 8, replace=False)]
+    nodes.append(grid.graph.vcount() - 1)
+    for source in nodes:
+        for path, dijkstra_path in zip(
+            ch.find_least_cost_paths(source, nodes), engine.find_least_cost_paths(edge_weights, source, nodes)
+        ):
+            if dijkstra_path is None:
+                assert path is None
+                continue
+            cost, epath = path
+            assert cost == pytest.approx(dijkstra_path[0])
+            assert weights[epath].sum() == pytest.approx(cost)
+
+
+def test_reverse_shortest_paths(grid, length_ch):
+    graph, lengths = grid
+    sources = [0, 45, 210]
+    paths = length_ch.find_least_cost_paths(399, sources, reverse=True)
+    for source, (cost, epath) in zip(sources, paths):
+        assert epath == graph.get_shortest_paths(source, to=399, weights=lengths.tolist(), output='epath')[0]
+
+
+def test_saved_ch_is_valid_only_for_the_same_graph(grid, length_ch, tmp_path):
+    graph, lengths = grid
+    ch_file = str(tmp_path / 'grid.length.ch.npz')
+    length_ch.save(ch_file)
+    loaded_ch = ContractionHierarchy.load(ch_file)
+    assert loaded_ch.is_valid_for(graph.vcount(), lengths)
+    assert loaded_ch.find_least_cost_paths(0, [399, 20]) == length_ch.find_least_cost_paths(0, [399, 20])
+    changed_lengths = lengths.copy()
+    changed_lengths[10] += 1
+    assert not loaded_ch.is_valid_for(graph.vcount(), changed_lengths)
+    assert not loaded_ch.is_valid_for(graph.vcount() + 1, lengths)
@@ -0,0 +1,131 @@
+import os
+import json
+import pytest
+import numpy as np
+from unittest.mock import patch
+from shapely.geometry import LineString
+import utils.igraph as ig_utils
+import utils.graph_bundle as graph_bundle
+from utils.igraph import Edge as E, Node as N
+from app.logger import Logger
+from app.graph_handler import GraphHandler, get_graph_config_hash
+from app.graph_compiler import compile_graph
+from app.types import AqiGeneration
+from app.constants import TravelMode, RoutingMode, cost_prefix_dict
+import app.aq_exposures as aq_exps
+
+
+@pytest.fixture(scope='module')
+def graph():
+    yield ig_utils.read_graphml(r'graphs/kumpula.graphml')
+
+
+@pytest.fixture(scope='module')
+def bundle_graph(graph, tmp_path_factory):
+    bundle_dir = str(tmp_path_factory.mktemp('graphs') / 'kumpula.bundle')
+    graph_bundle.export_graph_bundle(graph, bundle_dir)
+    assert graph_bundle.is_graph_bundle(bundle_dir)
+    yield graph_bundle.read_graph_bundle(bundle_dir)
+
+
+def test_bundle_topology(graph, bundle_graph):
+    assert bundle_graph.vcount() == graph.vcount()
+    assert bundle_graph.ecount() == graph.ecount()
+    assert bundle_graph.is_directed() == graph.is_directed()
+    assert bundle_graph.get_edgelist() == graph.get_edgelist()
+
+
+def test_bundle_attribute_names(graph, bundle_graph):
+    assert sorted(bundle_graph.vs.attribute_names()) == sorted(graph.vs.attribute_names())
+    assert sorted(bundle_graph.es.attribute_names()) == sorted(graph.es.attribute_names())
+
+
+def test_bundle_edge_attributes(graph, bundle_graph):
+    for attr in [E.id_ig, E.id_way, E.uv, E.length, E.length_b, E.noises, E.gvi]:
+        assert bundle_graph.es[attr.value] == graph.es[attr.value]
+
+
+def test_bundle_edge_geometries(graph, bundle_graph):
+    for geom, bundle_geom in zip(graph.es[E.geometry.value], bundle_graph.es[E.geometry.value]):
+        assert type(geom) == type(bundle_geom)
+        if isinstance(geom, LineString):
+            assert list(geom.coords) == list(bundle_geom.coords)
+
+
+def test_bundle_node_geometries(graph, bundle_graph):
+    for point, bundle_point in zip(graph.vs[N.geometry.value], bundle_graph.vs[N.geometry.value]):
+        assert point.coords[0] == bundle_point.coords[0]
+
+
+@pytest.fixture(scope='module')
+def compiled_graph_dir(tmp_path_factory):
+    compiled_dir = str(tmp_path_factory.mktemp('graphs') / 'kumpula.compiled')
+    compile_graph(Logger(b_printing=False), r'graphs/kumpula.graphml', compiled_dir)
+    yield compiled_dir
+
+
+def test_compiled_graph_metadata(compiled_graph_dir):
+    manifest = graph_bundle.read_bundle_manifest(compiled_graph_dir)
+    assert manifest['metadata']['config_hash'] == get_graph_config_hash()
+    assert 'edge_gdf_ids' in manifest['arrays']
+
+
+def test_compiled_graph_costs(compiled_graph_dir):
+    log = Logger(b_printing=False)
+    G = GraphHandler(log, r'graphs/kumpula.graphml')
+    G_compiled = GraphHandler(log, compiled_graph_dir)
+    cost_attrs = [attr for attr in G.get_edge_attrs_by_id(0) if attr.startswith('c_')]
+    assert cost_attrs
+    for attr in cost_attrs:
+        np.testing.assert_array_equal(G_compiled.get_edge_array(attr), G.get_edge_array(attr))
+    assert G_compiled.graph.es[E.noises.value] == G.graph.es[E.noises.value]
+
+
+def test_compiled_graph_edge_arrays_are_memory_mapped(compiled_graph_dir):
+    G_compiled = GraphHandler(Logger(b_printing=False), compiled_graph_dir)
+    assert isinstance(G_compiled.get_edge_array(E.length.value), np.memmap)
+    assert not G_compiled.get_edge_array(E.length.value).flags.writeable
+    assert E.length.value not in G_compiled.graph.es.attribute_names()
+
+
+def test_compiled_graph_aqi_generations_are_read_only(compiled_graph_dir):
+    G_compiled = GraphHandler(Logger(b_printing=False), compiled_graph_dir)
+    prev_generation = G_compiled.get_aqi_generation()
+    assert not G_compiled.get_edge_array(E.aqi.value).flags.writeable
+    # AQI and AQ costs are updated by publishing a new generation, not by writing the columns in place
+    aq_cost_attr = cost_prefix_dict[TravelMode.WALK][RoutingMode.CLEAN] + str(aq_exps.get_aq_sensitivities()[0])
+    edge_arrays = {
+        E.aqi.value: np.full(G_compiled.ecount, 1.5),
+        aq_cost_attr: np.asarray(G_compiled.get_edge_array(E.length.value)) * 2
+    }
+    G_compiled.publish_aqi_generation(AqiGeneration('aqi_2020-10-25T14.csv', None, edge_arrays))
+    for attr, arr in edge_arrays.items():
+        assert not arr.flags.writeable
+        assert G_compiled.get_edge_array(attr) is arr
+    assert np.isnan(G_compiled.get_edge_array(E.aqi.value, prev_generation)).all()
+    assert aq_cost_attr not in prev_generation.edge_arrays
+
+
+def test_stale_compiled_graph_costs(compiled_graph_dir):
+    with patch('env.noise_sensitivities', [0.1, 2]):
+        assert get_graph_config_hash() != graph_bundle.read_bundle_manifest(compiled_graph_dir)['metadata']['config_hash']
+        G_compiled = GraphHandler(Logger(b_printing=False), compiled_graph_dir)
+        assert 'c_n_2' in G_compiled.get_edge_attrs_by_id(0)
+        # the costs of the sensitivities of the stale configuration are not loaded
+        assert 'c_n_0.4' not in G_compiled.get_edge_attrs_by_id(0)
+        with pytest.raises(KeyError):
+            G_compiled.get_edge_array('c_n_0.4')
+
+
+def test_bundle_without_metadata_is_not_compiled(graph, tmp_path):
+    # bundles exported before the metadata was added to the manifest
+    bundle_dir = str(tmp_path / 'kumpula.bundle')
+    graph_bundle.export_graph_bundle(graph, bundle_dir)
+    manifest_file = os.path.join(bundle_dir, graph_bundle.manifest_file)
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    del manifest['metadata']
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f)
+    G = GraphHandler(Logger(b_printing=False), bundle_dir)
+    assert 'c_n_0.1' in G.get_edge_attrs_by_id(0)
@@ -0,0 +1,85 @@
+import pytest
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from app.logger import Logger
+from app.graph_handler import GraphHandler
+from app.path_finder import PathFinder
+from app.constants import TravelMode, RoutingMode
+import app.noise_exposures as noise_exps
+import app.aq_exposures as aq_exps
+from utils.igraph import Edge as E
+
+
+@pytest.fixture(scope='module')
+def log():
+    yield Logger(b_printing=False)
+
+
+@pytest.fixture(scope='module')
+def graph_handler(log):
+    with patch('env.test_mode', True):
+        yield GraphHandler(log, r'graphs/kumpula.graphml')
+
+
+def test_routing_does_not_modify_graph(log, graph_handler):
+    ecount, vcount = graph_handler.graph.ecount(), graph_handler.graph.vcount()
+    path_finder = PathFinder(
+        log, TravelMode.WALK, RoutingMode.QUIET, graph_handler, 60.212031, 24.968584, 60.201520, 24.961191)
+    path_finder.find_origin_dest_nodes()
+    path_finder.find_least_cost_paths()
+    path_FC, _ = path_finder.process_paths_to_FC()
+    assert path_FC['features']
+    assert graph_handler.graph.ecount() == ecount
+    assert graph_handler.graph.vcount() == vcount
+
+
+def test_least_cost_path_from_virtual_origin_to_virtual_destination(graph_handler):
+    orig_edge = graph_handler.get_edge_attrs_by_id(0)
+    dest_edge = graph_handler.get_edge_attrs_by_id(graph_handler.graph.ecount() // 2)
+    overlay = graph_handler.create_overlay()
+    od_nodes = []
+    for edge, origin in ((orig_edge, True), (dest_edge, False)):
+        split_point = edge[E.geometry.value].interpolate(0.5, normalized=True)
+        node = overlay.add_node(split_point)
+        graph_handler.create_linking_edges_for_new_node(
+            overlay, node, split_point, edge, aq_exps.get_aq_sensitivities(),
+            noise_exps.get_noise_sensitivities(), graph_handler.db_costs, origin)
+        od_nodes.append(node)
+    orig_node, dest_node = od_nodes
+    assert min(overlay.nodes) == graph_handler.graph.vcount()
+    assert min(overlay.edges) == graph_handler.graph.ecount()
+
+    path = graph_handler.get_least_cost_path(orig_node, dest_node, weight=E.length.value, overlay=overlay)
+    # the path starts and ends with virtual linking edges and is continuous
+    assert path[0] in overlay.get_out_edges(orig_node)
+    assert path[-1] in overlay.get_in_edges(dest_node)
+    edge_uvs = [graph_handler.get_edge_attrs_by_id(edge_id, overlay)[E.uv.value] for edge_id in path]
+    for (_, v), (u, _) in zip(edge_uvs, edge_uvs[1:]):
+        assert v == u
+
+
+def test_overlays_of_concurrent_requests_are_independent(log, graph_handler):
+    path_finder_1 = PathFinder(
+        log, TravelMode.WALK, RoutingMode.QUIET, graph_handler, 60.212031, 24.968584, 60.201520, 24.961191)
+    path_finder_2 = PathFinder(
+        log, TravelMode.WALK, RoutingMode.QUIET, graph_handler, 60.214233, 24.971411, 60.213558, 24.970785)
+    path_finder_1.find_origin_dest_nodes()
+    path_finder_2.find_origin_dest_nodes()
+    path_finder_1.find_least_cost_paths()
+    path_finder_2.find_least_cost_paths()
+    assert path_finder_1.overlay.edges is not path_finder_2.overlay.edges
+    assert path_finder_1.process_paths_to_FC()[0]['features']
+    assert path_finder_2.process_paths_to_FC()[0]['features']
+
+
+def test_concurrent_searches_equal_sequential_searches(log, graph_handler):
+    paths = []
+    for routing_pool in (None, ThreadPoolExecutor(max_workers=3)):
+        with patch('app.path_finder.routing_pool', routing_pool):
+            path_finder = PathFinder(
+                log, TravelMode.WALK, RoutingMode.QUIET, graph_handler, 60.212031, 24.968584, 60.201520, 24.961191)
+            path_finder.find_origin_dest_nodes()
+            path_finder.find_least_cost_paths()
+            paths.append([(path.name, path.edge_ids) for path in path_finder.path_set.get_all_paths()])
+    assert len(paths[0]) > 1
+    assert paths[0] == paths[1]
@@ -1,9 +1,11 @@
 import pytest
+import numpy as np
 import env
 from shapely.geometry import LineString
 from utils.igraph import Edge as E
 import app.greenery_exposures as gvi_exps
 import app.noise_exposures as noise_exps
+import app.aq_exposures as aq_exps
 from app.logger import Logger
 from app.logger import Logger
 from app.graph_handler import GraphHandler
@@ -46,7 +48,7 @@ def test_aqi_graph_update(aqi_updater, graph_handler):
     # check the updated graph (edge attributes)
     aqi_updates = []
     for e in graph_handler.graph.es:
-        aqi_updates.append(e.attributes()[E.aqi.value])
+        aqi_updates.append(graph_handler.get_edge_attrs_by_id(e.index)[E.aqi.value])
     
     assert len(aqi_updates) == 16643
     aqi_updates_ok = [aqi for aqi in aqi_updates if aqi]
@@ -64,7 +66,7 @@ def test_noise_cost_edge_attributes(graph_handler):
     cost_prefix = cost_prefix_dict[TravelMode.WALK][RoutingMode.QUIET]
 
     for e in graph_handler.graph.es:
-        attrs = e.attributes()
+        attrs = graph_handler.get_edge_attrs_by_id(e.index)
         eg_noise_cost = f'{cost_prefix}{noise_exps.get_noise_sensitivities()[1]}'
         assert eg_noise_cost in attrs
 
@@ -79,7 +81,7 @@ def test_noise_cost_edge_attributes(graph_handler):
 def test_gvi_cost_edge_attributes(graph_handler):
     cost_prefix = cost_prefix_dict[TravelMode.WALK][RoutingMode.GREEN]
     for e in graph_handler.graph.es:
-        attrs = e.attributes()
+        attrs = graph_handler.get_edge_attrs_by_id(e.index)
         eg_gvi_cost = f'{cost_prefix}{gvi_exps.get_gvi_sensitivities()[1]}'
         assert eg_gvi_cost in attrs
 
@@ -88,3 +90,53 @@ def test_gvi_cost_edge_attributes(graph_handler):
         else:
             assert attrs[eg_gvi_cost] > 0.0
             assert round(attrs[eg_gvi_cost], 2) <= round(attrs[E.length.value], 2)
+
+
+def test_noise_costs_equal_edge_specific_noise_costs(graph_handler):
+    db_costs = noise_exps.get_db_costs(version=3)
+    cost_prefix = cost_prefix_dict[TravelMode.WALK][RoutingMode.QUIET]
+    cost_prefix_bike = cost_prefix_dict[TravelMode.BIKE][RoutingMode.QUIET]
+
+    for e in graph_handler.graph.es:
+        attrs = graph_handler.get_edge_attrs_by_id(e.index)
+        if not isinstance(attrs[E.geometry.value], LineString):
+            continue
+        for sen in noise_exps.get_noise_sensitivities():
+            assert attrs[cost_prefix + str(sen)] == noise_exps.get_noise_adjusted_edge_cost(
+                sen, db_costs, attrs[E.noises.value], attrs[E.length.value])
+            assert attrs[cost_prefix_bike + str(sen)] == noise_exps.get_noise_adjusted_edge_cost(
+                sen, db_costs, attrs[E.noises.value], attrs[E.length.value], attrs[E.length_b.value])
+
+
+def test_aq_costs_equal_edge_specific_aq_costs(aqi_updater, graph_handler):
+    aqi_updater._GraphAqiUpdater__read_update_aqi_to_graph('aqi_2019-11-08T14.csv')
+    sens = aq_exps.get_aq_sensitivities()
+
+    for e in graph_handler.graph.es:
+        attrs = graph_handler.get_edge_attrs_by_id(e.index)
+        if attrs[E.aqi.value] is None:
+            continue
+        aq_costs = {
+            **aq_exps.get_aqi_costs(attrs[E.aqi.value], attrs[E.length.value], sens),
+            **aq_exps.get_aqi_costs(
+                attrs[E.aqi.value], attrs[E.length.value], sens, 
+                length_b=attrs[E.length_b.value], travel_mode=TravelMode.BIKE)
+        }
+        for cost_attr, cost in aq_costs.items():
+            assert attrs[cost_attr] == cost
+
+
+def test_aqi_update_publishes_new_aqi_generation(aqi_updater, graph_handler):
+    prev_generation = graph_handler.get_aqi_generation()
+    prev_aqis = prev_generation.edge_arrays[E.aqi.value].copy()
+
+    aqi_updater._GraphAqiUpdater__read_update_aqi_to_graph('aqi_2020-10-25T14.csv')
+    aqi_generation = graph_handler.get_aqi_generation()
+
+    assert aqi_generation is not prev_generation
+    assert aqi_generation.aqi_data == 'aqi_2020-10-25T14.csv'
+    assert not aqi_generation.edge_arrays[E.aqi.value].flags.writeable
+    # the previous generation remains unchanged for requests that use it
+    assert np.array_equal(prev_generation.edge_arrays[E.aqi.value], prev_aqis, equal_nan=True)
+    aqi_status = aqi_updater.get_aqi_update_status_response()
+    assert aqi_status['aqi_data_utc_time_secs'] == aqi_generation.aqi_data_utc_time_secs
@@ -0,0 +1,92 @@
+import pytest
+import numpy as np
+from app.routing_engines import EdgeWeights, get_routing_engine
+from app.landmarks import (
+    LandmarkTable, select_landmarks, get_landmark_bounds, get_landmarks_dir, save_landmark_tables, read_landmark_tables)
+
+
+grid_size = 20
+
+
+@pytest.fixture(scope='module')
+def grid(get_grid):
+    grid = get_grid(grid_size, 42, isolated_node=True)
+    landmarks = select_landmarks(grid.csr_graph, grid.lengths, 6)
+    tables = [
+        (base_weights, LandmarkTable.build(grid.csr_graph, base_weights, landmarks, ''))
+        for base_weights in (grid.lengths, grid.exposures)
+    ]
+    yield grid.graph, grid.costs, grid.csr_graph, grid.node_xs, grid.node_ys, landmarks, tables
+
+
+def test_landmarks_are_distinct_nodes_of_the_largest_component(grid):
+    graph, _, _, _, _, landmarks, _ = grid
+    assert len(set(landmarks.tolist())) == 6
+    assert graph.vcount() - 1 not in landmarks.tolist()
+    # the corners of the grid are the farthest nodes
+    assert set(landmarks[:4].tolist()) == { 0, grid_size - 1, grid_size * (grid_size - 1), grid_size * grid_size - 1 }
+
+
+@pytest.mark.parametrize('weight', ['length', 'cost'])
+def test_landmark_bounds_are_lower_bounds(grid, weight):
+    graph, costs, _, _, _, _, tables = grid
+    weights = costs[weight]
+    landmark_bounds = get_landmark_bounds(weights, *tables)
+    dists = np.array(graph.distances(weights=weights.tolist()))
+    for orig, dest in ((0, 399), (45, 210), (399, 3), (5, 400)):
+        get_lower_bounds = landmark_bounds.get_lower_bounds(orig, dest)
+        for node in range(graph.vcount()):
+            to_dest, from_orig = get_lower_bounds(node)
+            assert to_dest <= dists[node, dest] + 1e-9
+            assert from_orig <= dists[orig, node] + 1e-9
+
+
+def test_landmark_lower_bounds_of_all_nodes(grid):
+    graph, costs, _, _, _, _, tables = grid
+    table = tables[0][1]
+    dists = np.array(graph.distances(weights=costs['length'].tolist()))
+    for node in (0, 45, 210):
+        assert np.all(table.get_lower_bounds_from(node) <= dists[node] + 1e-9)
+        assert np.all(table.get_lower_bounds_to(node) <= dists[:, node] + 1e-9)
+    assert table.get_lower_bounds_from(45)[210] > 0
+
+
+def test_landmark_bounds_of_costs_combine_length_and_exposure(grid):
+    _, costs, _, _, _, _, tables = grid
+    landmark_bounds = get_landmark_bounds(costs['cost'], *tables)
+    assert len(landmark_bounds.weighted_tables) == 2
+    assert landmark_bounds.weighted_tables[0][0] == pytest.approx(1.0, rel=0.01)
+    assert landmark_bounds.weighted_tables[1][0] == pytest.approx(5.0, rel=0.01)
+    assert len(get_landmark_bounds(costs['length'], *tables).weighted_tables) == 1
+    assert len(get_landmark_bounds(costs['cost'], tables[0]).weighted_tables) == 1
+
+
+@pytest.mark.filterwarnings('ignore:Couldn.t reach some vertices')
+@pytest.mark.parametrize('weight', ['length', 'cost'])
+def test_astar_paths_with_landmark_bounds_equal_igraph_paths(grid, weight):
+    graph, costs, csr_graph, node_xs, node_ys, _, tables = grid
+    weights = costs[weight]
+    engine = get_routing_engine('astar', csr_graph, node_xs, node_ys)
+    edge_weights = EdgeWeights(weights, get_landmark_bounds(weights, *tables))
+    targets = [1, 37, 210, 399, 400]
+    for source in (0, 45, 399):
+        paths = engine.find_least_cost_paths(edge_weights, source, targets)
+        ig_paths = graph.get_shortest_paths(source, to=targets, weights=weights.tolist(), output='epath')
+        for path, ig_epath in zip(paths, ig_paths):
+            if not ig_epath:
+                assert path is None or path == (0.0, [])
+                continue
+            assert path[1] == ig_epath
+            assert path[0] == pytest.approx(weights[ig_epath].sum())
+
+
+def test_saved_landmark_tables_are_memory_mapped(grid, tmp_path):
+    _, _, _, _, _, landmarks, tables = grid
+    landmarks_dir = str(tmp_path / 'grid.landmarks')
+    save_landmark_tables(landmarks_dir, landmarks, { 'walk_length': tables[0][1] }, metadata={ 'vcount': 401 })
+    loaded_landmarks, loaded_tables, metadata = read_landmark_tables(landmarks_dir)
+    assert loaded_landmarks.tolist() == landmarks.tolist()
+    assert metadata == { 'vcount': 401 }
+    assert isinstance(loaded_tables['walk_length'].dists_from, np.memmap)
+    assert np.array_equal(loaded_tables['walk_length'].dists_to, tables[0][1].dists_to)
+    assert get_landmarks_dir('graphs/hma.bundle/') == 'graphs/hma.landmarks'
@@ -0,0 +1,48 @@
+import pytest
+import numpy as np
+from unittest.mock import patch
+from shapely.geometry import Point, LineString
+from app.logger import Logger
+from app.graph_handler import GraphHandler
+from utils.igraph import Edge as E
+
+
+@pytest.fixture(scope='module')
+def graph_handler():
+    with patch('env.test_mode', True):
+        yield GraphHandler(Logger(b_printing=False), r'graphs/kumpula.graphml')
+
+
+@pytest.fixture(scope='module')
+def edge_geoms(graph_handler):
+    yield [
+        (edge_id, geom) for edge_id, geom in enumerate(graph_handler.graph.es[E.geometry.value])
+        if isinstance(geom, LineString)
+    ]
+
+
+def test_nearest_edges_equal_nearest_edges_by_distances(graph_handler, edge_geoms):
+    rng = np.random.default_rng(1)
+    nodes = rng.choice(graph_handler.graph.vcount(), 50)
+    node_points = [graph_handler.get_node_point_geom(int(node)) for node in nodes]
+    xs = np.array([point.x for point in node_points]) + rng.uniform(-100, 100, len(nodes))
+    ys = np.array([point.y for point in node_points]) + rng.uniform(-100, 100, len(nodes))
+    edge_ids, dists = graph_handler.find_nearest_edges(xs, ys)
+    for x, y, edge_id, dist in zip(xs, ys, edge_ids, dists):
+        min_dist = min(geom.distance(Point(x, y)) for _, geom in edge_geoms)
+        assert dist == pytest.approx(min_dist)
+        assert graph_handler.graph.es[int(edge_id)][E.geometry.value].distance(Point(x, y)) == pytest.approx(min_dist)
+
+
+def test_nearest_edge_has_rounded_dist(graph_handler):
+    point = graph_handler.get_node_point_geom(0)
+    point = Point(point.x + 7.123, point.y + 3.456)
+    edge = graph_handler.find_nearest_edge(point)
+    edge_ids, dists = graph_handler.find_nearest_edges(np.array([point.x]), np.array([point.y]))
+    assert edge[E.id_ig.value] == edge_ids[0]
+    assert edge['dist'] == round(dists[0], 2)
+
+
+def test_nearest_edge_is_not_found_beyond_max_dist(graph_handler):
+    point = graph_handler.get_node_point_geom(0)
+    assert graph_handler.find_nearest_edge(Point(point.x + 50000, point.y)) is None
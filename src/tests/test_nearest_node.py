@@ -0,0 +1,38 @@
+import pytest
+import numpy as np
+from unittest.mock import patch
+from shapely.geometry import Point
+from app.logger import Logger
+from app.graph_handler import GraphHandler
+from utils.igraph import Node as N
+
+
+@pytest.fixture(scope='module')
+def graph_handler():
+    with patch('env.test_mode', True):
+        yield GraphHandler(Logger(b_printing=False), r'graphs/kumpula.graphml')
+
+
+@pytest.fixture(scope='module')
+def node_coords(graph_handler):
+    geoms = graph_handler.graph.vs[N.geometry.value]
+    yield np.array([geom.x for geom in geoms]), np.array([geom.y for geom in geoms])
+
+
+def test_nearest_nodes_equal_nearest_nodes_by_distances(graph_handler, node_coords):
+    node_xs, node_ys = node_coords
+    rng = np.random.default_rng(1)
+    xs = rng.uniform(node_xs.min(), node_xs.max(), 200)
+    ys = rng.uniform(node_ys.min(), node_ys.max(), 200)
+    nearest_nodes = graph_handler.find_nearest_nodes(xs, ys)
+    for x, y, node in zip(xs, ys, nearest_nodes):
+        dists = np.hypot(node_xs - x, node_ys - y)
+        assert dists[node] == pytest.approx(dists.min())
+    assert graph_handler.find_nearest_node(Point(xs[0], ys[0])) == nearest_nodes[0]
+
+
+def test_nearest_node_is_not_found_beyond_max_dist(graph_handler, node_coords):
+    node_xs, node_ys = node_coords
+    x, y = node_xs.max() + 600, node_ys.max() + 600
+    assert graph_handler.find_nearest_node(Point(x, y)) is None
+    assert graph_handler.find_nearest_nodes(np.array([x]), np.array([y]), max_dist=1000)[0] >= 0
@@ -0,0 +1,150 @@
+import pytest
+import numpy as np
+import igraph as ig
+from app.csr_graph import CsrGraph
+from app.pareto_search import ParetoPath, find_pareto_paths
+
+
+@pytest.fixture(scope='module')
+def grid(get_grid):
+    grid = get_grid(4, 5)
+    yield grid.graph, grid.csr_graph, grid.lengths, grid.exposures
+
+
+def get_penalized_costs(lengths: np.ndarray, seed: int) -> np.ndarray:
+    """Returns base costs that differ from the lengths (as with the penalties of missing exposure data).
+    """
+    return np.round(lengths * np.where(np.random.default_rng(seed).uniform(size=len(lengths)) < 0.3, 2.5, 1.0), 2)
+
+
+def get_pareto_costs(
+    graph: ig.Graph,
+    base_costs: np.ndarray,
+    exposures: np.ndarray,
+    lengths: np.ndarray,
+    orig: int,
+    dest: int,
+    max_detour_ratio: float = np.inf
+) -> list:
+    """Returns the Pareto-optimal costs (base cost & exposure cost) of all simple paths whose length is at most
+    max_detour_ratio times the length of the shortest path (by brute force).
+    """
+    path_costs = []
+    for vpath in graph.get_all_simple_paths(orig, to=dest):
+        epath = graph.get_eids(list(zip(vpath, vpath[1:])))
+        path_costs.append((base_costs[epath].sum(), exposures[epath].sum(), lengths[epath].sum()))
+    max_length = min(length for _, _, length in path_costs) * max_detour_ratio + 1e-6
+    costs = set((round(base_cost, 6), round(exposure_cost, 6)) for base_cost, exposure_cost, length in path_costs
+        if length <= max_length)
+    return sorted(
+        cost for cost in costs
+        if not any(other[0] <= cost[0] and other[1] <= cost[1] and other != cost for other in costs)
+    )
+
+
+def get_path_costs(paths: list) -> list:
+    return [(round(path.base_cost, 6), round(path.exposure_cost, 6)) for path in paths]
+
+
+# (with the penalized costs of 5 x 5 grids 17 and 32, the Pareto-optimal paths within the maximum detour are
+# found only if the length is a criterion of the dominance of the labels)
+@pytest.mark.parametrize('size,seed', [(4, 5), (4, 11), (5, 17), (5, 32)])
+@pytest.mark.parametrize('penalized', [False, True])
+@pytest.mark.parametrize('max_detour_ratio', [1.05, 1.2, 1.5, 100])
+def test_pareto_paths_equal_pareto_optimal_simple_paths(get_grid, size, seed, penalized, max_detour_ratio):
+    grid = get_grid(size, seed)
+    graph, lengths, exposures = grid.graph, grid.lengths, grid.exposures
+    base_costs = get_penalized_costs(lengths, seed) if penalized else lengths
+    for orig, dest in ((0, size**2 - 1), (size - 1, size * (size - 1)), (size**2 - 2, 1)):
+        paths = find_pareto_paths(
+            grid.csr_graph, base_costs, exposures, lengths, [(orig, (0.0, 0.0, 0.0), [])],
+            [(dest, (0.0, 0.0, 0.0), [])], max_detour_ratio)
+        assert get_path_costs(paths) == (
+            get_pareto_costs(graph, base_costs, exposures, lengths, orig, dest, max_detour_ratio))
+        for path in paths:
+            assert base_costs[path.edge_ids].sum() == pytest.approx(path.base_cost)
+            assert exposures[path.edge_ids].sum() == pytest.approx(path.exposure_cost)
+            assert lengths[path.edge_ids].sum() == pytest.approx(path.length)
+            assert graph.es[path.edge_ids[0]].source == orig
+            assert graph.es[path.edge_ids[-1]].target == dest
+
+
+@pytest.mark.parametrize('max_detour_ratio', [1.1, 1.5, 100])
+def test_pareto_paths_with_link_edges_equal_pareto_optimal_simple_paths(grid, max_detour_ratio):
+    graph, csr_graph, lengths, exposures = grid
+    base_costs = get_penalized_costs(lengths, 3)
+    # virtual origin & destination linked to two nodes each and to each other (link edge ids follow the edge ids
+    # of the graph)
+    sources = [(0, (10.0, 1.0, 10.0), [100]), (1, (80.0, 0.0, 30.0), [101])]
+    targets = [(14, (20.0, 5.0, 20.0), [102]), (15, (20.0, 0.0, 15.0), [103])]
+    direct_path = ParetoPath(1000.0, 0.0, 600.0, [104])
+    paths = find_pareto_paths(
+        csr_graph, base_costs, exposures, lengths, sources, targets, max_detour_ratio, direct_paths=[direct_path])
+    # the same graph with the virtual nodes and the link edges
+    linked_graph = graph.copy()
+    orig, dest = linked_graph.vcount(), linked_graph.vcount() + 1
+    linked_graph.add_vertices(2)
+    link_edges = [(orig, node) for node, _, _ in sources] + [(node, dest) for node, _, _ in targets] + [(orig, dest)]
+    link_costs = [costs for _, costs, _ in sources + targets] + [direct_path[:3]]
+    linked_graph.add_edges(link_edges)
+    linked_costs = [
+        np.concatenate((costs, [link_cost[criterion] for link_cost in link_costs]))
+        for criterion, costs in enumerate((base_costs, exposures, lengths))
+    ]
+    assert get_path_costs(paths) == (
+        get_pareto_costs(linked_graph, *linked_costs, orig, dest, max_detour_ratio))
+    assert (direct_path in paths) == (max_detour_ratio == 100)
+    for path in paths:
+        if path != direct_path:
+            assert path.edge_ids[0] in (100, 101) and path.edge_ids[-1] in (102, 103)
+
+
+def test_dominated_label_that_is_shorter_reaches_destination():
+    # two parallel edges 0 -> 1, of which the shorter one has a higher base cost (e.g. a penalty), and two
+    # parallel edges 1 -> 2, of which the one without exposure is longer
+    csr_graph = CsrGraph(3, np.array([0, 0, 1, 1]), np.array([1, 1, 2, 2]))
+    base_costs = np.array([5.0, 6.0, 1.0, 1.0])
+    exposures = np.array([0.0, 0.0, 10.0, 0.0])
+    lengths = np.array([3.0, 1.0, 1.0, 3.0])
+    paths = find_pareto_paths(
+        csr_graph, base_costs, exposures, lengths, [(0, (0.0, 0.0, 0.0), [])], [(2, (0.0, 0.0, 0.0), [])], 2.2)
+    # the path without exposure is within the maximum detour only via the shorter (dominated) edge
+    assert paths == [ParetoPath(6.0, 10.0, 4.0, [0, 2]), ParetoPath(7.0, 0.0, 4.0, [1, 3])]
+
+
+def test_pareto_paths_are_bounded_by_detour_ratio(grid):
+    _, csr_graph, lengths, exposures = grid
+    all_paths = find_pareto_paths(
+        csr_graph, lengths, exposures, lengths, [(0, (0.0, 0.0, 0.0), [])], [(15, (0.0, 0.0, 0.0), [])], 100)
+    paths = find_pareto_paths(
+        csr_graph, lengths, exposures, lengths, [(0, (0.0, 0.0, 0.0), [])], [(15, (0.0, 0.0, 0.0), [])], 1.1)
+    max_length = all_paths[0].length * 1.1
+    assert paths == [path for path in all_paths if path.length <= max_length]
+
+
+def test_detour_ratio_is_relative_to_shortest_path_length(grid):
+    graph, csr_graph, lengths, exposures = grid
+    # penalize the edges from the origin, whereby the least base cost path is not the shortest path
+    base_costs = lengths.copy()
+    base_costs[graph.incident(0, mode='out')] *= 3
+    shortest_length = min(
+        lengths[graph.get_eids(zip(vpath, vpath[1:]))].sum() for vpath in graph.get_all_simple_paths(0, to=15))
+    paths = find_pareto_paths(
+        csr_graph, base_costs, exposures, lengths, [(0, (0.0, 0.0, 0.0), [])], [(15, (0.0, 0.0, 0.0), [])], 1.3)
+    assert paths
+    for path in paths:
+        assert path.length == pytest.approx(lengths[path.edge_ids].sum())
+        assert path.base_cost == pytest.approx(base_costs[path.edge_ids].sum())
+        assert path.length <= shortest_length * 1.3 + 1e-6
+    # (the least base cost exceeds the maximum length, i.e. the bound is not relative to the base costs)
+    assert paths[0].base_cost > shortest_length * 1.3
+
+
+def test_pareto_paths_differ_by_exposure_tolerance(grid):
+    _, csr_graph, lengths, exposures = grid
+    paths = find_pareto_paths(
+        csr_graph, lengths, exposures, lengths, [(0, (0.0, 0.0, 0.0), [])], [(15, (0.0, 0.0, 0.0), [])], 100,
+        exposure_tolerance=0.2)
+    assert paths
+    for path, next_path in zip(paths, paths[1:]):
+        assert next_path.exposure_cost < path.exposure_cost * 0.8
@@ -0,0 +1,130 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import igraph as ig
+from app.csr_graph import CsrGraph
+from app.routing_engines import EdgeWeights, get_routing_engine, routing_engines
+
+
+grid_size = 30
+
+
+@pytest.fixture(scope='module')
+def grid(get_grid):
+    grid = get_grid(grid_size, 42, parallel_edges=True)
+    yield grid.graph, grid.costs, grid.csr_graph, grid.node_xs, grid.node_ys
+
+
+@pytest.fixture(scope='module', params=routing_engines)
+def engine(request, grid):
+    _, _, csr_graph, node_xs, node_ys = grid
+    yield get_routing_engine(request.param, csr_graph, node_xs, node_ys)
+
+
+@pytest.mark.parametrize('weight', ['length', 'cost'])
+def test_least_cost_paths_equal_igraph_paths(grid, engine, weight):
+    graph, costs, _, _, _ = grid
+    weights = costs[weight]
+    edge_weights = EdgeWeights(weights)
+    for source in (0, 45, 450, 899):
+        targets = [1, 2, 37, 451, 620, 899]
+        paths = engine.find_least_cost_paths(edge_weights, source, targets)
+        ig_paths = graph.get_shortest_paths(source, to=targets, weights=weights.tolist(), output='epath')
+        for (cost, epath), ig_epath in zip(paths, ig_paths):
+            assert epath == ig_epath
+            assert cost == pytest.approx(weights[ig_epath].sum())
+
+
+def test_least_cost_edge_of_parallel_edges_is_used(grid, engine):
+    graph, costs, _, _, _ = grid
+    paths = engine.find_least_cost_paths(EdgeWeights(costs['length']), 0, [1, 2])
+    assert paths[0][1] == [0]
+    assert paths[1][1] == [0, graph.ecount() - 1]
+
+
+def test_reverse_least_cost_paths_equal_igraph_paths(grid, engine):
+    graph, costs, _, _, _ = grid
+    weights = costs['cost']
+    sources = [0, 45, 450]
+    paths = engine.find_least_cost_paths(EdgeWeights(weights), 899, sources, reverse=True)
+    for source, (cost, epath) in zip(sources, paths):
+        assert epath == graph.get_shortest_paths(source, to=899, weights=weights.tolist(), output='epath')[0]
+        assert cost == pytest.approx(weights[epath].sum())
+
+
+def test_missing_weights_are_not_traversed(grid, engine):
+    graph, costs, _, _, _ = grid
+    weights = costs['length'].copy()
+    weights[graph.incident(899, mode='in')] = np.nan
+    paths = engine.find_least_cost_paths(EdgeWeights(weights), 0, [899, 0])
+    assert paths[0] is None
+    assert paths[1] == (0.0, [])
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_least_cost_paths_in_search_area_pass_only_area_nodes(grid, engine, reverse):
+    graph, costs, _, node_xs, node_ys = grid
+    weights = costs['cost']
+    # the nodes inside a circle in the middle of the grid
+    search_area = np.hypot(node_xs - 600, node_ys - 600) < 400
+    area_weights = np.where(search_area[np.array(graph.get_edgelist())].all(axis=1), weights, np.inf)
+    source, targets = 465, [435, 470, 0]
+    paths = engine.find_least_cost_paths(
+        EdgeWeights(weights), source, targets, reverse=reverse, search_area=search_area)
+    assert paths[-1] is None
+    for target, (cost, epath) in zip(targets[:-1], paths[:-1]):
+        ig_epath = graph.get_shortest_paths(
+            target if reverse else source, to=source if reverse else target, weights=area_weights.tolist(), output='epath')[0]
+        assert epath == ig_epath
+        assert cost == pytest.approx(weights[ig_epath].sum())
+        assert all(search_area[node] for edge_id in epath for node in graph.es[edge_id].tuple)
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_engines_find_equal_paths_on_random_grids(seed):
+    rng = np.random.default_rng(seed)
+    width, height = rng.integers(5, 25, 2)
+    graph = ig.Graph.Lattice([int(width), int(height)], circular=False)
+    graph.to_directed()
+    # remove some edges (one way streets & dead ends) and give some edges missing weights
+    graph.delete_edges(rng.choice(graph.ecount(), graph.ecount() // 10, replace=False).tolist())
+    node_xs = np.array([(node % width) * 40.0 for node in range(graph.vcount())])
+    node_ys = np.array([(node // width) * 40.0 for node in range(graph.vcount())])
+    weights = 40 * rng.uniform(1, 3, graph.ecount())
+    weights[rng.choice(graph.ecount(), graph.ecount() // 20, replace=False)] = np.nan
+    sources, targets = np.array(graph.get_edgelist()).T
+    csr_graph = CsrGraph(graph.vcount(), sources, targets)
+    search_area = rng.uniform(size=graph.vcount()) < 0.9
+    nodes = rng.choice(graph.vcount(), 6, replace=False).tolist()
+    results = {}
+    for name in routing_engines:
+        engine = get_routing_engine(name, csr_graph, node_xs, node_ys)
+        edge_weights = EdgeWeights(weights)
+        results[name] = [
+            engine.find_least_cost_paths(edge_weights, source, nodes, reverse=reverse, search_area=area)
+            for source in nodes for reverse in (False, True) for area in (None, search_area)
+        ]
+    expected = results[routing_engines[0]]
+    for name, paths in results.items():
+        for expected_paths, engine_paths in zip(expected, paths):
+            assert [path is None for path in engine_paths] == [path is None for path in expected_paths], name
+            for path, expected_path in zip(engine_paths, expected_paths):
+                if path is not None:
+                    assert path[0] == pytest.approx(expected_path[0]), name
+                    assert path[0] == pytest.approx(weights[path[1]].sum() if path[1] else 0.0), name
+
+
+def test_heapq_engine_reuses_buffers_in_concurrent_searches(grid):
+    graph, costs, csr_graph, node_xs, node_ys = grid
+    engine = get_routing_engine('heapq', csr_graph, node_xs, node_ys)
+    edge_weights = EdgeWeights(costs['cost'])
+    searches = [(source, [899, 31, 450]) for source in (0, 45, 450, 620)] * 5
+    expected = [engine.find_least_cost_paths(edge_weights, source, targets) for source, targets in searches]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        paths = list(executor.map(lambda search: engine.find_least_cost_paths(edge_weights, *search), searches))
+    assert paths == expected
+    # a search with an unreachable target does not leave visited nodes in the buffers
+    weights = costs['cost'].copy()
+    weights[graph.incident(899, mode='in')] = np.nan
+    assert engine.find_least_cost_paths(EdgeWeights(weights), 0, [899])[0] is None
+    assert engine.find_least_cost_paths(edge_weights, 0, [899]) == expected[0][:1]
@@ -0,0 +1,74 @@
+import pytest
+import numpy as np
+import igraph as ig
+from app.sensitivity_sweep import ParametricCosts, find_tradeoff_paths, get_linear_costs
+
+
+grid_size = 15
+min_sen, max_sen = 0.1, 6
+
+
+@pytest.fixture(scope='module')
+def grid(get_grid):
+    grid = get_grid(grid_size, 7)
+    min_costs, max_costs = (np.round(grid.lengths + sen * grid.exposures, 2) for sen in (min_sen, max_sen))
+    base_costs, exposure_costs = get_linear_costs(min_sen, min_costs, max_sen, max_costs)
+    costs = ParametricCosts((min_sen, 'c_0.1'), (max_sen, 'c_6'), base_costs, exposure_costs, {})
+    yield grid.graph, costs
+
+
+def get_path_finder(graph: ig.Graph, costs: ParametricCosts, orig: int, dest: int, searched_sens: list):
+
+    def find_paths(sens):
+        searched_sens.extend(sens)
+        return [
+            graph.get_shortest_paths(orig, to=dest, weights=costs.get_edge_costs(sen).tolist(), output='epath')[0]
+            for sen in sens
+        ]
+
+    return find_paths
+
+
+def test_linear_costs_equal_costs_of_the_sensitivities(grid):
+    _, costs = grid
+    assert costs.get_edge_costs(min_sen) == pytest.approx(costs.base_costs + min_sen * costs.exposure_costs)
+    assert get_linear_costs(1.0, 12.0, 3.0, 18.0) == pytest.approx((9.0, 3.0))
+    assert get_linear_costs(1.0, 12.0, 1.0, 12.0) == pytest.approx((12.0, 0.0))
+
+
+@pytest.mark.parametrize('orig,dest', [(0, grid_size**2 - 1), (7, 200), (grid_size - 1, grid_size * 10)])
+def test_sweep_finds_the_least_cost_paths_of_all_sensitivities(grid, orig, dest):
+    graph, costs = grid
+    searched_sens = []
+    find_paths = get_path_finder(graph, costs, orig, dest, searched_sens)
+    paths = find_tradeoff_paths(find_paths, costs.get_path_costs, min_sen, max_sen)
+    assert len(paths) > 1
+    assert len(searched_sens) == 2 * len(paths) - 1
+    assert [path.sen for path in paths] == sorted(path.sen for path in paths)
+    assert len(set(tuple(path.edge_ids) for path in paths)) == len(paths)
+    # the exposure of the paths decreases by sensitivity
+    assert all(path.exposure_cost > next_path.exposure_cost for path, next_path in zip(paths, paths[1:]))
+    for sen in np.linspace(min_sen, max_sen, 60).tolist():
+        weights = costs.get_edge_costs(sen)
+        least_cost = graph.distances(orig, dest, weights=weights.tolist())[0][0]
+        assert min(path.get_cost(sen) for path in paths) == pytest.approx(least_cost)
+
+
+def test_sweep_path_costs_include_link_costs(grid):
+    _, costs = grid
+    link_costs = ParametricCosts(costs.min_sen, costs.max_sen, costs.base_costs, costs.exposure_costs, {
+        10**6: get_linear_costs(min_sen, 14.0, max_sen, 20.0) })
+    base_cost, exposure_cost = link_costs.get_path_costs([10**6, 0, 1])
+    assert base_cost == pytest.approx(costs.base_costs[[0, 1]].sum() + 14.0 - min_sen * 6 / (max_sen - min_sen))
+    assert exposure_cost == pytest.approx(costs.exposure_costs[[0, 1]].sum() + 6 / (max_sen - min_sen))
+    assert link_costs.get_cost_attr(max_sen) == 'c_6'
+    assert link_costs.get_cost_attr(1.0) is None
+
+
+def test_sweep_of_one_sensitivity_searches_once(grid):
+    graph, costs = grid
+    searched_sens = []
+    paths = find_tradeoff_paths(
+        get_path_finder(graph, costs, 0, 100, searched_sens), costs.get_path_costs, min_sen, min_sen)
+    assert len(paths) == 1
+    assert searched_sens == [min_sen]
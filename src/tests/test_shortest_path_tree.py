@@ -0,0 +1,58 @@
+import pytest
+import numpy as np
+from app.routing_engines import EdgeWeights
+from app.shortest_path_tree import find_shortest_path_tree
+
+
+grid_size = 20
+
+
+@pytest.fixture(scope='module')
+def grid(get_grid):
+    grid = get_grid(grid_size, 3, parallel_edges=True)
+    yield grid.graph, grid.lengths, grid.csr_graph
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_tree_paths_equal_igraph_paths(grid, reverse):
+    graph, weights, csr_graph = grid
+    tree = find_shortest_path_tree(csr_graph, EdgeWeights(weights), 45, reverse=reverse)
+    nodes = list(range(graph.vcount()))
+    ig_paths = graph.get_shortest_paths(
+        45, to=nodes, weights=weights.tolist(), mode='in' if reverse else 'out', output='epath')
+    for node, ig_epath in zip(nodes, ig_paths):
+        epath = tree.get_edge_ids(node)
+        assert epath == (ig_epath[::-1] if reverse else ig_epath)
+        assert tree.get_cost(node) == pytest.approx(weights[epath].sum() if epath else 0.0)
+
+
+def test_least_cost_edge_of_parallel_edges_is_in_tree(grid):
+    graph, weights, csr_graph = grid
+    tree = find_shortest_path_tree(csr_graph, EdgeWeights(weights), 0)
+    assert tree.get_edge_ids(1) == [0]
+    assert tree.get_edge_ids(2) == [0, graph.ecount() - 1]
+
+
+def test_tree_is_bounded_by_max_cost(grid):
+    graph, weights, csr_graph = grid
+    tree = find_shortest_path_tree(csr_graph, EdgeWeights(weights), 210, max_cost=200.0)
+    all_costs = np.array(graph.distances(210, weights=weights.tolist())[0])
+    assert np.array_equal(np.isfinite(tree.costs), all_costs <= 200.0)
+    assert tree.get_edge_ids(0) is None
+
+
+def test_path_sums_equal_sums_of_tree_paths(grid):
+    graph, weights, csr_graph = grid
+    tree = find_shortest_path_tree(csr_graph, EdgeWeights(weights), 210, max_cost=300.0)
+    values = np.random.default_rng(4).uniform(0, 10, graph.ecount())
+    values[7] = np.nan
+    _, edge_ids = tree.get_tree_edges()
+    sums = tree.get_path_sums(values[edge_ids])
+    for node in range(graph.vcount()):
+        epath = tree.get_edge_ids(node)
+        if epath is None:
+            assert np.isnan(sums[node])
+        elif 7 in epath:
+            assert np.isnan(sums[node])
+        else:
+            assert sums[node] == pytest.approx(values[epath].sum() if epath else 0.0)
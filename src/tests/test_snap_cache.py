@@ -0,0 +1,55 @@
+from shapely.geometry import Point
+from app.snap_cache import Snap, SnapCache
+
+
+def get_find_snap(snapped_points: list):
+    def find_snap(point: Point) -> Snap:
+        snapped_points.append(point)
+        return Snap(edge_id=len(snapped_points), edge_dist=1.0, edge_point=Point(point.x, point.y + 1.0), node=0, node_dist=5.0)
+    return find_snap
+
+
+def test_points_of_same_coords_share_snap():
+    snapped_points = []
+    cache = SnapCache(10)
+    snap = cache.get_snap(Point(100.2, 200.3), get_find_snap(snapped_points))
+    assert cache.get_snap(Point(100.2, 200.3), get_find_snap(snapped_points)) is snap
+    assert snapped_points == [Point(100.2, 200.3)]
+    assert cache.get_status()['hits'] == 1
+    assert cache.get_status()['misses'] == 1
+
+
+def test_nearby_points_are_snapped_exactly():
+    snapped_points = []
+    cache = SnapCache(10)
+    snap = cache.get_snap(Point(100.2, 200.3), get_find_snap(snapped_points))
+    nearby_snap = cache.get_snap(Point(100.21, 200.3), get_find_snap(snapped_points))
+    assert snapped_points == [Point(100.2, 200.3), Point(100.21, 200.3)]
+    assert nearby_snap.edge_point == Point(100.21, 201.3)
+    assert snap.edge_point == Point(100.2, 201.3)
+
+
+def test_least_recently_used_snap_is_dropped():
+    snapped_points = []
+    cache = SnapCache(2)
+    find_snap = get_find_snap(snapped_points)
+    for x in (0.0, 10.0, 0.0, 20.0, 0.0, 10.0):
+        cache.get_snap(Point(x, 0.0), find_snap)
+    assert snapped_points == [Point(0.0, 0.0), Point(10.0, 0.0), Point(20.0, 0.0), Point(10.0, 0.0)]
+    assert cache.get_status()['size'] == 2
+    assert cache.get_status()['hit_ratio'] == round(2 / 6, 3)
+
+
+def test_disabled_cache_snaps_every_point():
+    snapped_points = []
+    cache = SnapCache(0)
+    cache.get_snap(Point(100.2, 200.3), get_find_snap(snapped_points))
+    cache.get_snap(Point(100.2, 200.3), get_find_snap(snapped_points))
+    assert snapped_points == [Point(100.2, 200.3)] * 2
+    assert cache.get_status()['size'] == 0
+
+
+def test_points_that_are_not_snapped_are_not_cached():
+    cache = SnapCache(10)
+    assert cache.get_snap(Point(0.0, 0.0), lambda point: None) is None
+    assert cache.get_status()['size'] == 0
@@ -0,0 +1,55 @@
+import pytest
+import numpy as np
+from unittest.mock import patch
+from app.logger import Logger
+from app.graph_handler import GraphHandler
+from app.snapping_raster import SnappingRaster, get_snapping_raster_dir
+
+
+@pytest.fixture(scope='module')
+def graph_handler():
+    with patch('env.test_mode', True):
+        yield GraphHandler(Logger(b_printing=False), r'graphs/kumpula.graphml')
+
+
+@pytest.fixture(scope='module')
+def snapping_raster(graph_handler, tmp_path_factory):
+    raster_dir = str(tmp_path_factory.mktemp('graphs') / 'kumpula.snapping')
+    graph_handler.export_snapping_raster(raster_dir, 10.0)
+    yield SnappingRaster.load(raster_dir)
+
+
+def get_random_points(snapping_raster: SnappingRaster, count: int):
+    rng = np.random.default_rng(1)
+    rows, cols = snapping_raster.nodes.shape
+    xs = snapping_raster.x0 + rng.uniform(0, cols * snapping_raster.cell_size, count)
+    ys = snapping_raster.y0 + rng.uniform(0, rows * snapping_raster.cell_size, count)
+    return xs, ys
+
+
+def test_snapping_raster_dir_is_next_to_graph_file():
+    assert get_snapping_raster_dir('graphs/hma.graphml') == 'graphs/hma.snapping'
+    assert get_snapping_raster_dir('graphs/hma.bundle/') == 'graphs/hma.snapping'
+
+
+def test_raster_nodes_equal_nearest_nodes(graph_handler, snapping_raster):
+    xs, ys = get_random_points(snapping_raster, 5000)
+    raster_nodes = snapping_raster.get_nearest_nodes(xs, ys)
+    assert np.count_nonzero(raster_nodes >= 0) > 1000
+    found = raster_nodes >= 0
+    assert np.array_equal(raster_nodes[found], graph_handler.find_nearest_nodes(xs, ys)[found])
+
+
+def test_raster_edges_equal_nearest_edges(graph_handler, snapping_raster):
+    xs, ys = get_random_points(snapping_raster, 5000)
+    raster_edges = snapping_raster.get_nearest_edges(xs, ys)
+    assert np.count_nonzero(raster_edges >= 0) > 1000
+    found = raster_edges >= 0
+    assert np.array_equal(raster_edges[found], graph_handler.find_nearest_edges(xs, ys)[0][found])
+
+
+def test_points_outside_raster_are_not_found(snapping_raster):
+    xs = np.array([snapping_raster.x0 - 1, snapping_raster.x0 + 1e6])
+    ys = np.array([snapping_raster.y0 + 1, snapping_raster.y0 + 1])
+    assert snapping_raster.get_nearest_nodes(xs, ys).tolist() == [-1, -1]
+    assert snapping_raster.get_nearest_edges(xs, ys).tolist() == [-1, -1]
@@ -0,0 +1,51 @@
+import pytest
+import numpy as np
+from shapely.geometry import LineString
+from shapely.ops import substring
+from utils.geometry import split_line_at_dist, project_geom
+
+
+@pytest.fixture(scope='module')
+def lines():
+    rng = np.random.default_rng(1)
+    lines = []
+    for _ in range(50):
+        steps = rng.uniform(-30, 30, (rng.integers(1, 8), 2))
+        coords = np.vstack(([25497000.0, 6674000.0], [25497000.0, 6674000.0] + np.cumsum(steps, axis=0)))
+        line = LineString(coords)
+        lines.append((line, project_geom(line, geom_epsg=3879, to_epsg=4326)))
+    yield lines
+
+
+def test_halves_equal_substrings_of_line(lines):
+    rng = np.random.default_rng(2)
+    for line, line_wgs in lines:
+        dist = rng.uniform(0.01, 0.99) * line.length
+        line1, line2, _, _ = split_line_at_dist(line, dist, line_wgs)
+        assert line1.length == pytest.approx(dist)
+        assert line1.length + line2.length == pytest.approx(line.length)
+        assert line1.equals_exact(substring(line, 0, dist), 1e-6)
+        assert line2.equals_exact(substring(line, dist, line.length), 1e-6)
+
+
+def test_wgs_halves_equal_projected_halves(lines):
+    rng = np.random.default_rng(3)
+    for line, line_wgs in lines:
+        line1, line2, line1_wgs, line2_wgs = split_line_at_dist(line, rng.uniform(0.01, 0.99) * line.length, line_wgs)
+        for half, half_wgs in ((line1, line1_wgs), (line2, line2_wgs)):
+            assert len(half_wgs.coords) == len(half.coords)
+            assert half_wgs.equals_exact(project_geom(half, geom_epsg=3879, to_epsg=4326), 1e-8)
+
+
+def test_line_is_split_at_vertex():
+    line = LineString([(0, 0), (10, 0), (10, 10)])
+    line1, line2, _, _ = split_line_at_dist(line, 10.0, None)
+    assert list(line1.coords) == [(0, 0), (10, 0)]
+    assert list(line2.coords) == [(10, 0), (10, 10)]
+
+
+def test_line_is_not_split_at_ends():
+    line = LineString([(0, 0), (10, 0)])
+    for dist in (0.0, 10.0, 12.0):
+        with pytest.raises(ValueError):
+            split_line_at_dist(line, dist)
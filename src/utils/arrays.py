@@ -0,0 +1,28 @@
+"""
+This module provides helper functions for calculating edge attributes (e.g. costs) of all edges of a graph
+at once as NumPy arrays, in a way that gives identical results to the functions that process a single edge.
+
+"""
+
+import hashlib
+import numpy as np
+
+
+def round_exact(values: np.ndarray, ndigits: int = 2) -> np.ndarray:
+    """Rounds the values in the same way as the built-in round() function does. NumPy rounding (np.round)
+    scales the values before rounding and hence may round values close to a half (e.g. 7.905) differently.
+    Such values are rounded with round() one by one.
+    """
+    rounded = np.round(values, ndigits)
+    scaled = values * 10**ndigits
+    near_half = np.abs(np.abs(scaled - np.floor(scaled)) - 0.5) < 1e-6
+    for idx in np.flatnonzero(near_half).tolist():
+        rounded[idx] = round(float(values[idx]), ndigits)
+    return rounded
+
+
+def get_array_hash(values: np.ndarray) -> str:
+    """Returns a hash of the values as float64 (e.g. for checking that a precomputed index matches the edge
+    weights of the graph).
+    """
+    return hashlib.sha1(np.ascontiguousarray(values, dtype=np.float64).tobytes()).hexdigest()
@@ -4,11 +4,12 @@ Supported features include e.g. reprojection, finding nearest point on a line an
 
 """
 
-from typing import List, Set, Dict, Tuple
+from typing import List, Set, Dict, Sequence, Tuple
+import numpy as np
 import pyproj
 from pyproj import CRS
 from shapely.geometry import Point, LineString
-from shapely.ops import split, snap, transform
+from shapely.ops import transform
 
 
 def get_xy_from_geom(geom: Point) -> Dict[str, float]:
@@ -46,24 +47,51 @@ def project_geom(geom, geom_epsg: int = 4326, to_epsg: int = 3879):
     return transform(project.transform, geom)
 
 
-def split_line_at_point(
-    log, 
+def project_coords(
+    xs: Sequence[float], 
+    ys: Sequence[float], 
+    geom_epsg: int = 4326, 
+    to_epsg: int = 3879
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Projects arrays of x & y coordinates to another CRS (at once). The default conversion is from EPSG 4326 
+    to 3879.
+    """
+    project = __projections[(geom_epsg, to_epsg)]
+    return project.transform(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+
+
+def split_line_at_dist(
     line: LineString, 
-    split_point: Point, 
-    tolerance: float = 0.01
-) -> List[LineString]:
-    """Splits a line at nearest intersecting point.
+    dist: float, 
+    line_wgs: LineString = None
+) -> Tuple[LineString, LineString, LineString, LineString]:
+    """Splits a (projected) line at a distance along it (e.g. by line.project(point)) by the coordinate arrays
+    of the line. If the line is given also in WGS84 (with the same vertices, e.g. geom_wgs of an edge), the WGS84
+    halves are split at the same position of the same segment, else they are projected from the halves.
+
     Returns:
-        A list containing two LineString objects.
+        The halves of the line (to and from the split point) in EPSG:3879 and EPSG:4326.
+    Raises:
+        ValueError if the distance is not between the ends of the line.
     """
-    # try with many snapping distances as sometimes this fails to split line into two parts
-    for snap_dist in (tolerance, 0.001, 0.0001, 0.00001, 0.000001, 0.0000001, 0.00000001):
-        snap_line = snap(line, split_point, snap_dist)
-        split_lines = split(snap_line, split_point)
-        if (len(split_lines) > 1):
-            break
-    if (snap_dist != tolerance):
-        log.warning(f'Used adjusted snapping distance {snap_dist} vs {tolerance} in splitting nearest edge')
-    if (len(split_lines) == 1):
-        raise ValueError('Split lines to only one line instead of 2 - split point was probably not on the line')
-    return split_lines[0], split_lines[1]
+    coords = np.asarray(line.coords)
+    seg_lengths = np.hypot(*np.diff(coords[:, :2], axis=0).T)
+    cum_lengths = np.concatenate(([0.0], np.cumsum(seg_lengths)))
+    if not 0.0 < dist < cum_lengths[-1]:
+        raise ValueError(f'Split distance {dist} is not between the ends of the line (length {cum_lengths[-1]})')
+    # the segment of the split point (of non-zero length) and the relative position of the point on it
+    seg = int(np.searchsorted(cum_lengths, dist, side='right')) - 1
+    ratio = (dist - cum_lengths[seg]) / seg_lengths[seg]
+
+    def split_coords(coords: np.ndarray) -> Tuple[LineString, LineString]:
+        if ratio == 0.0:
+            return LineString(coords[:seg + 1]), LineString(coords[seg:])
+        split_point = coords[seg] + ratio * (coords[seg + 1] - coords[seg])
+        return LineString(np.vstack((coords[:seg + 1], split_point))), LineString(np.vstack((split_point, coords[seg + 1:])))
+
+    line1, line2 = split_coords(coords)
+    if isinstance(line_wgs, LineString) and len(line_wgs.coords) == len(coords):
+        line1_wgs, line2_wgs = split_coords(np.asarray(line_wgs.coords))
+    else:
+        line1_wgs, line2_wgs = (project_geom(line, geom_epsg=3879, to_epsg=4326) for line in (line1, line2))
+    return line1, line2, line1_wgs, line2_wgs
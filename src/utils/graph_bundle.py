@@ -0,0 +1,459 @@
+"""Binary graph bundle I/O utilities for green paths route planner.
+
+This module provides functions for exporting and loading street network graphs as compiled
+graph bundles. A graph bundle is a directory of NumPy (.npy) files and a manifest (manifest.json):
+the topology of the graph is stored as integer arrays, numeric attributes as typed columns,
+line geometries as coordinate buffers (with offsets) and dictionary valued attributes (e.g. noises)
+as sparse matrices (offsets, keys & values). Hence loading a graph bundle does not require
+parsing text or running a converter per attribute value as is the case with GraphML files.
+
+The attribute names (values of the Edge & Node enums) are used in the file names of the columns
+in the same way as in the exported GraphML files.
+
+A GraphML file is compiled to a graph bundle (with the derived attributes) with app/graph_compiler.py.
+
+"""
+
+import os
+import json
+import shutil
+from enum import Enum
+from typing import List, Dict, Callable, Union
+import numpy as np
+import igraph as ig
+import shapely
+from shapely import wkb
+from shapely.geometry import Point, LineString
+from utils.igraph import Edge, Node
+
+
+bundle_format = 'green-paths-graph-bundle'
+bundle_format_version = 1
+manifest_file = 'manifest.json'
+
+
+class ColumnKind(Enum):
+    FLOAT = 'float'
+    INT = 'int'
+    BOOL = 'bool'
+    STR = 'str'
+    PAIR = 'pair'
+    LINE = 'line'
+    POINT = 'point'
+    DICT = 'dict'
+
+
+__column_kind_by_edge_attribute = {
+    Edge.id_ig: ColumnKind.INT,
+    Edge.id_otp: ColumnKind.STR,
+    Edge.id_way: ColumnKind.INT,
+    Edge.uv: ColumnKind.PAIR,
+    Edge.name_otp: ColumnKind.STR,
+    Edge.geometry: ColumnKind.LINE,
+    Edge.geom_wgs: ColumnKind.LINE,
+    Edge.length: ColumnKind.FLOAT,
+    Edge.length_b: ColumnKind.FLOAT,
+    Edge.edge_class: ColumnKind.STR,
+    Edge.street_class: ColumnKind.STR,
+    Edge.is_stairs: ColumnKind.BOOL,
+    Edge.is_no_thru_traffic: ColumnKind.BOOL,
+    Edge.allows_walking: ColumnKind.BOOL,
+    Edge.allows_biking: ColumnKind.BOOL,
+    Edge.traversable_walking: ColumnKind.BOOL,
+    Edge.traversable_biking: ColumnKind.BOOL,
+    Edge.bike_safety_factor: ColumnKind.FLOAT,
+    Edge.noises: ColumnKind.DICT,
+    Edge.noise_source: ColumnKind.STR,
+    Edge.noise_sources: ColumnKind.DICT,
+    Edge.aqi: ColumnKind.FLOAT,
+    Edge.gvi_gsv: ColumnKind.FLOAT,
+    Edge.gvi_low_veg_share: ColumnKind.FLOAT,
+    Edge.gvi_high_veg_share: ColumnKind.FLOAT,
+    Edge.gvi_comb_gsv_veg: ColumnKind.FLOAT,
+    Edge.gvi_comb_gsv_high_veg: ColumnKind.FLOAT,
+    Edge.gvi: ColumnKind.FLOAT
+}
+
+__column_kind_by_node_attribute = {
+    Node.id_ig: ColumnKind.INT,
+    Node.id_otp: ColumnKind.STR,
+    Node.name_otp: ColumnKind.STR,
+    Node.geometry: ColumnKind.POINT,
+    Node.geom_wgs: ColumnKind.POINT,
+    Node.traversable_walking: ColumnKind.BOOL,
+    Node.traversable_biking: ColumnKind.BOOL,
+    Node.traffic_light: ColumnKind.BOOL,
+}
+
+
+def __is_number(value) -> bool:
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+
+
+def __infer_column_kind(values: list) -> Union[ColumnKind, None]:
+    """Returns a column kind for an attribute that is not recognized by this module (e.g. a derived cost
+    attribute). Only numeric attributes are supported, None is returned for other attributes.
+    """
+    if all(value is None or __is_number(value) for value in values):
+        return ColumnKind.FLOAT
+    return None
+
+
+def __encode_float(values: list) -> Dict[str, np.ndarray]:
+    return { 'value': np.array([np.nan if value is None else value for value in values], dtype=np.float64) }
+
+
+def __decode_float(col: Dict[str, np.ndarray]) -> list:
+    return [None if value != value else value for value in col['value'].tolist()]
+
+
+def __encode_int(values: list) -> Dict[str, np.ndarray]:
+    isnull = np.array([value is None for value in values], dtype=np.uint8)
+    return {
+        'value': np.array([0 if value is None else value for value in values], dtype=np.int64),
+        'isnull': isnull
+    }
+
+
+def __decode_int(col: Dict[str, np.ndarray]) -> list:
+    values = col['value'].tolist()
+    if not col['isnull'].any():
+        return values
+    return [None if isnull else value for value, isnull in zip(values, col['isnull'].tolist())]
+
+
+def __encode_bool(values: list) -> Dict[str, np.ndarray]:
+    return { 'value': np.array([-1 if value is None else int(value) for value in values], dtype=np.int8) }
+
+
+def __decode_bool(col: Dict[str, np.ndarray]) -> list:
+    return [None if value == -1 else bool(value) for value in col['value'].tolist()]
+
+
+def __encode_str(values: list) -> Dict[str, np.ndarray]:
+    categories = sorted({ value for value in values if value is not None })
+    code_by_category = { category: idx for idx, category in enumerate(categories) }
+    return {
+        'codes': np.array([-1 if value is None else code_by_category[value] for value in values], dtype=np.int32),
+        'categories': np.array(categories, dtype=np.str_)
+    }
+
+
+def __decode_str(col: Dict[str, np.ndarray]) -> list:
+    categories = col['categories'].tolist()
+    return [None if code == -1 else categories[code] for code in col['codes'].tolist()]
+
+
+def __encode_pair(values: list) -> Dict[str, np.ndarray]:
+    return {
+        'value': np.array([(0, 0) if value is None else value for value in values], dtype=np.int64).reshape(-1, 2),
+        'isnull': np.array([value is None for value in values], dtype=np.uint8)
+    }
+
+
+def __decode_pair(col: Dict[str, np.ndarray]) -> list:
+    return [
+        None if isnull else tuple(value)
+        for value, isnull
+        in zip(col['value'].tolist(), col['isnull'].tolist())
+    ]
+
+
+def __encode_line(values: list) -> Dict[str, np.ndarray]:
+    """Line geometries are stored as a coordinate buffer and offsets. Other geometries (e.g. empty
+    geometry collections of edges without geometry) are stored as WKB.
+    """
+    geom_kind = []
+    offsets = [0]
+    coords = []
+    wkb_offsets = [0]
+    wkb_bytes = bytearray()
+    for geom in values:
+        if isinstance(geom, LineString):
+            geom_kind.append(1)
+            coords.extend(geom.coords)
+        elif geom is None:
+            geom_kind.append(0)
+        else:
+            geom_kind.append(2)
+            wkb_bytes.extend(wkb.dumps(geom))
+            wkb_offsets.append(len(wkb_bytes))
+        offsets.append(len(coords))
+    return {
+        'kind': np.array(geom_kind, dtype=np.uint8),
+        'offsets': np.array(offsets, dtype=np.int64),
+        'coords': np.array(coords, dtype=np.float64).reshape(-1, 2),
+        'wkb': np.frombuffer(bytes(wkb_bytes), dtype=np.uint8),
+        'wkb_offsets': np.array(wkb_offsets, dtype=np.int64)
+    }
+
+
+def __get_line_geoms_from_coords(coords: np.ndarray, offsets: np.ndarray) -> list:
+    if hasattr(shapely, 'from_ragged_array'):
+        # vectorized construction of line geometries (shapely >= 2.0)
+        return list(shapely.from_ragged_array(
+            shapely.GeometryType.LINESTRING, np.asarray(coords), offsets=(np.asarray(offsets),)))
+    coords_list = coords.tolist()
+    offsets_list = offsets.tolist()
+    return [LineString(coords_list[a:b]) for a, b in zip(offsets_list[:-1], offsets_list[1:])]
+
+
+def __decode_line(col: Dict[str, np.ndarray]) -> list:
+    lines = __get_line_geoms_from_coords(col['coords'], col['offsets'])
+    geom_kinds = col['kind'].tolist()
+    if all(geom_kind == 1 for geom_kind in geom_kinds):
+        return lines
+    wkb_bytes = col['wkb'].tobytes()
+    wkb_offsets = col['wkb_offsets'].tolist()
+    geoms = []
+    wkb_idx = 0
+    for line, geom_kind in zip(lines, geom_kinds):
+        if geom_kind == 1:
+            geoms.append(line)
+        elif geom_kind == 0:
+            geoms.append(None)
+        else:
+            geoms.append(wkb.loads(wkb_bytes[wkb_offsets[wkb_idx]:wkb_offsets[wkb_idx+1]]))
+            wkb_idx += 1
+    return geoms
+
+
+def __encode_point(values: list) -> Dict[str, np.ndarray]:
+    return { 'coords': np.array(
+        [(np.nan, np.nan) if geom is None else geom.coords[0] for geom in values], dtype=np.float64).reshape(-1, 2) }
+
+
+def __decode_point(col: Dict[str, np.ndarray]) -> list:
+    coords = col['coords']
+    if hasattr(shapely, 'points'):
+        points = list(shapely.points(coords))
+    else:
+        points = [Point(xy) for xy in coords.tolist()]
+    isnull_list = np.isnan(coords[:, 0]).tolist()
+    return [None if isnull else point for point, isnull in zip(points, isnull_list)]
+
+
+def __encode_dict(values: list) -> Dict[str, np.ndarray]:
+    """Dictionary valued attributes (e.g. noises) are stored as a sparse matrix in CSR format:
+    the items of the dictionary of row (edge) i are found in keys & values [offsets[i]:offsets[i+1]].
+    String keys (e.g. noise sources) are stored as codes to key categories.
+    """
+    keys = [key for value in values if value for key in value.keys()]
+    items = [item for value in values if value for item in value.values()]
+    str_keys = any(isinstance(key, str) for key in keys)
+    key_categories = sorted({ str(key) for key in keys }) if str_keys else []
+    code_by_key = { key: idx for idx, key in enumerate(key_categories) }
+    offsets = np.cumsum([0] + [len(value) if value else 0 for value in values], dtype=np.int64)
+    return {
+        'offsets': offsets,
+        'keys': np.array(
+            [code_by_key[str(key)] for key in keys] if str_keys else keys, dtype=np.int32 if str_keys else np.int64),
+        'key_categories': np.array(key_categories, dtype=np.str_),
+        'values': np.array(items, dtype=np.int64 if all(isinstance(item, int) for item in items) else np.float64),
+        'isnull': np.array([value is None for value in values], dtype=np.uint8)
+    }
+
+
+def __decode_dict(col: Dict[str, np.ndarray]) -> list:
+    offsets = col['offsets'].tolist()
+    keys = col['keys'].tolist()
+    if len(col['key_categories']):
+        key_categories = col['key_categories'].tolist()
+        keys = [key_categories[key] for key in keys]
+    items = col['values'].tolist()
+    return [
+        None if isnull else dict(zip(keys[a:b], items[a:b]))
+        for a, b, isnull
+        in zip(offsets[:-1], offsets[1:], col['isnull'].tolist())
+    ]
+
+
+__encoder_by_column_kind: Dict[ColumnKind, Callable[[list], Dict[str, np.ndarray]]] = {
+    ColumnKind.FLOAT: __encode_float,
+    ColumnKind.INT: __encode_int,
+    ColumnKind.BOOL: __encode_bool,
+    ColumnKind.STR: __encode_str,
+    ColumnKind.PAIR: __encode_pair,
+    ColumnKind.LINE: __encode_line,
+    ColumnKind.POINT: __encode_point,
+    ColumnKind.DICT: __encode_dict
+}
+
+__decoder_by_column_kind: Dict[ColumnKind, Callable[[Dict[str, np.ndarray]], list]] = {
+    ColumnKind.FLOAT: __decode_float,
+    ColumnKind.INT: __decode_int,
+    ColumnKind.BOOL: __decode_bool,
+    ColumnKind.STR: __decode_str,
+    ColumnKind.PAIR: __decode_pair,
+    ColumnKind.LINE: __decode_line,
+    ColumnKind.POINT: __decode_point,
+    ColumnKind.DICT: __decode_dict
+}
+
+
+__parts_by_column_kind: Dict[ColumnKind, List[str]] = {
+    ColumnKind.FLOAT: ['value'],
+    ColumnKind.INT: ['value', 'isnull'],
+    ColumnKind.BOOL: ['value'],
+    ColumnKind.STR: ['codes', 'categories'],
+    ColumnKind.PAIR: ['value', 'isnull'],
+    ColumnKind.LINE: ['kind', 'offsets', 'coords', 'wkb', 'wkb_offsets'],
+    ColumnKind.POINT: ['coords'],
+    ColumnKind.DICT: ['offsets', 'keys', 'key_categories', 'values', 'isnull']
+}
+
+
+def __get_column_file(bundle_dir: str, prefix: str, attr: str, part: str) -> str:
+    return os.path.join(bundle_dir, f'{prefix}.{attr}.{part}.npy')
+
+
+def __write_columns(
+    bundle_dir: str,
+    prefix: str,
+    seq: Union[ig.VertexSeq, ig.EdgeSeq],
+    attrs: List[str],
+    kind_by_attr: Dict[str, ColumnKind],
+    log = None
+) -> Dict[str, str]:
+    """Writes the given attributes of nodes or edges as columns and returns the column kind by
+    attribute name for the manifest. Attributes of unknown kind are omitted.
+    """
+    written = {}
+    for attr in attrs:
+        values = list(seq[attr])
+        kind = kind_by_attr.get(attr) or __infer_column_kind(values)
+        if not kind:
+            if log: log.warning(f'Skipped attribute {attr} of unknown kind in graph bundle export')
+            continue
+        for part, arr in __encoder_by_column_kind[kind](values).items():
+            np.save(__get_column_file(bundle_dir, prefix, attr, part), arr, allow_pickle=False)
+        written[attr] = kind.value
+    return written
+
+
+def __read_column(bundle_dir: str, prefix: str, attr: str, kind: ColumnKind) -> Dict[str, np.ndarray]:
+    return {
+        part: np.load(__get_column_file(bundle_dir, prefix, attr, part), allow_pickle=False)
+        for part in __parts_by_column_kind[kind]
+    }
+
+
+def is_graph_bundle(graph_path: str) -> bool:
+    return os.path.isdir(graph_path) and os.path.exists(os.path.join(graph_path, manifest_file))
+
+
+def read_bundle_manifest(bundle_dir: str) -> dict:
+    with open(os.path.join(bundle_dir, manifest_file), 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != bundle_format:
+        raise ValueError(f'Not a graph bundle: {bundle_dir}')
+    if manifest.get('version') != bundle_format_version:
+        raise ValueError(f'Unsupported graph bundle version {manifest.get("version")} (expected {bundle_format_version})')
+    return manifest
+
+
+def read_bundle_array(bundle_dir: str, name: str) -> np.ndarray:
+    """Loads an additional array (e.g. a derived index) that was exported to a graph bundle.
+    """
+    return np.load(os.path.join(bundle_dir, f'x.{name}.npy'), allow_pickle=False)
+
+
+def export_graph_bundle(
+    G: ig.Graph,
+    bundle_dir: str,
+    n_attrs: Union[List[Node], None] = None,
+    e_attrs: Union[List[Edge], None] = None,
+    edge_arrays: Union[Dict[str, np.ndarray], None] = None,
+    arrays: Union[Dict[str, np.ndarray], None] = None,
+    metadata: Union[dict, None] = None,
+    log = None
+) -> None:
+    """Writes the given graph object to a directory as a graph bundle. Only the selected edge and node
+    attributes are included in the export if some are specified. If no edge or node attributes are
+    specified, all found attributes are exported (including numeric attributes that are not recognized
+    by this module, e.g. cost attributes). Numeric edge attributes that are not stored in the graph object
+    can be given as edge_arrays (they are exported as float columns that can be loaded with read_edge_arrays).
+    Additional arrays and metadata (e.g. derived indexes and the configuration they were derived with) can
+    be included in the bundle. The bundle is first written to a temporary directory that replaces the
+    existing bundle (if any) when the export is complete.
+    """
+    edge_arrays, arrays = edge_arrays or {}, arrays or {}
+    tmp_dir = bundle_dir.rstrip('/') + '.tmp'
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    edge_list = np.array(G.get_edgelist(), dtype=np.int32).reshape(-1, 2)
+    np.save(os.path.join(tmp_dir, 'topology.source.npy'), edge_list[:, 0], allow_pickle=False)
+    np.save(os.path.join(tmp_dir, 'topology.target.npy'), edge_list[:, 1], allow_pickle=False)
+
+    node_attrs = [attr.value for attr in n_attrs] if n_attrs else G.vs.attribute_names()
+    edge_attrs = [attr.value for attr in e_attrs] if e_attrs else G.es.attribute_names()
+
+    manifest = {
+        'format': bundle_format,
+        'version': bundle_format_version,
+        'directed': G.is_directed(),
+        'vcount': G.vcount(),
+        'ecount': G.ecount(),
+        'node_attrs': __write_columns(tmp_dir, 'n', G.vs, node_attrs,
+            { attr.value: kind for attr, kind in __column_kind_by_node_attribute.items() }, log=log),
+        'edge_attrs': __write_columns(tmp_dir, 'e', G.es, edge_attrs,
+            { attr.value: kind for attr, kind in __column_kind_by_edge_attribute.items() }, log=log),
+        'arrays': list(arrays.keys()),
+        'metadata': metadata or {}
+    }
+    for attr, arr in edge_arrays.items():
+        np.save(__get_column_file(tmp_dir, 'e', attr, 'value'), np.asarray(arr, dtype=np.float64), allow_pickle=False)
+        manifest['edge_attrs'][attr] = ColumnKind.FLOAT.value
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp_dir, f'x.{name}.npy'), arr, allow_pickle=False)
+    with open(os.path.join(tmp_dir, manifest_file), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(bundle_dir):
+        shutil.rmtree(bundle_dir)
+    os.rename(tmp_dir, bundle_dir)
+
+
+def read_edge_arrays(bundle_dir: str, attrs: List[str], mmap_mode: Union[str, None] = 'r') -> Dict[str, np.ndarray]:
+    """Loads numeric (float) edge attributes from a graph bundle as arrays indexed by edge id. By default,
+    the arrays are read-only memory-mapped, i.e. all processes that load the same bundle share the same
+    physical memory (page cache) for the arrays. Missing values (None) are NaN in the arrays.
+    """
+    manifest = read_bundle_manifest(bundle_dir)
+    for attr in attrs:
+        if manifest['edge_attrs'].get(attr) != ColumnKind.FLOAT.value:
+            raise ValueError(f'Edge attribute {attr} is not a float column in graph bundle {bundle_dir}')
+    return {
+        attr: np.load(__get_column_file(bundle_dir, 'e', attr, 'value'), mmap_mode=mmap_mode, allow_pickle=False)
+        for attr in attrs
+    }
+
+
+def read_graph_bundle(bundle_dir: str, log = None, exclude_edge_attrs: Union[List[str], None] = None) -> ig.Graph:
+    """Loads an igraph graph object from a graph bundle, including all edge and node attributes
+    found in the bundle (except the edge attributes listed in exclude_edge_attrs).
+    """
+    manifest = read_bundle_manifest(bundle_dir)
+    source = np.load(os.path.join(bundle_dir, 'topology.source.npy'))
+    target = np.load(os.path.join(bundle_dir, 'topology.target.npy'))
+
+    G = ig.Graph(
+        n=manifest['vcount'],
+        edges=np.column_stack((source, target)).tolist(),
+        directed=manifest['directed'])
+
+    for attr, kind in manifest['node_attrs'].items():
+        col = __read_column(bundle_dir, 'n', attr, ColumnKind(kind))
+        G.vs[attr] = __decoder_by_column_kind[ColumnKind(kind)](col)
+
+    for attr, kind in manifest['edge_attrs'].items():
+        if exclude_edge_attrs and attr in exclude_edge_attrs:
+            continue
+        col = __read_column(bundle_dir, 'e', attr, ColumnKind(kind))
+        G.es[attr] = __decoder_by_column_kind[ColumnKind(kind)](col)
+
+    if log: log.info(f'Read graph bundle of {G.ecount()} edges from: {bundle_dir}')
+    return G
+